@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Deterministic synthetic data in the real ``data/`` layout.
+
+The same seed, sizes and financial year always produce byte-identical
+files, so timings from different runs and machines compare like for like.
+Invoices are shaped the way the billing page saves them: pack-size product
+names, per-line GST, totals from ``billing_calculator`` and ``gst_slabs``.
+
+    python -m bench.generate /tmp/avb --invoices 500000 --products 20000 --customers 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from functools import lru_cache
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.defaults import DEFAULT_SETTINGS, current_financial_year
+from logic.billing_calculator import calculate_invoice_totals, calculate_line_total
+from logic.gst_summary import invoice_slabs
+from utils.helpers import write_json
+
+MAX_INVOICES = 500_000
+MAX_PRODUCTS = 20_000
+MAX_CUSTOMERS = 50_000
+
+GST_RATES = (0, 5, 5, 5, 12, 18, 28)
+WORDS = ("Chand", "Besan", "Atta", "Maida", "Suji", "Rava", "Dal", "Chana", "Moong", "Masoor", "Poha", "Sugar", "Gur", "Haldi", "Mirch", "Dhaniya")
+CITIES = ("Lucknow", "Kanpur", "Agra", "Varanasi", "Prayagraj", "Meerut", "Bareilly", "Aligarh", "Delhi", "Jaipur", "Bhopal", "Patna")
+STATE_CODES = ("09", "09", "09", "07", "08", "23", "10")
+PACKS = ((" 1kg", "rate_1kg"), (" 1/2kg", "rate_half_kg"))
+GSTIN_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+# Few distinct (qty, rate, discount, gst) lines repeat across a large data set
+_line_total = lru_cache(maxsize=None)(calculate_line_total)
+
+
+def _gstin(rng: random.Random) -> str:
+    return rng.choice(STATE_CODES) + "".join(rng.choice(GSTIN_CHARS) for _ in range(13))
+
+
+def make_products(rng: random.Random, count: int) -> List[Dict]:
+    products = []
+    for n in range(1, count + 1):
+        rate = rng.randrange(20, 400)
+        products.append(
+            {
+                "product_code": f"PROD{n:05d}",
+                "product_name": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {n}",
+                "rate_1kg": rate,
+                "rate_half_kg": rate // 2 + 5,
+                "gst_rate": rng.choice(GST_RATES),
+                "hsn_code": str(rng.randrange(1001, 2400) * 10000),
+                "stock": rng.randrange(0, 5000),
+            }
+        )
+    return products
+
+
+def make_customers(rng: random.Random, count: int) -> List[Dict]:
+    customers = []
+    for n in range(1, count + 1):
+        customers.append(
+            {
+                "customer_id": f"CUST{n:05d}",
+                "name": f"{rng.choice(WORDS)} Traders {n}",
+                "phone": f"9{rng.randrange(10**8, 10**9)}",
+                "address": rng.choice(CITIES),
+                # Roughly a third are registered dealers (B2B in GST returns)
+                "gst_number": _gstin(rng) if rng.random() < 0.35 else "",
+            }
+        )
+    return customers
+
+
+def make_invoice(rng: random.Random, fy: str, number: int, day: date, customer: Dict, products: List[Dict]) -> Dict:
+    items = []
+    for product in rng.sample(products, min(len(products), rng.randint(1, 6))):
+        suffix, rate_key = rng.choice(PACKS)
+        qty = float(rng.randint(1, 50))
+        rate = float(product[rate_key])
+        discount = float(rng.choice((0, 0, 0, 1, 2, 5)))
+        gst = float(product["gst_rate"])
+        line = _line_total(qty, rate, discount, gst)
+        items.append(
+            {
+                "product_name": product["product_name"] + suffix,
+                "quantity": qty,
+                "rate": rate,
+                "discount": discount,
+                "gst": gst,
+                "line_total": line["total"],
+                "gst_amount": line["gst"],
+                "hsn": product["hsn_code"],
+            }
+        )
+    totals = calculate_invoice_totals(items)
+    stamp = day.strftime("%Y%m%d")
+    return {
+        "invoice_no": f"{fy}/INV/{number:04d}",
+        "customer_name": customer["name"],
+        "customer_id": customer["customer_id"],
+        "items": items,
+        "date": day.isoformat(),
+        "template": rng.choice(("simple", "detailed", "compact")),
+        "gate_pass_no": f"GP-{stamp}-{number % 1000:03d}",
+        "subtotal": totals["subtotal"],
+        "discount_total": totals["discount"],
+        "gst_total": totals["gst"],
+        "grand_total": totals["total"],
+        "gst_slabs": invoice_slabs(items),
+        "status": "cancelled" if rng.random() < 0.02 else "final",
+    }
+
+
+def generate(
+    root: Path,
+    invoices: int = 20_000,
+    products: int = 2_000,
+    customers: int = 5_000,
+    seed: int = 1,
+    fy: Optional[str] = None,
+) -> Dict[str, int]:
+    """Write settings, customers, products and one FY invoice file under ``root``."""
+    if invoices > MAX_INVOICES or products > MAX_PRODUCTS or customers > MAX_CUSTOMERS:
+        raise ValueError(f"At most {MAX_INVOICES} invoices, {MAX_PRODUCTS} products and {MAX_CUSTOMERS} customers")
+    fy = fy or current_financial_year()
+    rng = random.Random(seed)
+    product_rows = make_products(rng, max(products, 1))
+    customer_rows = make_customers(rng, max(customers, 1))
+
+    # Invoices spread evenly over the financial year, in number (and date) order
+    start = date(int(fy[3:7]), 4, 1)
+    invoice_rows = []
+    for n in range(1, invoices + 1):
+        day = start + timedelta(days=(n - 1) * 365 // max(invoices, 1))
+        invoice_rows.append(make_invoice(rng, fy, n, day, rng.choice(customer_rows), product_rows))
+
+    settings = json.loads(json.dumps(DEFAULT_SETTINGS))
+    settings["company"]["gst_number"] = "09AAACB1234C1Z5"
+    files = {
+        root / "config" / "settings.json": settings,
+        root / "data" / "customers.json": {"customers": customer_rows},
+        root / "data" / "products.json": {"products": product_rows},
+        root / "data" / "invoices" / f"{fy}.json": {"invoices": invoice_rows, "version": 1},
+    }
+    for path, payload in files.items():
+        write_json(path, payload, records=path.parent.name == "invoices")
+    (root / "data" / "backups").mkdir(parents=True, exist_ok=True)
+    return {"invoices": invoices, "products": len(product_rows), "customers": len(customer_rows)}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Write a synthetic AVBilling data set.")
+    parser.add_argument("root", type=Path, help="directory to write config/ and data/ into")
+    parser.add_argument("--invoices", type=int, default=20_000)
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fy", help="financial year, e.g. FY_2025-2026 (default: current)")
+    args = parser.parse_args(argv)
+    counts = generate(args.root, args.invoices, args.products, args.customers, args.seed, args.fy)
+    print(f"Wrote {counts['invoices']} invoices, {counts['products']} products, {counts['customers']} customers to {args.root}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
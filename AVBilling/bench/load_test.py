@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Load test for the local HTTP API (``server.py``).
+
+Opens ``--connections`` keep-alive connections and sends a counter-like mix
+of lookups, invoice creates, status changes and report queries for
+``--seconds``, then prints requests per second and latency percentiles per
+endpoint. By default a synthetic data set is generated in a temp dir and a
+server is started on it; with ``--port`` an already running server is used
+(its data should come from ``bench.generate`` so the codes exist).
+
+    python -m bench.load_test --connections 16 --seconds 20
+    python -m bench.load_test --port 8765 --products 2000 --customers 5000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from config.defaults import DATA_ROOT_ENV, PROJECT_ROOT
+from bench.generate import generate
+from utils.metrics import Histogram
+
+# Relative weights of the request kinds: a bill of a few items needs several product
+# lookups, one customer lookup and one create; reports are occasional
+MIX = {"product": 55, "customer": 15, "invoice": 5, "create": 15, "status": 5, "report": 5}
+START_TIMEOUT = 60
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host: str, port: int, token: str = "") -> None:
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, target: str, body: Any = None) -> Tuple[int, Any]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        raw = json.dumps(body).encode("utf-8") if body is not None else b""
+        auth = f"Authorization: Bearer {self.token}\r\n" if self.token else ""
+        head = f"{method} {target} HTTP/1.1\r\nHost: {self.host}\r\n{auth}Content-Length: {len(raw)}\r\n\r\n"
+        self.writer.write(head.encode("latin-1") + raw)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _sep, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = await self.reader.readexactly(length)
+        return status, json.loads(data) if data else None
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class LoadTest:
+    def __init__(self, host: str, port: int, products: int, customers: int, token: str = "", seed: int = 1, mix: Optional[Dict[str, int]] = None) -> None:
+        self.host = host
+        self.port = port
+        self.products = products
+        self.customers = customers
+        self.token = token
+        self.rng = random.Random(seed)
+        self.mix = mix or MIX
+        self.latency: Dict[str, Histogram] = {}
+        self.errors: Dict[str, int] = {}
+        self.created: List[str] = []
+        self.today = time.strftime("%Y-%m-%d")
+
+    def _pick(self) -> str:
+        kind = self.rng.choices(list(self.mix), list(self.mix.values()))[0]
+        # Lookups and status changes need an invoice made during this run
+        return "create" if kind in ("invoice", "status") and not self.created else kind
+
+    def _request(self, kind: str) -> Tuple[str, str, Any]:
+        rng = self.rng
+        if kind == "product":
+            return "GET", f"/products?code=PROD{rng.randint(1, self.products):05d}", None
+        if kind == "customer":
+            return "GET", f"/customers?id=CUST{rng.randint(1, self.customers):05d}", None
+        if kind == "create":
+            n = rng.randint(1, self.customers)
+            items = [
+                {"product_name": f"Item {rng.randint(1, self.products)}", "quantity": float(rng.randint(1, 20)), "rate": float(rng.randrange(20, 400)), "discount": 0.0, "gst": 5.0}
+                for _ in range(rng.randint(1, 5))
+            ]
+            return "POST", "/invoices", {"customer_id": f"CUST{n:05d}", "customer_name": f"Load Test {n}", "date": self.today, "items": items}
+        if kind == "invoice":
+            return "GET", f"/invoice?no={rng.choice(self.created)}", None
+        if kind == "status":
+            return "POST", "/invoices/status", {"invoice_no": rng.choice(self.created), "status": rng.choice(("final", "cancelled"))}
+        if rng.random() < 0.5:
+            return "GET", "/reports/monthly", None
+        return "GET", f"/reports/top?dimension={rng.choice(('customer', 'product'))}&metric=revenue&n=10", None
+
+    async def worker(self, deadline: float) -> None:
+        client = Client(self.host, self.port, self.token)
+        try:
+            while time.perf_counter() < deadline:
+                kind = self._pick()
+                method, target, body = self._request(kind)
+                start = time.perf_counter()
+                try:
+                    status, data = await client.request(method, quote(target, safe="/?=&"), body)
+                except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                    client.close()
+                    status, data = 0, None
+                self.latency.setdefault(kind, Histogram()).add((time.perf_counter() - start) * 1000.0)
+                if status >= 400 or status == 0:
+                    self.errors[kind] = self.errors.get(kind, 0) + 1
+                elif kind == "create":
+                    self.created.append(data["invoice_no"])
+        finally:
+            client.close()
+
+    async def run(self, connections: int, seconds: float) -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(self.worker(start + seconds) for _ in range(connections)))
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        total = sum(h.count for h in self.latency.values())
+        out: Dict[str, Any] = {"requests": total, "seconds": round(elapsed, 2), "rps": round(total / elapsed, 1), "errors": sum(self.errors.values()), "endpoints": {}}
+        for kind, hist in sorted(self.latency.items()):
+            s = hist.summary()
+            out["endpoints"][kind] = {"count": s["count"], "errors": self.errors.get(kind, 0), **{k: round(s[k], 2) for k in ("p50", "p95", "p99", "max")}}
+        return out
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    """``"product=50,create=50"`` -> weights; kinds left out are not sent."""
+    mix = {}
+    for part in filter(None, text.split(",")):
+        kind, _sep, weight = part.partition("=")
+        if kind.strip() not in MIX:
+            raise argparse.ArgumentTypeError(f"unknown request kind: {kind} (one of {', '.join(MIX)})")
+        mix[kind.strip()] = int(weight or 1)
+    return mix
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(root: Path, port: int) -> subprocess.Popen:
+    env = dict(os.environ, **{DATA_ROOT_ENV: str(root)})
+    proc = subprocess.Popen(
+        [sys.executable, str(PROJECT_ROOT / "server.py"), "--port", str(port)],
+        env=env, cwd=str(PROJECT_ROOT), stdout=subprocess.PIPE, text=True,
+    )
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            if proc.poll() is not None:
+                raise RuntimeError("API server exited during startup")
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("API server did not start")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the AVBilling HTTP API on localhost.")
+    parser.add_argument("--port", type=int, help="use a server already listening on this port")
+    parser.add_argument("--token", default=os.environ.get("AVBILLING_API_TOKEN", ""))
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--mix", type=parse_mix, help="request weights, e.g. product=50,create=30,report=20")
+    parser.add_argument("--invoices", type=int, default=20_000, help="size of the generated data set")
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--root", type=Path, help="reuse (or create) a data set here instead of a temp dir")
+    parser.add_argument("--out", type=Path, help="also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    root: Optional[Path] = None
+    proc: Optional[subprocess.Popen] = None
+    port = args.port
+    try:
+        if port is None:
+            root = args.root or Path(tempfile.mkdtemp(prefix="avbilling-load-"))
+            if not (root / "data" / "invoices").exists():
+                print(f"Generating {args.invoices} invoices in {root} ...", flush=True)
+                generate(root, args.invoices, args.products, args.customers, args.seed)
+            port = _free_port()
+            proc = start_server(root, port)
+        test = LoadTest("127.0.0.1", port, args.products, args.customers, args.token, args.seed, args.mix)
+        print(f"{args.connections} connections for {args.seconds:g} s against 127.0.0.1:{port} ...", flush=True)
+        result = asyncio.run(test.run(args.connections, args.seconds))
+        report = test.report(result)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+        if root is not None and args.root is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    print(f"{report['requests']} requests in {report['seconds']} s: {report['rps']} req/s, {report['errors']} errors")
+    print(f"{'endpoint':10} {'count':>7} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for kind, e in report["endpoints"].items():
+        print(f"{kind:10} {e['count']:7} {e['errors']:6} {e['p50']:8.2f} {e['p95']:8.2f} {e['p99']:8.2f} {e['max']:8.2f}")
+    if args.out:
+        args.out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Memory taken by the loaded invoices: plain JSON dicts against records.
+
+Generates a data set (or uses ``--root``), then reads the current FY file
+twice under ``tracemalloc``: once as the dicts ``json`` returns and once as
+the ``Invoice``/``LineItem`` records the app keeps. Prints both sizes, the
+load times and the ratios; exit code 1 if the memory ratio is below
+``--min-ratio`` or loading records takes more than ``--max-slowdown`` times
+as long as loading dicts. The dict load is the baseline for the record load
+on the same machine, so no stored results are needed.
+
+    python -m bench.memory --invoices 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple
+
+from config.defaults import DATA_ROOT_ENV, current_financial_year
+from bench.generate import generate
+
+
+def measure(load: Callable[[], Any]) -> Tuple[Any, float]:
+    """(result, MB still allocated once ``load`` returns)."""
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = load()
+    gc.collect()
+    return result, (tracemalloc.get_traced_memory()[0] - before) / 1e6
+
+
+def best_time(load: Callable[[], Any], repeat: int = 3) -> float:
+    """Fastest of ``repeat`` loads in seconds, outside tracemalloc (which slows both loads, unequally)."""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = load()
+        best = min(best, time.perf_counter() - start)
+        del result
+    return best
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare memory of invoices loaded as dicts and as records.")
+    parser.add_argument("--invoices", type=int, default=20_000)
+    parser.add_argument("--root", type=Path, help="data root to use (generated if missing) instead of a temp dir")
+    parser.add_argument("--min-ratio", type=float, default=3.0, help="fail below this dicts/records ratio")
+    parser.add_argument("--max-slowdown", type=float, default=3.0, help="fail if records load this many times slower than dicts")
+    args = parser.parse_args(argv)
+
+    root = args.root or Path(tempfile.mkdtemp(prefix="avbilling-memory-"))
+    try:
+        if not (root / "data" / "invoices").exists():
+            generate(root, args.invoices)
+        os.environ[DATA_ROOT_ENV] = str(root)
+        from logic.records import load_invoice, new_memo, shared_floats
+        from utils.helpers import read_json
+
+        path = root / "data" / "invoices" / f"{current_financial_year()}.json"
+        size = path.stat().st_size / 1e6
+
+        def load_dicts() -> Any:
+            return read_json(path)
+
+        def load_records() -> Any:
+            return read_json(path, item_hook=partial(load_invoice, memo=new_memo()), parse_float=shared_floats())
+
+        dict_seconds, record_seconds = best_time(load_dicts), best_time(load_records)
+        tracemalloc.start()
+        data, dicts = measure(load_dicts)
+        count = len(data.get("invoices") or [])
+        del data
+        data, records = measure(load_records)
+        tracemalloc.stop()
+        del data
+    finally:
+        if args.root is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    ratio = dicts / records if records else 0.0
+    slowdown = record_seconds / dict_seconds if dict_seconds else 0.0
+    print(f"{count} invoices, {size:.1f} MB on disk")
+    print(f"  dicts:   {dicts:7.1f} MB  ({dict_seconds:.2f} s)")
+    print(f"  records: {records:7.1f} MB  ({record_seconds:.2f} s)")
+    print(f"  {ratio:.2f}x less memory, {slowdown:.2f}x the load time")
+    failed = False
+    if ratio < args.min_ratio:
+        print(f"FAIL: expected at least {args.min_ratio:.1f}x less memory")
+        failed = True
+    if slowdown > args.max_slowdown:
+        print(f"FAIL: expected records to load within {args.max_slowdown:.1f}x the time of dicts")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Benchmarks for the billing core, exports and backups; no Qt needed.
+
+A synthetic data set is generated (or reused with ``--root``) and the app is
+pointed at it through ``AVBILLING_DATA_ROOT``, so the real data directory is
+never touched. Each benchmark runs ``--repeat`` times after its setup; the
+median is compared with the same benchmark in ``--baseline``, and anything
+slower than its threshold ratio is reported as a regression (exit code 1).
+
+    python -m bench.run --invoices 100000 --out bench.json
+    python -m bench.run --invoices 100000 --baseline bench.json --only export
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from config.defaults import DATA_ROOT_ENV
+from bench.generate import generate
+
+DEFAULT_THRESHOLD = 1.25
+# PDF rendering and disk-bound work are noisier than pure computation
+NOISY_THRESHOLD = 1.5
+LOOKUPS = 1000
+CALCULATIONS = 10_000
+PDF_BATCH = 50
+
+BENCHMARKS: Dict[str, Dict[str, Any]] = {}
+
+
+def benchmark(name: str, setup: Optional[Callable[["BenchEnv"], Any]] = None, threshold: float = DEFAULT_THRESHOLD, repeat: Optional[int] = None):
+    """Register ``fn(env, state)``; ``setup(env)`` runs untimed before every repetition."""
+    def register(fn: Callable[["BenchEnv", Any], Any]):
+        BENCHMARKS[name] = {"fn": fn, "setup": setup, "threshold": threshold, "repeat": repeat}
+        return fn
+    return register
+
+
+class BenchEnv:
+    """Shared state for one run: the data root, a loaded store and scratch space."""
+
+    def __init__(self, root: Path) -> None:
+        from logic.customer_manager import CustomerManager
+        from logic.invoice_manager import InvoiceManager
+        from logic.product_manager import ProductManager
+
+        self.root = root
+        self.out = root / "bench_out"
+        self.out.mkdir(exist_ok=True)
+        self.im = InvoiceManager()
+        self.pm = ProductManager()
+        self.cm = CustomerManager()
+        self.invoices = self.im.list()
+        self.month = max((inv.get("date", "")[:7] for inv in self.invoices), default="")
+        products = self.pm.list()
+        customers = self.cm.list()
+        # Every n-th record, so lookups hit the whole list rather than its head
+        self.product_codes = [p["product_code"] for p in products[:: max(1, len(products) // LOOKUPS)]]
+        self.product_names = [p["product_name"] for p in products[:: max(1, len(products) // LOOKUPS)]]
+        self.customer_ids = [c["customer_id"] for c in customers[:: max(1, len(customers) // LOOKUPS)]]
+        self.customer_names = [c["name"] for c in customers[:: max(1, len(customers) // LOOKUPS)]]
+
+    def report(self, rollups: bool = False):
+        from logic.report_generator import ReportGenerator
+
+        # No version key: nothing is served from the shared report cache
+        return ReportGenerator(self.invoices, None, self.im.rollups() if rollups else None)
+
+
+# --- Invoice store -------------------------------------------------------
+
+
+@benchmark("invoice.load", threshold=NOISY_THRESHOLD)
+def _invoice_load(env: BenchEnv, _state) -> None:
+    from logic.invoice_manager import InvoiceManager
+
+    InvoiceManager()
+
+
+@benchmark("invoice.save", threshold=NOISY_THRESHOLD)
+def _invoice_save(env: BenchEnv, _state) -> None:
+    env.im._save()
+
+
+@benchmark("invoice.next_number")
+def _invoice_next_number(env: BenchEnv, _state) -> None:
+    env.im._next_invoice_number()
+
+
+def _sample_payload(env: BenchEnv) -> Dict:
+    inv = env.invoices[len(env.invoices) // 2]
+    return {
+        "customer_id": inv["customer_id"],
+        "customer_name": inv["customer_name"],
+        "items": [dict(it) for it in inv["items"]],
+        "date": inv["date"],
+        "template": inv.get("template", "simple"),
+    }
+
+
+@benchmark("invoice.create", setup=_sample_payload, threshold=NOISY_THRESHOLD, repeat=3)
+def _invoice_create(env: BenchEnv, payload: Dict) -> None:
+    env.im.create_invoice(payload)
+
+
+@benchmark("invoice.query_customer_range")
+def _invoice_query(env: BenchEnv, _state) -> None:
+    cid = env.customer_ids[len(env.customer_ids) // 2]
+    for _row in env.im.query(customer_id=cid, date_from=f"{env.month}-01", date_to=f"{env.month}-31"):
+        pass
+
+
+# --- Calculator ----------------------------------------------------------
+
+
+@benchmark("calculator.line_total")
+def _calculator_line(env: BenchEnv, _state) -> None:
+    from logic.billing_calculator import calculate_line_total
+
+    for n in range(CALCULATIONS):
+        calculate_line_total(n % 50 + 1, 90 + n % 300, n % 6, 5)
+
+
+@benchmark("calculator.invoice_totals")
+def _calculator_invoice(env: BenchEnv, _state) -> None:
+    from logic.billing_calculator import calculate_invoice_totals
+
+    for inv in env.invoices[: CALCULATIONS // 4]:
+        calculate_invoice_totals(inv["items"])
+
+
+# --- Master data lookups -------------------------------------------------
+
+
+@benchmark("products.find_by_code")
+def _products_by_code(env: BenchEnv, _state) -> None:
+    for code in env.product_codes:
+        env.pm.find_by_code(code)
+
+
+@benchmark("products.find_by_name")
+def _products_by_name(env: BenchEnv, _state) -> None:
+    for name in env.product_names:
+        env.pm.find_by_name(name)
+
+
+@benchmark("customers.find_by_id")
+def _customers_by_id(env: BenchEnv, _state) -> None:
+    for cid in env.customer_ids:
+        env.cm.find_by_id(cid)
+
+
+@benchmark("customers.find_by_name")
+def _customers_by_name(env: BenchEnv, _state) -> None:
+    for name in env.customer_names:
+        env.cm.find_by_name(name)
+
+
+# --- Reports and exports -------------------------------------------------
+
+
+@benchmark("report.rollup_rebuild", threshold=NOISY_THRESHOLD, repeat=1)
+def _rollup_rebuild(env: BenchEnv, _state) -> None:
+    env.im.rebuild_rollups()
+
+
+@benchmark("report.monthly_summary")
+def _monthly_summary(env: BenchEnv, _state) -> None:
+    env.report().monthly_summary()
+
+
+@benchmark("report.monthly_summary_rollups")
+def _monthly_summary_rollups(env: BenchEnv, _state) -> None:
+    env.report(rollups=True).monthly_summary()
+
+
+@benchmark("report.top_customers")
+def _top_customers(env: BenchEnv, _state) -> None:
+    env.report(rollups=True).top_n("customer", "revenue", f"{env.month}-01", f"{env.month}-31")
+
+
+@benchmark("export.invoices_excel", threshold=NOISY_THRESHOLD)
+def _export_invoices(env: BenchEnv, _state) -> None:
+    env.report().export_invoices_excel(str(env.out / "invoices.xlsx"))
+
+
+@benchmark("export.sales_excel", threshold=NOISY_THRESHOLD)
+def _export_sales(env: BenchEnv, _state) -> None:
+    env.report().export_sales_excel(str(env.out / "sales.xlsx"))
+
+
+@benchmark("export.master_excel", threshold=NOISY_THRESHOLD, repeat=1)
+def _export_master(env: BenchEnv, _state) -> None:
+    env.report().export_master_excel(str(env.out / "master.xlsx"))
+
+
+@benchmark("export.gstr1_json", threshold=NOISY_THRESHOLD)
+def _export_gstr1(env: BenchEnv, _state) -> None:
+    env.report().export_gstr1_json(str(env.out / "gstr1.json"), env.month)
+
+
+@benchmark("export.gst_excel", threshold=NOISY_THRESHOLD)
+def _export_gst(env: BenchEnv, _state) -> None:
+    env.report().export_gst_excel(str(env.out / "gst.xlsx"), env.month)
+
+
+@benchmark("export.period_workbook", threshold=NOISY_THRESHOLD, repeat=1)
+def _export_period(env: BenchEnv, _state) -> None:
+    env.report().export_period_workbook(str(env.out / "period.xlsx"))
+
+
+@benchmark("export.invoice_pdf", threshold=NOISY_THRESHOLD)
+def _export_invoice_pdf(env: BenchEnv, _state) -> None:
+    report = env.report()
+    for inv in env.invoices[:PDF_BATCH]:
+        report.export_invoice_pdf(inv, io.BytesIO())
+
+
+@benchmark("export.gate_pass_pdf", threshold=NOISY_THRESHOLD)
+def _export_gate_pass(env: BenchEnv, _state) -> None:
+    report = env.report()
+    for inv in env.invoices[:PDF_BATCH]:
+        report.export_gate_pass_pdf(inv, io.BytesIO())
+
+
+@benchmark("export.receipt")
+def _export_receipt(env: BenchEnv, _state) -> None:
+    report = env.report()
+    for inv in env.invoices[:PDF_BATCH]:
+        report.export_receipt(inv, io.BytesIO())
+
+
+@benchmark("export.invoice_pdf_batch", threshold=NOISY_THRESHOLD, repeat=1)
+def _export_pdf_batch(env: BenchEnv, _state) -> None:
+    from logic.pdf_batch import export_invoice_pdfs
+
+    export_invoice_pdfs(env.invoices[: PDF_BATCH * 4], str(env.out / "pdfs.zip"), as_zip=True)
+
+
+# --- Backup and restore --------------------------------------------------
+
+
+def _empty_store(env: BenchEnv) -> None:
+    shutil.rmtree(env.root / "data" / "backups" / "store", ignore_errors=True)
+
+
+@benchmark("backup.full", setup=_empty_store, threshold=NOISY_THRESHOLD, repeat=1)
+def _backup_full(env: BenchEnv, _state) -> None:
+    from logic.backup_manager import BackupManager
+
+    BackupManager().create_backup()
+
+
+@benchmark("backup.incremental", threshold=NOISY_THRESHOLD)
+def _backup_incremental(env: BenchEnv, _state) -> None:
+    from logic.backup_manager import BackupManager
+
+    BackupManager().create_backup()
+
+
+def _latest_snapshot(env: BenchEnv) -> Path:
+    from logic.backup_manager import BackupManager
+
+    manager = BackupManager()
+    snaps = manager.list_snapshots()
+    return manager.snapshots_dir / f"{snaps[-1]['id']}.json" if snaps else manager.create_backup()
+
+
+@benchmark("backup.restore", setup=_latest_snapshot, threshold=NOISY_THRESHOLD, repeat=1)
+def _backup_restore(env: BenchEnv, manifest: Path) -> None:
+    from logic.backup_manager import BackupManager
+
+    BackupManager().restore_snapshot(manifest, dest=env.root / "restored")
+
+
+# --- Runner --------------------------------------------------------------
+
+
+def run_one(env: BenchEnv, name: str, repeat: int) -> Dict[str, Any]:
+    spec = BENCHMARKS[name]
+    runs: List[float] = []
+    for _ in range(spec["repeat"] or repeat):
+        state = spec["setup"](env) if spec["setup"] else None
+        start = time.perf_counter()
+        spec["fn"](env, state)
+        runs.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(runs),
+        "min": min(runs),
+        "runs": [round(r, 6) for r in runs],
+        "threshold": spec["threshold"],
+    }
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any]) -> List[str]:
+    """Annotate results with baseline ratios; returns the names that regressed."""
+    base = baseline.get("results", {})
+    regressed = []
+    for name, res in results.items():
+        old = base.get(name, {}).get("median")
+        if not old:
+            res["status"] = "new"
+            continue
+        res["baseline"] = old
+        res["ratio"] = round(res["median"] / old, 3)
+        res["status"] = "regressed" if res["ratio"] > res["threshold"] else "ok"
+        if res["status"] == "regressed":
+            regressed.append(name)
+    return regressed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run AVBilling benchmarks on synthetic data.")
+    parser.add_argument("--invoices", type=int, default=20_000)
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--customers", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--root", type=Path, help="reuse (or create) a data set here instead of a temp dir")
+    parser.add_argument("--only", action="append", default=[], help="run benchmarks whose name starts with this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--baseline", type=Path, help="earlier results file to compare against")
+    parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, spec in BENCHMARKS.items():
+            print(f"{name:34} x{spec['threshold']}")
+        return 0
+    names = [n for n in BENCHMARKS if not args.only or any(n.startswith(p) for p in args.only)]
+
+    root = args.root or Path(tempfile.mkdtemp(prefix="avbilling-bench-"))
+    try:
+        if not (root / "data" / "invoices").exists():
+            print(f"Generating {args.invoices} invoices in {root} ...", flush=True)
+            generate(root, args.invoices, args.products, args.customers, args.seed)
+        os.environ[DATA_ROOT_ENV] = str(root)
+        env = BenchEnv(root)
+        results: Dict[str, Dict[str, Any]] = {}
+        for name in names:
+            res = results[name] = run_one(env, name, args.repeat)
+            print(f"{name:34} {res['median'] * 1000:10.1f} ms", flush=True)
+    finally:
+        if args.root is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    regressed: List[str] = []
+    if args.baseline:
+        with args.baseline.open("r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        sizes = ("invoices", "products", "customers", "seed")
+        if any(baseline.get("meta", {}).get(k) != getattr(args, k) for k in sizes):
+            print("Warning: baseline was measured on a different data set; ratios are not comparable")
+        regressed = compare(results, baseline)
+        for name in regressed:
+            res = results[name]
+            print(f"REGRESSION {name}: {res['median'] * 1000:.1f} ms vs {res['baseline'] * 1000:.1f} ms (x{res['ratio']}, limit x{res['threshold']})")
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "invoices": args.invoices,
+            "products": args.products,
+            "customers": args.customers,
+            "seed": args.seed,
+        },
+        "results": results,
+        "regressed": regressed,
+    }
+    with args.out.open("w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Several processes writing to one data directory at the same time.
+
+Starts ``--writers`` processes that each create ``--invoices`` invoices
+(one file write each), cancel every fifth of them and add a customer every
+tenth, while ``--readers`` processes keep re-reading the invoices without
+locks. Afterwards the data must hold every invoice exactly once, with
+unique, gap-free numbers and gate passes, every status change and customer,
+and rollups that match; readers must never have seen the count go down.
+Exit code 1 on any lost or duplicated write.
+
+    python -m bench.stress_writers --writers 8 --invoices 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config.defaults import DATA_ROOT_ENV
+from bench.generate import generate
+
+CANCEL_EVERY = 5
+CUSTOMER_EVERY = 10
+# Readers poll like a screen refreshing, rather than spin
+READ_INTERVAL = 0.01
+
+
+def _payload(writer: int, n: int) -> Dict[str, Any]:
+    return {
+        "customer_id": f"SW{writer:02d}",
+        "customer_name": f"Stress writer {writer}",
+        "reference": f"w{writer}-{n}",
+        "items": [{"product_name": f"Item {n % 50}", "quantity": 1.0 + n % 3, "rate": 10.0 + writer, "discount": 0.0, "gst": 5.0}],
+    }
+
+
+def writer(index: int, count: int, start: Any) -> Dict[str, Any]:
+    from logic.customer_manager import CustomerManager
+    from logic.invoice_manager import InvoiceManager
+
+    im = InvoiceManager()
+    cm = CustomerManager()
+    start.wait()
+    began = time.perf_counter()
+    for n in range(count):
+        inv = im.create_invoice(_payload(index, n))
+        if n % CANCEL_EVERY == 0:
+            im.update_status(inv["invoice_no"], "cancelled")
+        if n % CUSTOMER_EVERY == 0:
+            cm.add_or_update({"customer_id": f"SW{index:02d}-{n}", "name": f"Stress customer {index}-{n}"})
+    return {"writer": index, "seconds": time.perf_counter() - began}
+
+
+def reader(stop: Any) -> Dict[str, Any]:
+    from logic.invoice_manager import InvoiceManager
+
+    im = InvoiceManager()
+    last, reads, went_back = len(im.list()), 0, 0
+    while not stop.is_set():
+        seen = len(im.list())
+        went_back += seen < last
+        last = max(last, seen)
+        reads += 1
+        time.sleep(READ_INTERVAL)
+    return {"reads": reads, "went_back": went_back}
+
+
+def check(writers: int, count: int, base: int, readers: List[Dict[str, Any]]) -> List[str]:
+    """Everything that went wrong, as messages; empty when nothing was lost."""
+    from logic.customer_manager import CustomerManager
+    from logic.integrity import verify_data
+    from logic.invoice_manager import InvoiceManager
+
+    im = InvoiceManager()
+    invoices = im.list()
+    problems = []
+    total = base + writers * count
+    if len(invoices) != total:
+        problems.append(f"{len(invoices)} invoices, expected {total}")
+
+    refs = Counter(inv.get("reference") for inv in invoices if inv.get("reference"))
+    expected = {f"w{w}-{n}" for w in range(writers) for n in range(count)}
+    missing, extra = expected - set(refs), [r for r, c in refs.items() if c > 1]
+    if missing:
+        problems.append(f"{len(missing)} invoices lost, e.g. {sorted(missing)[:5]}")
+    if extra:
+        problems.append(f"{len(extra)} invoices saved twice, e.g. {extra[:5]}")
+
+    numbers = Counter(inv["invoice_no"] for inv in invoices)
+    if len(numbers) != len(invoices):
+        problems.append(f"duplicate invoice numbers: {[n for n, c in numbers.items() if c > 1][:5]}")
+    used = sorted(im._number_of(n) for n in numbers)
+    if used != list(range(1, len(used) + 1)):
+        problems.append("invoice numbers have gaps")
+
+    old_passes = {inv.get("gate_pass_no") for inv in invoices if not inv.get("reference")}
+    new_passes = Counter(inv.get("gate_pass_no") for inv in invoices if inv.get("reference"))
+    clashing = [gp for gp, c in new_passes.items() if c > 1 or gp in old_passes]
+    if clashing:
+        problems.append(f"{len(clashing)} gate pass numbers used twice, e.g. {clashing[:5]}")
+
+    cancelled = sum(1 for inv in invoices if inv.get("reference") and inv.get("status") == "cancelled")
+    want = writers * len(range(0, count, CANCEL_EVERY))
+    if cancelled != want:
+        problems.append(f"{cancelled} stress invoices cancelled, expected {want}")
+
+    ids = {c.get("customer_id") for c in CustomerManager().list()}
+    lost = [f"SW{w:02d}-{n}" for w in range(writers) for n in range(0, count, CUSTOMER_EVERY) if f"SW{w:02d}-{n}" not in ids]
+    if lost:
+        problems.append(f"{len(lost)} customers lost, e.g. {lost[:5]}")
+
+    for p in verify_data():
+        problems.append(f"verify: {p.get('invoice_no') or p.get('file', '')}: {p['problem']}")
+    for n, r in enumerate(readers):
+        if r["went_back"]:
+            problems.append(f"reader {n} saw the invoice count go down {r['went_back']} times")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run writer processes in parallel on one data directory and check nothing is lost.")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--invoices", type=int, default=100, help="invoices per writer")
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--base", type=int, default=2_000, help="invoices generated before the run")
+    parser.add_argument("--root", type=Path, help="data root to use (created if missing) instead of a temp dir")
+    args = parser.parse_args(argv)
+
+    root = args.root or Path(tempfile.mkdtemp(prefix="avbilling-stress-"))
+    try:
+        if not (root / "data" / "invoices").exists():
+            generate(root, args.base, 500, 1_000, 1)
+        # Children (spawned on Windows) inherit the data root
+        os.environ[DATA_ROOT_ENV] = str(root)
+        from logic.invoice_manager import InvoiceManager
+
+        base = len(InvoiceManager().list())
+        ctx = multiprocessing.get_context("spawn")
+        with ctx.Manager() as sync:
+            start, stop = sync.Barrier(args.writers), sync.Event()
+            with ctx.Pool(args.writers + args.readers) as pool:
+                reading = [pool.apply_async(reader, (stop,)) for _ in range(args.readers)]
+                print(f"{args.writers} writers x {args.invoices} invoices, {args.readers} readers, {base} invoices to start with ...", flush=True)
+                began = time.perf_counter()
+                results = [r.get() for r in [pool.apply_async(writer, (w, args.invoices, start)) for w in range(args.writers)]]
+                elapsed = time.perf_counter() - began
+                stop.set()
+                reads = [r.get() for r in reading]
+
+        ops = args.writers * args.invoices
+        print(f"{ops} invoices in {elapsed:.1f} s: {ops / elapsed:.1f} invoices/s across processes")
+        for r in results:
+            print(f"  writer {r['writer']}: {args.invoices / r['seconds']:.1f} invoices/s")
+        print(f"  readers: {sum(r['reads'] for r in reads)} lock-free reads")
+        problems = check(args.writers, args.invoices, base, reads)
+    finally:
+        if args.root is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    for p in problems:
+        print(f"FAIL: {p}")
+    print("OK: no lost or duplicated writes" if not problems else f"{len(problems)} problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""AVBilling from the command line, without Qt.
+
+    python cli.py create < invoices.jsonl
+    python cli.py export master --from 2025-04-01 --to 2025-06-30 --out q1.xlsx
+    python cli.py export pdfs --from 2025-06-01 --out june.zip
+    python cli.py backup --prune
+    python cli.py restore 20250630_210000 --only customers
+    python cli.py verify --fix --backups
+    python cli.py rebuild-indexes
+    python cli.py sync --enable S:/avbilling-sync --node counter-1
+
+Records go to stdout as JSON lines, progress and problems to stderr. Only
+argparse and json load at startup; each command imports the parts of
+``logic/`` it needs, so ``--help`` and small commands start quickly.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional
+
+CREATE_BATCH = 500
+EXPORT_KINDS = ("invoices", "sales", "master", "gst", "gstr1", "period", "pdfs")
+
+
+def _emit(record: Dict[str, Any], out: IO[str] = sys.stdout) -> None:
+    from utils.helpers import json_default
+
+    out.write(json.dumps(record, ensure_ascii=False, default=json_default) + "\n")
+
+
+def _warn(message: str) -> None:
+    print(message, file=sys.stderr)
+
+
+def iter_payloads(stream: IO[str]) -> Iterator[Optional[Dict]]:
+    """Invoices from JSON lines, a JSON array or a single JSON object; lines are read as they arrive.
+
+    A JSON line that does not parse is reported with its line number and
+    yielded as ``None``, so the records around it are still created. The
+    input is taken as one multi-line document only if it parses as one.
+    """
+    first, lineno = "", 0
+    for lineno, line in enumerate(stream, 1):
+        if line.strip():
+            first = line
+            break
+    if not first:
+        return
+    lines: Iterable[str] = stream
+    try:
+        obj = json.loads(first)
+    except json.JSONDecodeError as e:
+        rest = stream.read()
+        try:
+            # A pretty-printed object (or array) spanning several lines
+            obj = json.loads(first + rest)
+        except json.JSONDecodeError:
+            _warn(f"line {lineno}: not valid JSON ({e.msg} at column {e.colno}), skipped")
+            yield None
+            lines = rest.splitlines(keepends=True)
+        else:
+            yield from obj if isinstance(obj, list) else [obj]
+            return
+    else:
+        yield from obj if isinstance(obj, list) else [obj]
+    for lineno, line in enumerate(lines, lineno + 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            _warn(f"line {lineno}: not valid JSON ({e.msg} at column {e.colno}), skipped")
+            yield None
+
+
+def cmd_create(args: argparse.Namespace) -> int:
+    from logic.invoice_manager import InvoiceManager
+
+    im = InvoiceManager()
+    failed = 0
+    batch: List[Dict] = []
+    numbers: List[int] = []
+
+    def flush() -> None:
+        nonlocal failed
+        for n, inv in zip(numbers, im.create_invoices(batch)):
+            if inv is None:
+                failed += 1
+                _warn(f"record {n}: invalid invoice (needs a date, at least one item and an unused invoice_no)")
+            else:
+                _emit({"invoice_no": inv["invoice_no"], "date": inv["date"], "grand_total": inv["grand_total"]})
+        sys.stdout.flush()
+        batch.clear()
+        numbers.clear()
+
+    for n, payload in enumerate(iter_payloads(sys.stdin), 1):
+        if payload is None:
+            failed += 1
+            continue
+        batch.append(payload)
+        numbers.append(n)
+        if len(batch) >= args.batch:
+            flush()
+    if batch:
+        flush()
+    return 1 if failed else 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    from logic.invoice_manager import InvoiceManager
+    from logic.pdf_batch import filter_invoices
+    from logic.report_generator import ReportGenerator
+
+    def progress(done: int, total: int) -> None:
+        if args.verbose:
+            _warn(f"{done}/{total}" if total else str(done))
+
+    im = InvoiceManager()
+    date_from, date_to = args.date_from or "", args.date_to or ""
+    if args.kind == "period":
+        counts = ReportGenerator(im.list()).export_period_workbook(args.out, date_from, date_to, progress)
+        _emit({"kind": args.kind, "out": args.out, **counts})
+        return 0
+    if args.kind == "master":
+        rows = im.query(customer_id=args.customer or "", date_from=date_from, date_to=date_to)
+        count = ReportGenerator([]).export_master_excel(args.out, progress, rows=rows)
+        _emit({"kind": args.kind, "out": args.out, "rows": count})
+        return 0
+
+    invoices = filter_invoices(im.list(), date_from, date_to, args.customer or "")
+    report = ReportGenerator(invoices)
+    if args.kind == "invoices":
+        result = {"rows": report.export_invoices_excel(args.out, progress)}
+    elif args.kind == "sales":
+        result = {"rows": report.export_sales_excel(args.out, progress)}
+    elif args.kind in ("gst", "gstr1"):
+        # A month from --month, else the range's first month; blank means every invoice selected
+        month = args.month or (date_from[:7] if date_from[:7] == date_to[:7] else "")
+        if args.kind == "gst":
+            summary = report.export_gst_excel(args.out, month, progress=progress)
+            result = {"month": month, "invoices": summary.invoices}
+        else:
+            report.export_gstr1_json(args.out, month)
+            result = {"month": month}
+    else:
+        from logic.pdf_batch import export_invoice_pdfs
+
+        result = export_invoice_pdfs(invoices, args.out, as_zip=args.out.lower().endswith(".zip"), progress=progress)
+    _emit({"kind": args.kind, "out": args.out, **result})
+    return 0
+
+
+def cmd_backup(args: argparse.Namespace) -> int:
+    from logic.backup_manager import BackupManager
+
+    manager = BackupManager()
+    if args.list:
+        for m in manager.list_snapshots():
+            _emit({"id": m["id"], "created": m.get("created"), "total_bytes": m.get("total_bytes"), "stored_bytes": m.get("stored_bytes"), "files": len(m.get("files", {}))})
+        return 0
+    manifest = json.loads(manager.create_backup(codec=args.codec, level=args.level).read_text(encoding="utf-8"))
+    record = {"id": manifest["id"], "total_bytes": manifest["total_bytes"], "stored_bytes": manifest["stored_bytes"]}
+    if args.prune:
+        record["pruned"] = manager.apply_retention()
+    _emit(record)
+    return 0
+
+
+def cmd_restore(args: argparse.Namespace) -> int:
+    from pathlib import Path
+
+    from logic.backup_manager import BackupManager
+    from logic.backup_store import BackupError
+
+    manager = BackupManager()
+    path = Path(args.snapshot)
+    if not path.exists():
+        path = manager.snapshots_dir / f"{args.snapshot}.json"
+    if not path.exists():
+        _warn(f"No such snapshot: {args.snapshot}")
+        return 2
+    if path.suffix.lower() == ".zip":
+        manager.restore_backup(path)
+        _emit({"restored": str(path)})
+        return 0
+    try:
+        restored = manager.restore_snapshot(path, args.only or None)
+    except BackupError as e:
+        _warn(f"Restore failed, nothing was changed: {e}")
+        return 1
+    for rel in restored:
+        _emit({"restored": rel})
+    return 0
+
+
+def cmd_verify(args: argparse.Namespace) -> int:
+    from logic.integrity import verify_backups, verify_data
+
+    unfixed = 0
+    for problem in verify_data(fix=args.fix):
+        _emit(problem)
+        unfixed += not problem.get("fixed")
+    if args.backups:
+        for problem in verify_backups():
+            _emit(problem)
+            unfixed += 1
+    return 1 if unfixed else 0
+
+
+def cmd_rebuild_indexes(args: argparse.Namespace) -> int:
+    from logic.invoice_manager import InvoiceManager
+
+    im = InvoiceManager()
+    im.rebuild_rollups()
+    _emit({"rebuilt": str(im.rollups().dir), "invoices": len(im.list())})
+    return 0
+
+
+def cmd_sync(args: argparse.Namespace) -> int:
+    from config.defaults import app_paths
+    from logic.journal import forget_journals, node_id, safe_node_id
+    from logic.replication import Replicator, load_conflicts
+    from utils.helpers import read_json, write_json
+
+    paths = app_paths()
+    if args.conflicts:
+        for conflict in load_conflicts(paths):
+            _emit(conflict)
+        return 0
+    if args.enable or args.node:
+        settings = read_json(paths["settings"])
+        section = settings.setdefault("replication", {})
+        old_node = section.get("node_id", "")
+        if args.enable:
+            section.update(enabled=True, sync_dir=args.enable)
+        if args.node:
+            section["node_id"] = safe_node_id(args.node)
+        # Numbers in the machine's own series, so they never clash with another machine's
+        if section.get("series", "") in ("", old_node):
+            section["series"] = node_id(paths, section)
+        write_json(paths["settings"], settings)
+        forget_journals()
+    result = Replicator().sync()
+    _emit(result)
+    return 1 if result["conflicts"] else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="avbilling", description="AVBilling batch operations (no GUI).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("create", help="create invoices from JSON or JSON lines on stdin")
+    p.add_argument("--batch", type=int, default=CREATE_BATCH, help="invoices saved per file write")
+    p.set_defaults(func=cmd_create)
+
+    p = sub.add_parser("export", help="export a report or invoice PDFs for a date range")
+    p.add_argument("kind", choices=EXPORT_KINDS)
+    p.add_argument("--out", required=True, help="output file (.zip or a directory for pdfs)")
+    p.add_argument("--from", dest="date_from", help="first date, YYYY-MM-DD")
+    p.add_argument("--to", dest="date_to", help="last date, YYYY-MM-DD")
+    p.add_argument("--customer", help="customer ID")
+    p.add_argument("--month", help="filing month for gst/gstr1, YYYY-MM")
+    p.add_argument("-v", "--verbose", action="store_true", help="progress on stderr")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("backup", help="take a snapshot backup")
+    p.add_argument("--list", action="store_true", help="list snapshots instead")
+    p.add_argument("--prune", action="store_true", help="apply the retention policy afterwards")
+    p.add_argument("--codec", choices=("zlib", "lzma"))
+    p.add_argument("--level", type=int)
+    p.set_defaults(func=cmd_backup)
+
+    p = sub.add_parser("restore", help="restore a snapshot (id or path) or a legacy zip")
+    p.add_argument("snapshot")
+    p.add_argument("--only", action="append", help="dataset, FY or file to restore (repeatable)")
+    p.set_defaults(func=cmd_restore)
+
+    p = sub.add_parser("verify", help="check data files (and backups) for problems")
+    p.add_argument("--fix", action="store_true", help="recompute wrong totals and rebuild stale indexes")
+    p.add_argument("--backups", action="store_true", help="also read back every snapshot")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser("rebuild-indexes", help="rebuild the report rollups for the current FY")
+    p.set_defaults(func=cmd_rebuild_indexes)
+
+    p = sub.add_parser("sync", help="apply other machines' changes from the replication sync folder")
+    p.add_argument("--enable", metavar="DIR", help="turn replication on with this sync folder (saved in settings)")
+    p.add_argument("--node", help="name of this machine in the sync folder (saved in settings)")
+    p.add_argument("--conflicts", action="store_true", help="list parked invoice-number clashes instead")
+    p.set_defaults(func=cmd_sync)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # Output piped into e.g. `head`
+        return 0
+    except (ValueError, OSError) as e:
+        _warn(f"Error: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
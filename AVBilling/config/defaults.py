@@ -3,24 +3,32 @@
 
 from __future__ import annotations
 import json
+import os
 from pathlib import Path
 from typing import Any, Dict
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
+# Points data/, config/ and app.log at another directory (benchmarks, test copies)
+DATA_ROOT_ENV = "AVBILLING_DATA_ROOT"
+
+def data_root() -> Path:
+    override = os.environ.get(DATA_ROOT_ENV)
+    return Path(override).resolve() if override else PROJECT_ROOT
 
 def app_paths() -> Dict[str, Path]:
-    data = PROJECT_ROOT / "data"
+    root = data_root()
+    data = root / "data"
     return {
-        "root": PROJECT_ROOT,
+        "root": root,
         "assets": PROJECT_ROOT / "assets",
         "data": data,
         "invoices": data / "invoices",
         "backups": data / "backups",
-        "config": PROJECT_ROOT / "config",
-        "settings": PROJECT_ROOT / "config" / "settings.json",
+        "config": root / "config",
+        "settings": root / "config" / "settings.json",
         "customers": data / "customers.json",
         "products": data / "products.json",
-        "logs": PROJECT_ROOT / "app.log",
+        "logs": root / "app.log",
     }
 
 # Default settings structure for a fresh start or reset
@@ -48,6 +56,30 @@ DEFAULT_SETTINGS: Dict[str, Any] = {
         "F1": "F1", "F2": "F2", "F3": "F3", "F4": "F4",
         "F5": "F5", "F6": "F6", "F7": "F7", "F8": "F8",
     },
+    "backup": {
+        "interval_minutes": 60,  # 0 turns scheduled backups off
+        "on_close": True,
+        "codec": "zlib",  # or "lzma"
+        "level": 6,
+        "keep_hourly": 24,
+        "keep_daily": 7,
+        "keep_monthly": 12,
+    },
+    "metrics": {
+        "enabled": False,
+        "log_interval_seconds": 300,  # snapshot written to metrics.log next to app.log
+    },
+    "watchdog": {
+        "enabled": True,
+        "threshold_ms": 1000,  # GUI blocked this long counts as a stall (stalls.json)
+    },
+    "replication": {
+        "enabled": False,
+        "sync_dir": "",  # folder shared by all machines (network share or synced folder)
+        "node_id": "",  # blank: generated once per data folder
+        "series": "",  # invoice number series; blank = the node id while replicating, else INV
+        "interval_seconds": 30,
+    },
 }
 
 SAMPLE_CUSTOMERS = {
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Single-pass aggregation over invoices.
+
+Any number of groupings (each a tuple of dimensions) are filled from one
+walk over the invoice stream. Groupings that only use invoice-level
+dimensions read invoice totals; groupings that include ``product`` or
+``gst_rate`` walk line items, and their ``count`` is the number of distinct
+invoices contributing to each group. ``lines`` counts line items either way.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from logic.billing_calculator import calculate_line_total
+from utils.helpers import month_key, parse_date, to_float
+
+DIMENSIONS = ("day", "month", "customer", "product", "gst_rate", "status")
+ITEM_DIMENSIONS = frozenset(("product", "gst_rate"))
+MEASURES = ("count", "quantity", "taxable", "gst", "revenue", "lines")
+_COUNT, _QTY, _TAXABLE, _GST, _REVENUE, _LINES = range(6)
+# Reported as ints, the rest rounded to paise
+COUNT_MEASURES = frozenset(("count", "lines"))
+
+
+def empty_row() -> List[float]:
+    """Accumulator for one group, one slot per entry of ``MEASURES``."""
+    return [0, 0.0, 0.0, 0.0, 0.0, 0]
+
+
+def invoice_dims(inv: Mapping) -> Dict[str, Any]:
+    dt = inv.get("date", "")
+    return {
+        # Unparseable dates group under "" just like month_key does
+        "day": dt if parse_date(dt) else "",
+        "month": month_key(dt),
+        "customer": inv.get("customer_id") or inv.get("customer_name", ""),
+        "status": inv.get("status", "final"),
+    }
+
+
+def item_product(it: Mapping) -> str:
+    return it.get("product_name", "Unknown")
+
+
+def item_values(it: Mapping) -> Tuple[float, float, float, float]:
+    """(quantity, taxable, gst, revenue) for one line item; legacy field names are resolved at load."""
+    revenue, gst = it.get("line_total"), it.get("gst_amount")
+    if revenue is None or gst is None:
+        # Saved without the amounts: work them out ("gst" is the rate, never an amount)
+        line = calculate_line_total(
+            to_float(it.get("quantity", 0)), to_float(it.get("rate", 0)), to_float(it.get("discount", 0)), to_float(it.get("gst", 0))
+        )
+        revenue = line["total"] if revenue is None else revenue
+        gst = line["gst"] if gst is None else gst
+    revenue, gst = to_float(revenue), to_float(gst)
+    return to_float(it.get("quantity", 0)), revenue - gst, gst, revenue
+
+
+class Aggregator:
+    def __init__(self, groupings: Mapping[str, Sequence[str]], exclude_cancelled: bool = False) -> None:
+        for name, dims in groupings.items():
+            unknown = set(dims) - set(DIMENSIONS)
+            if unknown:
+                raise ValueError(f"Unknown dimension(s) for {name}: {', '.join(sorted(unknown))}")
+        self.groupings = {name: tuple(dims) for name, dims in groupings.items()}
+        self.exclude_cancelled = exclude_cancelled
+        self._invoice_level = [(n, d) for n, d in self.groupings.items() if not ITEM_DIMENSIONS & set(d)]
+        self._item_level = [(n, d) for n, d in self.groupings.items() if ITEM_DIMENSIONS & set(d)]
+        self._tables: Dict[str, Dict[Any, List[float]]] = {name: {} for name in self.groupings}
+        # Set by copy(): keys per table whose row is this copy's own; other rows are shared
+        self._owned: Optional[Dict[str, set]] = None
+
+    @staticmethod
+    def _key(dims: Tuple[str, ...], values: Mapping[str, Any]) -> Any:
+        if len(dims) == 1:
+            return values[dims[0]]
+        return tuple(values[d] for d in dims)
+
+    def add(self, inv: Mapping, sign: int = 1) -> None:
+        """Fold one invoice in; ``sign=-1`` takes a previously added invoice back out."""
+        if self.exclude_cancelled and inv.get("status") == "cancelled":
+            return
+        values = invoice_dims(inv)
+        items = inv.get("items", []) or []
+        if self._invoice_level:
+            qty = sum(to_float(it.get("quantity", 0)) for it in items)
+            gst = to_float(inv.get("gst_total", 0))
+            taxable = to_float(inv.get("subtotal", 0)) - to_float(inv.get("discount_total", 0))
+            revenue = to_float(inv.get("grand_total", 0))
+            for name, dims in self._invoice_level:
+                key = self._key(dims, values)
+                row = self._tables[name].setdefault(key, empty_row()) if self._owned is None else self._own(name, key)
+                row[_COUNT] += sign
+                row[_QTY] += sign * qty
+                row[_TAXABLE] += sign * taxable
+                row[_GST] += sign * gst
+                row[_REVENUE] += sign * revenue
+                row[_LINES] += sign * len(items)
+        if self._item_level:
+            seen = set()
+            for it in items:
+                values["product"] = item_product(it)
+                values["gst_rate"] = to_float(it.get("gst", 0))
+                qty, taxable, gst, revenue = item_values(it)
+                for name, dims in self._item_level:
+                    key = self._key(dims, values)
+                    row = self._tables[name].setdefault(key, empty_row()) if self._owned is None else self._own(name, key)
+                    if (name, key) not in seen:
+                        seen.add((name, key))
+                        row[_COUNT] += sign
+                    row[_QTY] += sign * qty
+                    row[_TAXABLE] += sign * taxable
+                    row[_GST] += sign * gst
+                    row[_REVENUE] += sign * revenue
+                    row[_LINES] += sign
+
+    def copy(self) -> "Aggregator":
+        """A copy to change while readers keep using this one, which stays as it is.
+
+        Rows are shared until the copy first changes them.
+        """
+        other = Aggregator.__new__(Aggregator)
+        other.__dict__.update(self.__dict__)
+        other._tables = {name: dict(table) for name, table in self._tables.items()}
+        other._owned = {name: set() for name in self._tables}
+        return other
+
+    def _own(self, name: str, key: Any) -> List[float]:
+        table, owned = self._tables[name], self._owned[name]
+        row = table.get(key)
+        if row is None:
+            row = table[key] = empty_row()
+        elif key not in owned:
+            row = table[key] = list(row)
+        owned.add(key)
+        return row
+
+    def run(self, invoices: Iterable[Mapping]) -> "Aggregator":
+        add = self.add
+        for inv in invoices:
+            add(inv)
+        return self
+
+    def raw(self, name: str) -> Dict[Any, List[float]]:
+        return self._tables[name]
+
+    def result(self, name: str, measures: Optional[Sequence[str]] = None) -> Dict[Any, Dict[str, float]]:
+        wanted = [(m, MEASURES.index(m)) for m in (measures or MEASURES)]
+        out = {}
+        for key, row in self._tables[name].items():
+            if row[_COUNT] == 0 and not any(row[1:]):
+                continue
+            out[key] = {m: (int(row[i]) if m in COUNT_MEASURES else round(row[i], 2)) for m, i in wanted}
+        return out
+
+
+def aggregate(
+    invoices: Iterable[Mapping],
+    dims: Sequence[str],
+    measures: Optional[Sequence[str]] = None,
+    exclude_cancelled: bool = False,
+) -> Dict[Any, Dict[str, float]]:
+    return Aggregator({"result": dims}, exclude_cancelled).run(invoices).result("result", measures)
@@ -3,30 +3,399 @@
 
 from __future__ import annotations
 
+import hashlib
+import os
 import shutil
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
-from config.defaults import app_paths
+from config.defaults import DEFAULT_SETTINGS, app_paths
+from logic.backup_store import BackupError, ChunkStore, iter_chunks
+from logic.journal import STATE_FILE
+from utils.helpers import file_lock, read_json, write_bytes, write_json, write_lock
+from utils.metrics import timed
+from utils.tasks import CancelToken, ProgressFn, check_cancel, report_progress
+
+BACKUP_FORMAT = 1
+# Chunks handed to the compression threads at a time
+CHUNK_BATCH = 64
+# Snapshot ids start "YYYYmmdd_HHMMSS"; prefixes of these lengths bucket them
+RETENTION_BUCKETS = (("keep_hourly", 11), ("keep_daily", 8), ("keep_monthly", 6))
 
 
 class BackupManager:
+    """Incremental snapshots of data and config into a deduplicated chunk store.
+
+    Layout under ``data/backups/store``: ``chunks/`` holds the shared chunks,
+    ``snapshots/<id>.json`` lists each backed-up file with its size, SHA-256
+    and chunk ids. Unchanged files and unchanged regions of changed files
+    cost nothing beyond their manifest entry. ``refs/ab/<id>`` lists the
+    snapshots using each chunk, so a prune reads the deleted snapshots'
+    manifests and rewrites only their chunks' lists. Backups and prunes of
+    every program on this data hold ``refs.lock``.
+    """
+
     def __init__(self) -> None:
         self.paths = app_paths()
+        self.store_dir = self.paths["backups"] / "store"
+        self.snapshots_dir = self.store_dir / "snapshots"
+        self.store = ChunkStore(self.store_dir)
+        self.refs_dir = self.store_dir / "refs"
+
+    def settings(self) -> Dict[str, Any]:
+        saved = (read_json(self.paths["settings"]) or {}).get("backup", {}) or {}
+        return {**DEFAULT_SETTINGS["backup"], **saved}
 
-    def create_backup(self) -> Path:
-        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"backup_{ts}.zip"
-        backup_path = self.paths["backups"] / backup_name
+    def backup_files(self) -> List[Tuple[str, Path]]:
+        """(name relative to the project root, path) for every file that gets backed up."""
         root = self.paths["root"]
-        backup_base = str(backup_path.with_suffix(""))
-        # Zip entire project root to keep data/config. In a fuller app, limit to specific dirs.
-        shutil.make_archive(backup_base, "zip", root_dir=root)
-        return backup_path
+        files = []
+        for path in sorted(self.paths["data"].rglob("*.json")):
+            rel = path.relative_to(self.paths["data"])
+            # Backups never contain backups; rollups are rebuilt from invoices
+            if rel.parts[0] == self.paths["backups"].name or any(p.endswith(".rollup") for p in rel.parts):
+                continue
+            files.append((path.relative_to(root).as_posix(), path))
+        for path in sorted(self.paths["config"].glob("*.json")):
+            files.append((path.relative_to(root).as_posix(), path))
+        return files
+
+    def _new_snapshot_id(self) -> str:
+        base = datetime.now().strftime("%Y%m%d_%H%M%S")
+        snap_id, n = base, 1
+        while (self.snapshots_dir / f"{snap_id}.json").exists() or (self.store_dir / "pins" / snap_id).exists():
+            n += 1
+            snap_id = f"{base}_{n}"
+        return snap_id
+
+    def pin_files(self, pin_dir: Path) -> List[Tuple[str, Path]]:
+        """Hard-link the current data files into ``pin_dir`` as one point-in-time set.
+
+        Writers only ever replace files (temp file + rename), so a linked file
+        never changes afterwards. Holding the write lock while linking keeps any
+        write from landing halfway through the set.
+        """
+        pinned = []
+        with write_lock():
+            for rel, path in self.backup_files():
+                target = pin_dir / rel
+                target.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(path, target)
+                except OSError:
+                    # No hard links here (e.g. FAT volume); a copy under the lock is still consistent
+                    shutil.copy2(path, target)
+                pinned.append((rel, target))
+        return pinned
+
+    @timed("backup.create.ms")
+    def create_backup(
+        self,
+        progress: Optional[ProgressFn] = None,
+        cancel: Optional[CancelToken] = None,
+        codec: Optional[str] = None,
+        level: Optional[int] = None,
+        workers: Optional[int] = None,
+    ) -> Path:
+        """Write a snapshot and return its manifest path.
+
+        Only pinning the files blocks writers; chunking and compression run on
+        the pinned copies, so this is safe to call from a worker thread while
+        billing continues. New chunks are compressed across ``workers`` threads
+        (default: one per core) with the codec/level from the backup settings.
+        """
+        settings = self.settings()
+        codec = codec or settings["codec"]
+        level = int(settings["level"] if level is None else level)
+        snap_id = self._new_snapshot_id()
+        created = datetime.now().isoformat(timespec="seconds")
+        pin_dir = self.store_dir / "pins" / snap_id
+        # Held until the new snapshot's references are recorded: put_many skips chunks
+        # that are already stored, and a prune elsewhere must not delete them meanwhile
+        with file_lock(self.refs_dir):
+            self._ensure_refs()
+            try:
+                files = self.pin_files(pin_dir)
+                total = sum(p.stat().st_size for _rel, p in files)
+                done = stored = 0
+                entries: Dict[str, Dict] = {}
+                with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+                    for rel, path in files:
+                        data = path.read_bytes()
+                        chunks = list(iter_chunks(data))
+                        ids: List[str] = []
+                        for i in range(0, len(chunks), CHUNK_BATCH):
+                            check_cancel(cancel)
+                            batch = chunks[i:i + CHUNK_BATCH]
+                            batch_ids, written = self.store.put_many(batch, codec, level, pool)
+                            ids.extend(batch_ids)
+                            stored += written
+                            done += sum(len(c) for c in batch)
+                            report_progress(progress, done, total)
+                        entries[rel] = {"size": len(data), "sha256": hashlib.sha256(data).hexdigest(), "chunks": ids}
+            finally:
+                shutil.rmtree(pin_dir, ignore_errors=True)
+            manifest = {
+                "format": BACKUP_FORMAT,
+                "id": snap_id,
+                "created": created,
+                "codec": codec,
+                "total_bytes": sum(e["size"] for e in entries.values()),
+                "stored_bytes": stored,
+                "files": entries,
+            }
+            # References first: a crash before the manifest leaves chunks kept, never a snapshot missing some
+            self._add_refs(snap_id, self._snapshot_chunks(manifest))
+            path = self.snapshots_dir / f"{snap_id}.json"
+            write_json(path, manifest)
+        return path
+
+    @staticmethod
+    def _snapshot_chunks(manifest: Dict) -> Set[str]:
+        return {cid for entry in manifest.get("files", {}).values() for cid in entry.get("chunks", [])}
+
+    def _snapshot_ids(self) -> List[str]:
+        return sorted(p.stem for p in self.snapshots_dir.glob("*.json"))
+
+    def _refs_file(self, cid: str) -> Path:
+        return self.refs_dir / cid[:2] / cid
+
+    def _chunk_refs(self, cid: str) -> Set[str]:
+        try:
+            return set(self._refs_file(cid).read_text(encoding="utf-8").split())
+        except FileNotFoundError:
+            return set()
+
+    def _write_refs(self, cid: str, snap_ids: Set[str]) -> None:
+        write_bytes(self._refs_file(cid), "\n".join(sorted(snap_ids)).encode("utf-8"))
+
+    def _add_refs(self, snap_id: str, cids: Iterable[str]) -> None:
+        for cid in cids:
+            snap_ids = self._chunk_refs(cid)
+            if snap_id not in snap_ids:
+                snap_ids.add(snap_id)
+                self._write_refs(cid, snap_ids)
+
+    def _drop_refs(self, snap_id: str, cids: Iterable[str]) -> List[str]:
+        """Remove one snapshot from its chunks' lists; returns chunks no snapshot uses any more.
+
+        Safe to repeat after a crash: a snapshot is only ever removed, never counted down.
+        """
+        unused = []
+        for cid in cids:
+            snap_ids = self._chunk_refs(cid)
+            snap_ids.discard(snap_id)
+            if snap_ids:
+                self._write_refs(cid, snap_ids)
+            else:
+                try:
+                    self._refs_file(cid).unlink()
+                except FileNotFoundError:
+                    pass
+                unused.append(cid)
+        return unused
+
+    def _ensure_refs(self) -> None:
+        """Build the per-chunk lists from all manifests once (new store, or one with the old refs.json)."""
+        if self.refs_dir.exists():
+            return
+        building = self.store_dir / "refs.building"
+        shutil.rmtree(building, ignore_errors=True)
+        refs: Dict[str, Set[str]] = {}
+        for snap_id in self._snapshot_ids():
+            for cid in self._snapshot_chunks(read_json(self.snapshots_dir / f"{snap_id}.json")):
+                refs.setdefault(cid, set()).add(snap_id)
+        for cid, snap_ids in refs.items():
+            write_bytes(building / cid[:2] / cid, "\n".join(sorted(snap_ids)).encode("utf-8"))
+        building.mkdir(parents=True, exist_ok=True)
+        os.replace(building, self.refs_dir)
+        (self.store_dir / "refs.json").unlink(missing_ok=True)
+
+    def delete_snapshots(self, snap_ids: Iterable[str]) -> int:
+        """Delete snapshots and the chunks only they used; returns chunks removed."""
+        removed = 0
+        with file_lock(self.refs_dir):
+            self._ensure_refs()
+            for snap_id in snap_ids:
+                path = self.snapshots_dir / f"{snap_id}.json"
+                if not path.exists():
+                    continue
+                # The manifest goes last, so an interrupted prune is finished by the next one
+                for cid in self._drop_refs(snap_id, self._snapshot_chunks(read_json(path))):
+                    self.store.delete(cid)
+                    removed += 1
+                path.unlink()
+        return removed
+
+    @timed("backup.retention.ms")
+    def apply_retention(
+        self,
+        keep_hourly: Optional[int] = None,
+        keep_daily: Optional[int] = None,
+        keep_monthly: Optional[int] = None,
+    ) -> List[str]:
+        """Keep the newest snapshot of each of the last N hours/days/months; delete the rest.
+
+        Snapshots are bucketed by their ids, taken from a listing of the snapshot
+        directory; only the deleted manifests and their chunks' reference lists
+        are read and rewritten, however large the store.
+        """
+        settings = self.settings()
+        limits = {"keep_hourly": keep_hourly, "keep_daily": keep_daily, "keep_monthly": keep_monthly}
+        ids = sorted(self._snapshot_ids(), reverse=True)
+        keep = set(ids[:1])
+        for name, width in RETENTION_BUCKETS:
+            limit = int(settings[name] if limits[name] is None else limits[name])
+            buckets: Set[str] = set()
+            for snap_id in ids:
+                bucket = snap_id[:width]
+                if bucket in buckets:
+                    continue
+                if len(buckets) >= limit:
+                    break
+                buckets.add(bucket)
+                keep.add(snap_id)
+        doomed = [snap_id for snap_id in ids if snap_id not in keep]
+        if doomed:
+            self.delete_snapshots(doomed)
+        return doomed
+
+    def list_snapshots(self) -> List[Dict]:
+        """Snapshot manifests, oldest first."""
+        snaps = []
+        for path in sorted(self.snapshots_dir.glob("*.json")):
+            manifest = read_json(path)
+            if manifest.get("format") == BACKUP_FORMAT:
+                manifest["path"] = path
+                snaps.append(manifest)
+        return snaps
+
+    def read_file(self, entry: Dict) -> bytes:
+        data = b"".join(self.store.get(cid) for cid in entry.get("chunks", []))
+        if len(data) != entry.get("size") or hashlib.sha256(data).hexdigest() != entry.get("sha256"):
+            raise BackupError("Restored file failed verification")
+        return data
+
+    @staticmethod
+    def datasets(rel: str) -> List[str]:
+        """Names a backed-up file can be selected by: its path, dataset and FY."""
+        path = Path(rel)
+        names = [rel, path.stem]
+        if path.parent.name == "invoices":
+            names.append("invoices")
+        return names
+
+    def select_files(self, manifest: Dict, only: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+        files = manifest.get("files", {})
+        if not only:
+            return dict(files)
+        wanted = set(only)
+        return {rel: entry for rel, entry in files.items() if wanted & set(self.datasets(rel))}
+
+    @timed("backup.restore.ms")
+    def restore_snapshot(
+        self,
+        manifest_path: Path,
+        only: Optional[Iterable[str]] = None,
+        dest: Optional[Path] = None,
+        progress: Optional[ProgressFn] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> List[str]:
+        """Restore a snapshot, or just some of it, e.g. ``only=["customers", "FY_2025-2026"]``.
+
+        Every selected file is rebuilt from its chunks and checked against the
+        manifest hashes into a staging directory first; nothing live is touched
+        unless all of them verify. The staged files then replace the live ones
+        by rename while this process's write lock and every swapped file's
+        file lock are held, so no program writes into the set half way; the
+        replaced files are kept in ``store/restore/<id>/previous``. Restored
+        invoice files get a version above the live one, so caches keyed on it
+        never take them for an earlier state. A full restore also moves aside
+        data files the snapshot doesn't have. Only the selected files' chunks
+        are read.
+        """
+        dest = self.paths["root"] if dest is None else dest
+        manifest = read_json(manifest_path)
+        if manifest.get("format") != BACKUP_FORMAT:
+            raise BackupError(f"Not a backup snapshot: {manifest_path.name}")
+        selected = self.select_files(manifest, only)
+        if not selected:
+            raise BackupError("Nothing in this snapshot matches the selection")
+
+        work = self.store_dir / "restore" / datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        staged_dir, previous_dir = work / "staged", work / "previous"
+        total = sum(e.get("size", 0) for e in selected.values())
+        done = 0
+        try:
+            for rel, entry in selected.items():
+                check_cancel(cancel)
+                write_bytes(staged_dir / rel, self.read_file(entry))
+                done += entry.get("size", 0)
+                report_progress(progress, done, total)
+        except BaseException:
+            shutil.rmtree(work, ignore_errors=True)
+            raise
+
+        extra = []
+        if not only and dest == self.paths["root"]:
+            extra = [rel for rel, _path in self.backup_files() if rel not in selected]
+
+        targets = list(selected) + extra
+        swapped: List[Tuple[Path, Optional[Path]]] = []
+        with ExitStack() as locks:
+            # In the order other programs nest them: a sync holds the replication state around
+            # its invoice/customer/product writes. File locks before the write lock, as writers take them.
+            for rel in sorted(targets, key=lambda rel: (Path(rel).name != STATE_FILE, rel)):
+                locks.enter_context(file_lock(dest / rel))
+            for rel in selected:
+                if Path(rel).parent.name == "invoices":
+                    self._bump_version(staged_dir / rel, dest / rel)
+            locks.enter_context(write_lock())
+            try:
+                for rel in targets:
+                    live = dest / rel
+                    kept = None
+                    if live.exists():
+                        kept = previous_dir / rel
+                        kept.parent.mkdir(parents=True, exist_ok=True)
+                        _move(live, kept)
+                    swapped.append((live, kept))
+                    if rel in selected:
+                        live.parent.mkdir(parents=True, exist_ok=True)
+                        _move(staged_dir / rel, live)
+            except Exception:
+                # Put back everything already swapped so the live data stays whole
+                for live, kept in reversed(swapped):
+                    if live.exists():
+                        live.unlink()
+                    if kept is not None and kept.exists():
+                        _move(kept, live)
+                raise
+        shutil.rmtree(staged_dir, ignore_errors=True)
+        return sorted(selected)
+
+    @staticmethod
+    def _bump_version(staged: Path, live: Path) -> None:
+        """Give a restored invoice file the version after both its own and the live file's."""
+        data = read_json(staged)
+        live_version = int(read_json(live).get("version", 0) or 0) if live.exists() else 0
+        data["version"] = max(live_version, int(data.get("version", 0) or 0)) + 1
+        write_json(staged, data, records=True)
 
-    def restore_backup(self, zip_path: Path, dest: Path | None = None) -> None:
-        if dest is None:
-            dest = self.paths["root"]
-        shutil.unpack_archive(str(zip_path), str(dest))
+    def restore_backup(self, backup_path: Path, dest: Path | None = None) -> None:
+        if backup_path.suffix.lower() == ".zip":
+            # Archives from before snapshots existed
+            shutil.unpack_archive(str(backup_path), str(dest or self.paths["root"]))
+            return
+        self.restore_snapshot(backup_path, dest=dest)
 
 
+def _move(src: Path, dst: Path) -> None:
+    try:
+        os.replace(src, dst)
+    except OSError:
+        # Different volume: no atomic rename available
+        shutil.move(str(src), str(dst))
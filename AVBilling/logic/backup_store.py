@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Content-addressed chunk store for backups.
+
+Files are cut into chunks at content-defined line boundaries, so inserting
+or appending invoices only changes the chunks around the edit; everything
+else hashes to chunks that are already stored. Chunks are named by the
+SHA-256 of their raw bytes and kept compressed (zlib or lzma, tagged by
+the first byte) under ``chunks/ab/<id>``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import lzma
+import zlib
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from utils.helpers import write_bytes
+
+# Chunk boundaries: after a line whose CRC has the low bits clear, once the
+# chunk is at least CHUNK_MIN bytes; never longer than CHUNK_MAX
+CHUNK_MIN = 16 * 1024
+CHUNK_MAX = 1024 * 1024
+BOUNDARY_MASK = 0x3FF
+
+# First byte of a stored chunk names its codec
+CODEC_TAGS = {"zlib": b"z", "lzma": b"x"}
+CODECS = tuple(CODEC_TAGS)
+
+
+class BackupError(Exception):
+    pass
+
+
+def iter_chunks(data: bytes) -> Iterator[bytes]:
+    start = pos = 0
+    crc32 = zlib.crc32
+    for line in data.splitlines(keepends=True):
+        pos += len(line)
+        size = pos - start
+        if size >= CHUNK_MAX or (size >= CHUNK_MIN and crc32(line) & BOUNDARY_MASK == 0):
+            yield data[start:pos]
+            start = pos
+    if start < len(data):
+        yield data[start:]
+
+
+def chunk_id(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def compress(data: bytes, codec: str = "zlib", level: int = 6) -> bytes:
+    # Both codecs drop the GIL while compressing, so chunks compress in parallel threads
+    if codec == "zlib":
+        return CODEC_TAGS["zlib"] + zlib.compress(data, level)
+    if codec == "lzma":
+        return CODEC_TAGS["lzma"] + lzma.compress(data, preset=min(max(level, 0), 9))
+    raise BackupError(f"Unknown backup codec: {codec}")
+
+
+def decompress(blob: bytes) -> bytes:
+    tag, payload = blob[:1], blob[1:]
+    if tag == CODEC_TAGS["zlib"]:
+        return zlib.decompress(payload)
+    if tag == CODEC_TAGS["lzma"]:
+        return lzma.decompress(payload)
+    raise BackupError("Unknown codec in backup chunk")
+
+
+class ChunkStore:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.chunks_dir = root / "chunks"
+
+    def path(self, cid: str) -> Path:
+        return self.chunks_dir / cid[:2] / cid
+
+    def has(self, cid: str) -> bool:
+        return self.path(cid).exists()
+
+    def put(self, data: bytes, codec: str = "zlib", level: int = 6) -> Tuple[str, int]:
+        """Store a chunk unless present; returns (id, bytes written)."""
+        cid = chunk_id(data)
+        return cid, self._write(cid, data, codec, level)
+
+    def _write(self, cid: str, data: bytes, codec: str, level: int) -> int:
+        path = self.path(cid)
+        if path.exists():
+            return 0
+        blob = compress(data, codec, level)
+        write_bytes(path, blob)
+        return len(blob)
+
+    def put_many(
+        self,
+        chunks: Sequence[bytes],
+        codec: str = "zlib",
+        level: int = 6,
+        executor: Optional[Executor] = None,
+    ) -> Tuple[List[str], int]:
+        """Store a batch of chunks, compressing new ones on ``executor``; returns (ids, bytes written)."""
+        ids = [chunk_id(c) for c in chunks]
+        new: Dict[str, bytes] = {}
+        for cid, data in zip(ids, chunks):
+            if cid not in new and not self.path(cid).exists():
+                new[cid] = data
+        if executor is None or len(new) < 2:
+            written = sum(self._write(cid, data, codec, level) for cid, data in new.items())
+        else:
+            futures = [executor.submit(self._write, cid, data, codec, level) for cid, data in new.items()]
+            written = sum(f.result() for f in futures)
+        return ids, written
+
+    def get(self, cid: str) -> bytes:
+        try:
+            blob = self.path(cid).read_bytes()
+        except OSError as e:
+            raise BackupError(f"Missing backup chunk {cid[:12]}") from e
+        try:
+            data = decompress(blob)
+        except (zlib.error, lzma.LZMAError) as e:
+            raise BackupError(f"Corrupt backup chunk {cid[:12]}") from e
+        if chunk_id(data) != cid:
+            raise BackupError(f"Backup chunk {cid[:12]} failed verification")
+        return data
+
+    def delete(self, cid: str) -> None:
+        try:
+            self.path(cid).unlink()
+        except FileNotFoundError:
+            pass
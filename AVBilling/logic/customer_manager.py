@@ -3,10 +3,13 @@
 
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional
 
 from config.defaults import app_paths
-from utils.helpers import read_json, write_json
+from logic.journal import journal_for
+from logic.records import RecordView
+from utils.helpers import file_lock, file_stamp, read_json, write_json
 from utils.validators import validate_customer
 
 
@@ -14,45 +17,105 @@ class CustomerManager:
     def __init__(self) -> None:
         self.paths = app_paths()
         self.path = self.paths["customers"]
+        self.journal = journal_for(self.paths)
+        self._load()
+
+    def _load(self) -> None:
+        # Stamp before reading: a replace in between only costs one more reload later
+        self._stamp = file_stamp(self.path)
         self._data = read_json(self.path) or {"customers": []}
+        self._publish()
+
+    def _publish(self) -> None:
+        # Rows are replaced rather than changed in place, so these proxies never change under a
+        # reader. Lookups scan the plain dicts, which is faster, and hand out the proxy; both
+        # sit in one attribute so a reader never pairs one snapshot's rows with another's view.
+        rows = tuple(self._data.get("customers", []))
+        self._snapshot = (rows, RecordView(MappingProxyType(r) for r in rows))
+
+    def refresh(self) -> bool:
+        """Reload if another process (or manager) has replaced the file; True if it did."""
+        if file_stamp(self.path) == self._stamp:
+            return False
+        self._load()
+        return True
+
+    def _save(self) -> None:
+        self._publish()
+        write_json(self.path, self._data)
+        # Callers hold the file lock, so this is the stamp of our own write
+        self._stamp = file_stamp(self.path)
 
-    def list(self) -> List[Dict]:
-        return list(self._data.get("customers", []))
+    def list(self) -> RecordView:
+        """All customers as a read-only snapshot, shared by every caller until the next change."""
+        self.refresh()
+        return self._snapshot[1]
 
-    def find_by_id(self, customer_id: str) -> Optional[Dict]:
-        for c in self._data.get("customers", []):
+    def find_by_id(self, customer_id: str) -> Optional[Mapping]:
+        self.refresh()
+        rows, view = self._snapshot
+        for i, c in enumerate(rows):
             if c.get("customer_id") == customer_id:
-                return c
+                return view[i]
         return None
 
-    def find_by_name(self, name: str) -> Optional[Dict]:
+    def find_by_name(self, name: str) -> Optional[Mapping]:
+        self.refresh()
         name_l = name.strip().lower()
-        for c in self._data.get("customers", []):
+        rows, view = self._snapshot
+        for i, c in enumerate(rows):
             if c.get("name", "").strip().lower() == name_l:
-                return c
+                return view[i]
         return None
 
     def add_or_update(self, customer: Dict) -> bool:
-        if not validate_customer(customer):
-            return False
-        existing = self.find_by_id(customer["customer_id"])
-        if existing:
-            existing.update(customer)
-        else:
-            self._data.setdefault("customers", []).append(customer)
-        write_json(self.path, self._data)
-        return True
+        return self.add_or_update_many([customer])[0]
+
+    def add_or_update_many(self, customers: Iterable[Dict], journal: bool = True) -> List[bool]:
+        """Insert or update several customers with a single file write; False for each invalid one.
+
+        ``journal=False`` is for changes replicated from another machine.
+        """
+        with file_lock(self.path):
+            self.refresh()
+            rows = self._data.setdefault("customers", [])
+            # key -> position; reversed so that the first of any duplicates wins
+            by_key = {rows[i].get("customer_id", ""): i for i in range(len(rows) - 1, -1, -1)}
+            results: List[bool] = []
+            saved: List[Dict] = []
+            for customer in customers:
+                if not validate_customer(customer):
+                    results.append(False)
+                    continue
+                pos = by_key.get(customer["customer_id"])
+                # New dicts rather than updates, so snapshots already handed out stay as they were
+                if pos is not None:
+                    rows[pos] = existing = {**rows[pos], **customer}
+                else:
+                    existing = dict(customer)
+                    rows.append(existing)
+                    by_key[customer["customer_id"]] = len(rows) - 1
+                results.append(True)
+                # The whole merged record, so every machine ends up with the same one
+                saved.append(existing)
+            if saved:
+                self._save()
+                if journal and self.journal is not None:
+                    self.journal.append("customer.upsert", saved)
+        return results
 
     def delete(self, customer_id: str) -> bool:
-        customers = self._data.get("customers", [])
-        new_list = [c for c in customers if c.get("customer_id") != customer_id]
-        if len(new_list) == len(customers):
-            return False
-        self._data["customers"] = new_list
-        write_json(self.path, self._data)
+        with file_lock(self.path):
+            self.refresh()
+            customers = self._data.get("customers", [])
+            new_list = [c for c in customers if c.get("customer_id") != customer_id]
+            if len(new_list) == len(customers):
+                return False
+            self._data["customers"] = new_list
+            self._save()
         return True
 
-    def update_totals_from_invoices(self, invoices: List[Dict]) -> None:
+    def update_totals_from_invoices(self, invoices: Iterable[Mapping]) -> None:
         totals = {}
         for inv in invoices:
             cid = inv.get("customer_id")
@@ -62,10 +125,12 @@ class CustomerManager:
             totals[cid]["purchases"] += 1
             totals[cid]["amount"] += float(inv.get("grand_total", 0))
 
-        for c in self._data.get("customers", []):
-            t = totals.get(c.get("customer_id"), {"purchases": 0, "amount": 0.0})
-            c["total_purchases"] = t["purchases"]
-            c["total_amount"] = round(t["amount"], 2)
-        write_json(self.path, self._data)
+        with file_lock(self.path):
+            self.refresh()
+            rows = self._data.get("customers", [])
+            for i, c in enumerate(rows):
+                t = totals.get(c.get("customer_id"), {"purchases": 0, "amount": 0.0})
+                rows[i] = {**c, "total_purchases": t["purchases"], "total_amount": round(t["amount"], 2)}
+            self._save()
 
 
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""GST slab and HSN summaries for a filing period.
+
+One pass over the period's invoices fills the rate-slab table, the HSN table
+and the B2B/B2CS sections of a GSTR-1-style return. Supply is intra-state
+(CGST + SGST) when the customer's GSTIN state code matches the company's or
+is unknown, inter-state (IGST) otherwise. Invoices saved with ``gst_slabs``
+are summarised from that instead of their line items, except for HSN.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from config.defaults import app_paths
+from logic.aggregation import item_product, item_values
+from utils.helpers import month_key, parse_date, read_json, to_float
+from utils.tasks import CancelToken, ProgressFn, check_cancel, report_progress
+
+# Suffixes the billing page adds to product names for packet sizes
+PACK_SUFFIXES = (" 1/2kg", " 1kg")
+PROGRESS_EVERY = 1000
+
+
+def state_code(gstin: str) -> str:
+    gstin = (gstin or "").strip()
+    return gstin[:2] if len(gstin) == 15 and gstin[:2].isdigit() else ""
+
+
+def base_product_name(name: str) -> str:
+    for suffix in PACK_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def invoice_slabs(items: Iterable[Mapping]) -> List[List[float]]:
+    """``[[rate, taxable, tax], ...]`` for one invoice; stored on the invoice at save time."""
+    slabs: Dict[float, List[float]] = {}
+    for it in items:
+        _qty, taxable, tax, _revenue = item_values(it)
+        if not taxable and not tax:
+            continue
+        row = slabs.setdefault(to_float(it.get("gst", 0)), [0.0, 0.0])
+        row[0] += taxable
+        row[1] += tax
+    return [[rate, round(t, 2), round(g, 2)] for rate, (t, g) in sorted(slabs.items())]
+
+
+def _split(tax: float, intra: bool) -> Tuple[float, float, float]:
+    """(igst, cgst, sgst); the odd paisa of an intra-state split goes to SGST."""
+    tax = round(tax, 2)
+    if not intra:
+        return tax, 0.0, 0.0
+    cgst = round(tax / 2, 2)
+    return 0.0, cgst, round(tax - cgst, 2)
+
+
+def _gstr_date(dt_str: str) -> str:
+    d = parse_date(dt_str)
+    return d.strftime("%d-%m-%Y") if d else dt_str
+
+
+class TaxSummary:
+    """Tax tables for one month ("YYYY-MM"); a blank month takes every invoice fed in."""
+
+    def __init__(
+        self,
+        month: str,
+        company_gstin: str = "",
+        customer_gstins: Optional[Mapping[str, str]] = None,
+        hsn_codes: Optional[Mapping[str, str]] = None,
+        with_hsn: bool = True,
+    ) -> None:
+        self.month = month
+        self.company_gstin = (company_gstin or "").strip()
+        self.company_state = state_code(self.company_gstin)
+        self.customer_gstins = customer_gstins or {}
+        self.hsn_codes = hsn_codes or {}
+        self.with_hsn = with_hsn
+        self.invoices = 0
+        # rate -> [invoices, taxable, igst, cgst, sgst]
+        self._slabs: Dict[float, List[float]] = {}
+        # (hsn, rate) -> [description, qty, value, taxable, tax, intra tax]
+        self._hsn: Dict[Tuple[str, float], List[Any]] = {}
+        self._b2b: List[Dict[str, Any]] = []
+        # (intra, pos, rate) -> [taxable, tax]
+        self._b2cs: Dict[Tuple[bool, str, float], List[float]] = {}
+
+    def _hsn_for(self, it: Mapping) -> str:
+        code = it.get("hsn")
+        if code:
+            return str(code)
+        name = item_product(it)
+        return self.hsn_codes.get(name) or self.hsn_codes.get(base_product_name(name), "")
+
+    def add(self, inv: Mapping) -> None:
+        if inv.get("status") == "cancelled" or (self.month and month_key(inv.get("date", "")) != self.month):
+            return
+        ctin = (self.customer_gstins.get(inv.get("customer_id", "")) or "").strip()
+        cust_state = state_code(ctin)
+        pos = cust_state or self.company_state
+        intra = not cust_state or not self.company_state or cust_state == self.company_state
+        items = inv.get("items", []) or []
+        slabs = inv.get("gst_slabs")
+        if slabs is None:
+            slabs = invoice_slabs(items)
+        if not slabs:
+            return
+        self.invoices += 1
+
+        itms = []
+        for rate, taxable, tax in slabs:
+            igst, cgst, sgst = _split(tax, intra)
+            row = self._slabs.setdefault(rate, [0, 0.0, 0.0, 0.0, 0.0])
+            row[0] += 1
+            row[1] += taxable
+            row[2] += igst
+            row[3] += cgst
+            row[4] += sgst
+            if cust_state:
+                itms.append({"num": len(itms) + 1, "itm_det": {"rt": rate, "txval": taxable, "iamt": igst, "camt": cgst, "samt": sgst, "csamt": 0}})
+            else:
+                acc = self._b2cs.setdefault((intra, pos, rate), [0.0, 0.0])
+                acc[0] += taxable
+                acc[1] += tax
+        if itms:
+            self._b2b.append(
+                {
+                    "ctin": ctin,
+                    "inum": inv.get("invoice_no", ""),
+                    "date": inv.get("date", ""),
+                    "val": round(to_float(inv.get("grand_total", 0)), 2),
+                    "pos": pos,
+                    "itms": itms,
+                }
+            )
+
+        if self.with_hsn:
+            for it in items:
+                qty, taxable, tax, revenue = item_values(it)
+                if not taxable and not tax:
+                    continue
+                key = (self._hsn_for(it), to_float(it.get("gst", 0)))
+                row = self._hsn.get(key)
+                if row is None:
+                    row = self._hsn[key] = [base_product_name(item_product(it)), 0.0, 0.0, 0.0, 0.0, 0.0]
+                row[1] += qty
+                row[2] += revenue
+                row[3] += taxable
+                row[4] += tax
+                if intra:
+                    row[5] += tax
+
+    def run(self, invoices: Iterable[Mapping], progress: Optional[ProgressFn] = None, cancel: Optional[CancelToken] = None) -> "TaxSummary":
+        add = self.add
+        total = len(invoices) if isinstance(invoices, Sequence) else 0
+        for n, inv in enumerate(invoices, 1):
+            add(inv)
+            if n % PROGRESS_EVERY == 0:
+                check_cancel(cancel)
+                report_progress(progress, n, total)
+        return self
+
+    def slabs(self) -> List[Dict[str, float]]:
+        out = []
+        for rate, (count, taxable, igst, cgst, sgst) in sorted(self._slabs.items()):
+            out.append(
+                {
+                    "rate": rate,
+                    "invoices": int(count),
+                    "taxable": round(taxable, 2),
+                    "igst": round(igst, 2),
+                    "cgst": round(cgst, 2),
+                    "sgst": round(sgst, 2),
+                    "tax": round(igst + cgst + sgst, 2),
+                }
+            )
+        return out
+
+    def hsn(self) -> List[Dict[str, Any]]:
+        out = []
+        for (code, rate), (desc, qty, value, taxable, tax, intra_tax) in sorted(self._hsn.items()):
+            _i, cgst, sgst = _split(intra_tax, True)
+            out.append(
+                {
+                    "hsn": code,
+                    "description": desc,
+                    "rate": rate,
+                    "quantity": round(qty, 3),
+                    "value": round(value, 2),
+                    "taxable": round(taxable, 2),
+                    "igst": round(tax - intra_tax, 2),
+                    "cgst": cgst,
+                    "sgst": sgst,
+                }
+            )
+        return out
+
+    def b2b(self) -> List[Dict[str, Any]]:
+        return self._b2b
+
+    def b2cs(self) -> List[Dict[str, Any]]:
+        out = []
+        for (intra, pos, rate), (taxable, tax) in sorted(self._b2cs.items(), key=lambda kv: (not kv[0][0], kv[0][1], kv[0][2])):
+            igst, cgst, sgst = _split(tax, intra)
+            out.append(
+                {
+                    "supply_type": "INTRA" if intra else "INTER",
+                    "pos": pos,
+                    "rate": rate,
+                    "taxable": round(taxable, 2),
+                    "igst": igst,
+                    "cgst": cgst,
+                    "sgst": sgst,
+                }
+            )
+        return out
+
+    def gstr1(self) -> Dict[str, Any]:
+        """GSTR-1-style return: B2B invoices grouped by recipient, B2CS and HSN summaries."""
+        by_ctin: Dict[str, List[Dict[str, Any]]] = {}
+        for inv in self._b2b:
+            entry = {
+                "inum": inv["inum"],
+                "idt": _gstr_date(inv["date"]),
+                "val": inv["val"],
+                "pos": inv["pos"],
+                "rchrg": "N",
+                "inv_typ": "R",
+                "itms": inv["itms"],
+            }
+            by_ctin.setdefault(inv["ctin"], []).append(entry)
+        year, mon = (self.month.split("-") + [""])[:2]
+        return {
+            "gstin": self.company_gstin,
+            "fp": f"{mon}{year}",
+            "b2b": [{"ctin": ctin, "inv": invs} for ctin, invs in by_ctin.items()],
+            "b2cs": [
+                {
+                    "sply_ty": r["supply_type"],
+                    "pos": r["pos"],
+                    "typ": "OE",
+                    "rt": r["rate"],
+                    "txval": r["taxable"],
+                    "iamt": r["igst"],
+                    "camt": r["cgst"],
+                    "samt": r["sgst"],
+                    "csamt": 0,
+                }
+                for r in self.b2cs()
+            ],
+            "hsn": {
+                "data": [
+                    {
+                        "num": n,
+                        "hsn_sc": r["hsn"],
+                        "desc": r["description"],
+                        "uqc": "NOS",
+                        "qty": r["quantity"],
+                        "rt": r["rate"],
+                        "val": r["value"],
+                        "txval": r["taxable"],
+                        "iamt": r["igst"],
+                        "camt": r["cgst"],
+                        "samt": r["sgst"],
+                        "csamt": 0,
+                    }
+                    for n, r in enumerate(self.hsn(), 1)
+                ]
+            },
+        }
+
+
+def load_tax_context() -> Dict[str, Any]:
+    """Company GSTIN, customer GSTINs and product HSN codes from the data files."""
+    paths = app_paths()
+    settings = read_json(paths["settings"]) or {}
+    customers = (read_json(paths["customers"]) or {}).get("customers", [])
+    products = (read_json(paths["products"]) or {}).get("products", [])
+    return {
+        "company_gstin": (settings.get("company", {}) or {}).get("gst_number", ""),
+        "customer_gstins": {c.get("customer_id", ""): c.get("gst_number", "") for c in customers if c.get("gst_number")},
+        "hsn_codes": {p.get("product_name", ""): str(p.get("hsn_code", "")) for p in products if p.get("hsn_code")},
+    }
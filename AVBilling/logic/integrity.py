@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Consistency checks over the data files, with optional repair.
+
+Every problem is reported as a dict (``file``, ``problem``, optionally
+``invoice_no``, and ``fixed`` when repair was asked for). Repairs only touch
+derived values: invoice totals and ``gst_slabs`` are recomputed from the
+line items, and stale rollups are rebuilt. Nothing is ever deleted.
+"""
+
+from __future__ import annotations
+
+import json
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from config.defaults import app_paths, current_financial_year
+from logic.billing_calculator import calculate_invoice_totals
+from logic.gst_summary import invoice_slabs
+from logic.records import LineItem, load_invoice, new_memo
+from logic.rollups import RollupStore
+from utils.helpers import file_lock, to_float, write_json
+from utils.tasks import CancelToken, check_cancel
+from utils.validators import validate_invoice
+
+# Stored totals may differ from a recomputation by rounding at most
+TOTAL_TOLERANCE = 0.01
+TOTAL_FIELDS = (("subtotal", "subtotal"), ("discount_total", "discount"), ("gst_total", "gst"), ("grand_total", "total"))
+
+
+def _load(path: Path, problems: List[Dict]) -> Optional[Dict]:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        problems.append({"file": str(path), "problem": f"unreadable: {e}"})
+        return None
+
+
+def check_invoices(invoices: List[Dict], fix: bool = False) -> Iterator[Dict]:
+    """Problems in one FY's invoices; with ``fix``, wrong totals/slabs are corrected in place."""
+    seen = set()
+    for inv in invoices:
+        inv_no = inv.get("invoice_no", "")
+        if inv_no in seen:
+            yield {"invoice_no": inv_no, "problem": "duplicate invoice number"}
+        seen.add(inv_no)
+        if not validate_invoice(inv):
+            yield {"invoice_no": inv_no, "problem": "missing invoice number, date or items"}
+            continue
+        # Computed the way the app would, from records (the file may use legacy field names)
+        items = [LineItem.from_dict(it) for it in inv.get("items", []) or []]
+        totals = calculate_invoice_totals(items)
+        wrong = [field for field, key in TOTAL_FIELDS if abs(to_float(inv.get(field, 0)) - totals[key]) > TOTAL_TOLERANCE]
+        # Invoices saved before gst_slabs existed are fine without them
+        slabs = inv.get("gst_slabs")
+        if slabs is not None and slabs != invoice_slabs(items):
+            wrong.append("gst_slabs")
+        if wrong:
+            if fix:
+                for field, key in TOTAL_FIELDS:
+                    inv[field] = totals[key]
+                inv["gst_slabs"] = invoice_slabs(items)
+            yield {"invoice_no": inv_no, "problem": "totals do not match line items: " + ", ".join(wrong), "fixed": fix}
+
+
+def verify_data(fix: bool = False, cancel: Optional[CancelToken] = None) -> Iterator[Dict]:
+    paths = app_paths()
+    problems: List[Dict] = []
+    for key in ("settings", "customers", "products"):
+        if paths[key].exists():
+            _load(paths[key], problems)
+    yield from problems
+
+    for path in sorted(paths["invoices"].glob("*.json")):
+        check_cancel(cancel)
+        # A repair rewrites the file; keep other processes from writing between the read and that
+        with file_lock(path) if fix else nullcontext():
+            yield from _verify_invoice_file(path, fix)
+
+
+def _verify_invoice_file(path: Path, fix: bool) -> Iterator[Dict]:
+    problems = []
+    data = _load(path, problems)
+    yield from problems
+    if data is None:
+        return
+    invoices = data.get("invoices")
+    if not isinstance(invoices, list):
+        # New FY files start as {"invoices": {}}
+        if invoices:
+            yield {"file": str(path), "problem": "invoices is not a list"}
+        return
+    found = [dict(p, file=str(path)) for p in check_invoices(invoices, fix)]
+    yield from found
+    version = int(data.get("version", 0))
+    if fix and any(p.get("fixed") for p in found):
+        version += 1
+        data["version"] = version
+        write_json(path, data, records=True)
+    if path.stem == current_financial_year():
+        rollups = RollupStore(path)
+        if not rollups.load(version):
+            if fix:
+                memo = new_memo()
+                rollups.rebuild([load_invoice(inv, memo) for inv in invoices], version)
+            yield {"file": str(rollups.dir), "problem": "report rollups missing or stale", "fixed": fix}
+
+
+def verify_backups(cancel: Optional[CancelToken] = None) -> Iterator[Dict]:
+    """Read back every file of every snapshot, checking chunk and file hashes."""
+    from logic.backup_manager import BackupManager
+    from logic.backup_store import BackupError
+
+    manager = BackupManager()
+    for manifest in manager.list_snapshots():
+        for rel, entry in manifest.get("files", {}).items():
+            check_cancel(cancel)
+            try:
+                manager.read_file(entry)
+            except BackupError as e:
+                yield {"file": f"snapshot {manifest.get('id', '')}: {rel}", "problem": str(e)}
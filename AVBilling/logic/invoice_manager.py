@@ -5,62 +5,297 @@ from __future__ import annotations
 
 import json
 from datetime import date
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional
+from bisect import bisect_right
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import threading
 
 from config.defaults import app_paths, current_financial_year
-from logic.billing_calculator import calculate_invoice_totals
-from utils.helpers import read_json, write_json
+from logic.billing_calculator import calculate_invoice_totals, calculate_line_total
+from logic.gst_summary import invoice_slabs
+from logic.invoice_query import InvoiceIndex, iter_line_rows, row_layout
+from logic.journal import DEFAULT_SERIES, invoice_series, journal_for
+from logic.records import Invoice, LineItem, RecordView, load_invoice, new_memo, shared_floats
+from logic.rollups import RollupStore
+from utils.helpers import file_lock, file_stamp, read_json, to_float, write_json
+from utils.memo import LRUCache
+from utils.metrics import timed
 from utils.validators import validate_invoice
 
 
+def _line_item(item: Dict) -> LineItem:
+    """Record for one line item, with its amounts filled in when the sender left them out."""
+    item = LineItem.from_dict(item)
+    if item.get("line_total") is not None and item.get("gst_amount") is not None:
+        return item
+    # Invoices from the CLI, the API or another machine may carry only quantity, rate and rates
+    line = calculate_line_total(
+        to_float(item.get("quantity", 0)), to_float(item.get("rate", 0)), to_float(item.get("discount", 0)), to_float(item.get("gst", 0))
+    )
+    amounts = {"line_total": line["total"], "gst_amount": line["gst"]}
+    return item.replace(**{key: value for key, value in amounts.items() if item.get(key) is None})
+
+
+# Matching invoices per query filter set; keyed on version_key(), so writes never purge it
+query_cache = LRUCache(maxsize=32)
+
+
+class InvoiceSnapshot:
+    """One saved version of the FY file, as readers see it.
+
+    Published by the manager once a change is on disk and not changed
+    after (``rollups`` is filled in once, on first use), so reading needs
+    no lock and never waits for a write. The number lookup and the query
+    index are built on first use; after a save they start from the previous
+    snapshot's, since saves only append invoices or replace them in place.
+    """
+    __slots__ = ("view", "version", "key", "rollups", "_by_no", "_index", "_base")
+
+    def __init__(self, view: RecordView, version: int, key: Tuple, base: Optional["InvoiceSnapshot"] = None) -> None:
+        self.view = view
+        self.version = version
+        self.key = key
+        self.rollups: Optional[RollupStore] = None
+        self._by_no: Optional[Dict[str, int]] = None
+        self._index: Optional[InvoiceIndex] = None
+        # (lookup, index, invoice count) of the snapshot this one extends; never the old records
+        self._base = None if base is None else (base._by_no, base._index, len(base.view))
+
+    def position(self, invoice_no: str) -> Optional[int]:
+        by_no = self._by_no
+        if by_no is None:
+            # Readers racing here build equal maps; whichever is kept is fine
+            view, (base, _index, start) = self.view, self._base or (None, None, 0)
+            if base is None:
+                # Reversed so that the first of any duplicates wins, as a scan would find it
+                by_no = {view[pos].get("invoice_no"): pos for pos in range(len(view) - 1, -1, -1)}
+            else:
+                by_no = base if start == len(view) else dict(base)
+                for pos in range(start, len(view)):
+                    by_no.setdefault(view[pos].get("invoice_no"), pos)
+            self._by_no = by_no
+        return by_no.get(invoice_no)
+
+    def index(self) -> InvoiceIndex:
+        index = self._index
+        if index is None:
+            view, (_by_no, base, start) = self.view, self._base or (None, None, 0)
+            if base is None:
+                index = InvoiceIndex(view)
+            else:
+                index = base if start == len(view) else base.copy()
+                for pos in range(start, len(view)):
+                    index.add(pos, view[pos])
+            self._index = index
+        return index
+
+
 class InvoiceManager:
     def __init__(self) -> None:
         self.paths = app_paths()
         self.fy = current_financial_year()
         self.path = self.paths["invoices"] / f"{self.fy}.json"
-        data = read_json(self.path)
-        self._data = data if data else {"invoices": []}
-        self._gate_pass_state: Dict[str, int] = {}  # date -> last number
         self._lock = threading.RLock()
+        self._gate_pass_state: Dict[str, int] = {}  # date -> last number
+        self._rollups: Optional[RollupStore] = None
+        # Number series (FY/<series>/0001); machines that replicate to each other use one each
+        self.series = invoice_series(self.paths).replace("/", "-")
+        # Highest number of this series in the file; found by one scan, then kept up to date
+        self._last_number: Optional[int] = None
+        # Encoded JSON line per invoice, so a save only encodes new or changed ones
+        self._lines: Dict[int, Tuple[Invoice, bytes]] = {}
+        # invoice_no -> position in the list for writers, built on first lookup
+        self._by_no: Optional[Dict[str, int]] = None
+        # What readers see; replaced, never changed, when the invoices change
+        self._snap = InvoiceSnapshot(RecordView(), 0, ())
+        # Highest version this manager has loaded or written; a restore can put an older one on disk
+        self._top_version = 0
+        # Change log for replication; None unless enabled in settings
+        self.journal = journal_for(self.paths)
+        self._load()
+
+    def _load(self) -> None:
+        # Stamp before reading: a replace in between only costs one more reload later
+        self._stamp = file_stamp(self.path)
+        # Invoices whose line is unchanged are kept rather than parsed again; new ones become records
+        data = read_json(
+            self.path, line_cache=self._lines, item_hook=partial(load_invoice, memo=new_memo()), parse_float=shared_floats()
+        )
+        self._data = data if data else {"invoices": []}
+        # Freshly created FY files start as {"invoices": {}}
+        if not isinstance(self._data.get("invoices"), list):
+            self._data["invoices"] = []
+        self._top_version = max(self._top_version, self.version)
+        # Everything derived from the old contents goes with them
+        self._gate_pass_state = {}
+        self._last_number = None
+        self._by_no = None
+        self._snap = InvoiceSnapshot(RecordView(self._data["invoices"]), self.version, self.version_key())
+
+    def refresh(self) -> bool:
+        """Reload if another process (or manager) has replaced the file; True if it did.
+
+        Costs one ``stat`` when nothing changed. Needs no file lock: the file
+        is only ever replaced whole, so the read sees a committed version.
+        """
+        if file_stamp(self.path) == self._stamp:
+            return False
+        with self._lock:
+            if file_stamp(self.path) == self._stamp:
+                return False
+            self._load()
+            return True
 
     def _save(self) -> None:
-        write_json(self.path, self._data)
+        # Bumped on every write and persisted, so it keeps rising across restarts; never
+        # reuses a number seen before, even after a restore put back an older file
+        self._data["version"] = self._top_version = max(self.version, self._top_version) + 1
+        write_json(self.path, self._data, records=True, line_cache=self._lines)
+        # Callers hold the file lock, so this is the stamp of our own write
+        self._stamp = file_stamp(self.path)
+        # Published only now, so readers never see changes that aren't on disk
+        snap = InvoiceSnapshot(RecordView(self._data["invoices"]), self.version, self.version_key(), self._snap)
+        if self._rollups is not None:
+            # Writers bring the rollups up to date before changing anything
+            snap.rollups = self._rollups.frozen()
+        self._snap = snap
+
+    @property
+    def version(self) -> int:
+        return int(self._data.get("version", 0))
+
+    def version_key(self) -> Tuple:
+        """Identifies this store's current contents for result caching.
+
+        The file stamp is part of it: a file replaced from outside (a restore,
+        another machine's copy) can carry a version this process has already
+        cached results for.
+        """
+        return (str(self.path), self.version, self._stamp)
+
+    def snapshot(self, rollups: bool = False) -> InvoiceSnapshot:
+        """The current saved version for readers; with ``rollups=True`` its rollups are loaded too."""
+        self.refresh()
+        snap = self._snap
+        if rollups and snap.rollups is None:
+            with self._lock:
+                self._current_rollups()
+                snap = self._snap
+        return snap
 
-    def list(self) -> List[Dict]:
-        return list(self._data.get("invoices", []))
+    def list(self) -> RecordView:
+        """This FY's invoices as a read-only snapshot, shared by every caller until the next change."""
+        return self.snapshot().view
 
+    def _number_of(self, inv_no: str) -> int:
+        if inv_no.startswith(f"{self.fy}/{self.series}/"):
+            try:
+                return int(inv_no.split("/")[-1])
+            except Exception:
+                pass
+        return 0
+
+    @timed("invoice.next_number.ms")
     def _next_invoice_number(self) -> str:
-        # Invoice numbering: FY/INV/0001
-        prefix = f"{self.fy}/INV/"
-        max_num = 0
-        for inv in self._data.get("invoices", []):
-            inv_no = inv.get("invoice_no", "")
-            if inv_no.startswith(prefix):
-                try:
-                    num = int(inv_no.split("/")[-1])
-                    max_num = max(max_num, num)
-                except Exception:
-                    continue
-        return f"{prefix}{str(max_num + 1).zfill(4)}"
+        # Invoice numbering: FY/INV/0001, or FY/<series>/0001
+        if self._last_number is None:
+            self._last_number = max((self._number_of(inv.get("invoice_no", "")) for inv in self._data.get("invoices", [])), default=0)
+        return f"{self.fy}/{self.series}/{str(self._last_number + 1).zfill(4)}"
 
+    @timed("gate_pass.next_number.ms")
     def _next_gate_pass_number(self, dt_str: Optional[str] = None) -> str:
         with self._lock:
-            # Daily reset: GP-YYYYMMDD-001
+            # Daily reset: GP-YYYYMMDD-001; GP-<series>-YYYYMMDD-001 in a series of its own,
+            # so machines that replicate never hand out the same gate pass either
             if not dt_str:
                 dt_str = date.today().strftime("%Y%m%d")
-            last = self._gate_pass_state.get(dt_str, 0) + 1
+            prefix = f"GP-{dt_str}-" if self.series == DEFAULT_SERIES else f"GP-{self.series}-{dt_str}-"
+            if dt_str not in self._gate_pass_state:
+                # Carry on from the day's numbers already in the file (other processes, earlier runs)
+                used = (inv.get("gate_pass_no", "") for inv in self._data.get("invoices", []))
+                self._gate_pass_state[dt_str] = max((int(gp[len(prefix):]) for gp in used if gp.startswith(prefix) and gp[len(prefix):].isdigit()), default=0)
+            last = self._gate_pass_state[dt_str] + 1
             self._gate_pass_state[dt_str] = last
-            return f"GP-{dt_str}-{str(last).zfill(3)}"
+            return f"{prefix}{str(last).zfill(3)}"
+
+    @timed("invoice.create.ms")
+    def create_invoice(self, payload: Dict) -> Optional[Invoice]:
+        return self.create_invoices([payload])[0]
+
+    def find(self, invoice_no: str) -> Optional[Invoice]:
+        snap = self.snapshot()
+        pos = snap.position(invoice_no)
+        return None if pos is None else snap.view[pos]
+
+    def _position(self, invoice_no: str) -> Optional[int]:
+        # Writers only, under the lock: includes invoices of the batch not saved yet
+        if self._by_no is None:
+            invoices = self._data.get("invoices", [])
+            # Reversed so that the first of any duplicates wins, as a scan would find it
+            self._by_no = {invoices[pos].get("invoice_no"): pos for pos in range(len(invoices) - 1, -1, -1)}
+        return self._by_no.get(invoice_no)
+
+    def create_invoices(self, payloads: Iterable[Dict], journal: bool = True) -> List[Optional[Invoice]]:
+        """Create several invoices with a single file write; None in place of each invalid one.
+
+        An invoice is invalid without a date or items, or when it brings an
+        ``invoice_no`` that is already taken (in the file or earlier in the batch).
 
-    def create_invoice(self, payload: Dict) -> Optional[Dict]:
+        ``journal=False`` is for changes replicated from another machine,
+        which are already in that machine's journal.
+        """
+        return self.write_batch(payloads, (), journal)[0]
+
+    def write_batch(
+        self, payloads: Iterable[Dict], changes: Iterable[Tuple[str, str]], journal: bool = True
+    ) -> Tuple[List[Optional[Invoice]], List[bool]]:
+        """``create_invoices`` then ``update_statuses``, sharing one file write."""
+        changes = list(changes)
+        # Numbers are taken from the file as it is under the lock, so processes never hand out the same one
+        with self._lock, file_lock(self.path):
+            self.refresh()
+            rollups = self._current_rollups()
+            created = self._add_invoices(payloads, rollups)
+            changed = self._set_statuses(changes, rollups)
+            if any(inv is not None for inv in created) or any(changed):
+                self._save()
+                rollups.save(self.version)
+                if journal and self.journal is not None:
+                    if any(inv is not None for inv in created):
+                        self.journal.append("invoice.create", [inv for inv in created if inv is not None])
+                    if any(changed):
+                        self.journal.append("invoice.status", [{"invoice_no": no, "status": st} for (no, st), ok in zip(changes, changed) if ok])
+        return created, changed
+
+    def _add_invoices(self, payloads: Iterable[Dict], rollups: RollupStore) -> List[Optional[Invoice]]:
+        results: List[Optional[Invoice]] = []
+        invoices = self._data.setdefault("invoices", [])
+        for payload in payloads:
+            payload = self._prepare(payload)
+            results.append(payload)
+            if payload is None:
+                continue
+            invoices.append(payload)
+            self._last_number = max(self._last_number or 0, self._number_of(payload["invoice_no"]))
+            if self._by_no is not None:
+                self._by_no[payload["invoice_no"]] = len(invoices) - 1
+            rollups.add_invoice(payload)
+        return results
+
+    def _prepare(self, payload: Dict) -> Optional[Invoice]:
         # Auto number if missing
         payload = dict(payload)
+        # Line items from the UI, the API or another machine may still use legacy field names
+        payload["items"] = [_line_item(it) for it in payload.get("items") or []]
         payload.setdefault("date", date.today().strftime("%Y-%m-%d"))
         with self._lock:
             if not payload.get("invoice_no"):
                 payload["invoice_no"] = self._next_invoice_number()
+            elif self._position(payload["invoice_no"]) is not None:
+                # A number sent by the caller must not shadow the invoice that has it
+                return None
             if not payload.get("gate_pass_no"):
                 payload["gate_pass_no"] = self._next_gate_pass_number(payload.get("date").replace("-", ""))
 
@@ -70,21 +305,99 @@ class InvoiceManager:
         payload["discount_total"] = totals["discount"]
         payload["gst_total"] = totals["gst"]
         payload["grand_total"] = totals["total"]
+        # Per-rate taxable/tax, so GST summaries don't have to re-walk line items
+        payload["gst_slabs"] = invoice_slabs(payload.get("items", []))
         payload.setdefault("status", "final")  # mark as finalized when saved
 
         if not validate_invoice(payload):
             return None
-
-        with self._lock:
-            self._data.setdefault("invoices", []).append(payload)
-            self._save()
-        return payload
+        return Invoice.from_dict(payload)
 
     def update_status(self, invoice_no: str, status: str) -> bool:
-        with self._lock:
-            for inv in self._data.get("invoices", []):
-                if inv.get("invoice_no") == invoice_no:
-                    inv["status"] = status
-                    self._save()
-                    return True
-        return False
+        return self.update_statuses([(invoice_no, status)])[0]
+
+    def update_statuses(self, changes: Iterable[Tuple[str, str]], journal: bool = True) -> List[bool]:
+        """Apply (invoice_no, status) changes in order with a single file write; False for unknown numbers."""
+        return self.write_batch((), changes, journal)[1]
+
+    def _set_statuses(self, changes: List[Tuple[str, str]], rollups: RollupStore) -> List[bool]:
+        results: List[bool] = []
+        invoices = self._data.get("invoices", [])
+        for invoice_no, status in changes:
+            pos = self._position(invoice_no)
+            results.append(pos is not None)
+            if pos is None:
+                continue
+            # Records are never changed in place; lists already handed out keep the old one
+            old = invoices[pos]
+            invoices[pos] = old.replace(status=status)
+            self._lines.pop(id(old), None)
+            rollups.status_changed(invoices[pos], old.get("status"))
+        return results
+
+    def query(
+        self,
+        customer_id: str = "",
+        product: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        status: str = "",
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Iterator[List]:
+        """Lazy master-report rows (one per line item) matching the filters.
+
+        Customer and date filters are answered from the index before any line
+        item is read; ``offset``/``limit`` page over the resulting rows. Which
+        invoices match is memoized on the filters and ``version_key()``, so
+        turning pages costs one page of rows.
+        """
+        # Fixed up front: invoices saved or changed later never show up in this stream
+        snap = self.snapshot()
+        invoices = snap.view
+        key = (customer_id.strip().lower(), product.strip().lower(), date_from.strip(), date_to.strip(), status) + snap.key
+        layout = query_cache.get(key)
+        if layout is None:
+            positions = snap.index().positions(customer_id, date_from.strip(), date_to.strip())
+            layout = row_layout(invoices, positions, status, product)
+            query_cache.put(key, layout)
+        found, starts = layout
+        # The first invoice holding row ``offset``; rows before it are never generated
+        first = max(bisect_right(starts, offset) - 1, 0)
+        rows = iter_line_rows((invoices[p] for p in islice(found, first, None)), product)
+        offset -= starts[first]
+        stop = None if limit is None else offset + limit
+        return islice(rows, offset, stop)
+
+    def rollups(self) -> RollupStore:
+        """Daily/monthly rollups for this FY, loaded (or rebuilt if stale) on first use.
+
+        A read-only copy of the saved state, safe to query while invoices are saved.
+        """
+        return self.snapshot(rollups=True).rollups
+
+    def _current_rollups(self) -> RollupStore:
+        """The writable rollups, up to date with the file; callers hold the lock."""
+        self.refresh()
+        if self._rollups is None or self._rollups.version != self.version:
+            # Locked so a rebuild from these invoices can't overwrite newer rollups of another process
+            with file_lock(self.path):
+                self.refresh()
+                if self._rollups is None:
+                    self._rollups = RollupStore(self.path)
+                # After a reload only the months another process changed are read again
+                self._rollups.ensure(self._snap.view, self.version)
+        if self._snap.rollups is None:
+            self._snap.rollups = self._rollups.frozen()
+        return self._rollups
+
+    def rebuild_rollups(self) -> None:
+        with self._lock, file_lock(self.path):
+            self.refresh()
+            self._rollups = RollupStore(self.path)
+            self._rollups.rebuild(self._snap.view, self.version)
+            # Readers move to the rebuilt copy with their next call
+            snap = InvoiceSnapshot(self._snap.view, self.version, self.version_key(), self._snap)
+            snap.rollups = self._rollups.frozen()
+            self._snap = snap
+
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Indexed filtering of invoices and their line items.
+
+``InvoiceIndex`` keeps invoice positions sorted by date and grouped by
+customer ID, so a query narrows the candidate invoices before any line item
+is looked at. Filters keep the master report's semantics: customer and
+product are case-insensitive substrings, dates compare as ISO strings.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from utils.helpers import parse_date, to_float
+
+
+def date_cell(dt_str: str):
+    # Real date cells sort and filter properly in Excel; keep odd strings as text
+    return parse_date(dt_str) or dt_str
+
+
+def iter_line_rows(invoices: Iterable[Dict], product: str = "") -> Iterator[List]:
+    prod = product.strip().lower()
+    for inv in invoices:
+        dt = date_cell(inv.get("date", ""))
+        for it in inv.get("items", []):
+            name = it.get("product_name", "")
+            if prod and prod not in str(name).lower():
+                continue
+            yield [
+                dt,
+                inv.get("invoice_no", ""),
+                inv.get("customer_id", ""),
+                inv.get("customer_name", ""),
+                name,
+                to_float(it.get("quantity", 0)),
+                to_float(it.get("rate", 0)),
+                to_float(it.get("discount", 0)),
+                to_float(it.get("line_total", 0)),
+            ]
+
+
+def row_layout(
+    invoices: Sequence[Mapping], positions: Optional[Iterable[int]], status: str = "", product: str = ""
+) -> Tuple[List[int], List[int]]:
+    """Positions of the invoices with matching rows, and the row number each one starts at.
+
+    The starts list ends with the total row count, so a page at any offset is
+    found with one bisect instead of generating every row before it.
+    """
+    prod = product.strip().lower()
+    found, starts = [], [0]
+    for pos in range(len(invoices)) if positions is None else positions:
+        inv = invoices[pos]
+        if status and inv.get("status", "final") != status:
+            continue
+        items = inv.get("items", [])
+        count = sum(1 for it in items if prod in str(it.get("product_name", "")).lower()) if prod else len(items)
+        if count:
+            found.append(pos)
+            starts.append(starts[-1] + count)
+    return found, starts
+
+
+class InvoiceIndex:
+    def __init__(self, invoices: Sequence[Mapping] = ()) -> None:
+        self._by_date: List[Tuple[str, int]] = []
+        self._by_customer: Dict[str, List[int]] = {}
+        for pos, inv in enumerate(invoices):
+            self._by_date.append((inv.get("date", ""), pos))
+            self._by_customer.setdefault(str(inv.get("customer_id", "")).lower(), []).append(pos)
+        self._by_date.sort()
+
+    def copy(self) -> "InvoiceIndex":
+        other = InvoiceIndex()
+        other._by_date = list(self._by_date)
+        other._by_customer = {key: list(plist) for key, plist in self._by_customer.items()}
+        return other
+
+    def add(self, pos: int, inv: Mapping) -> None:
+        insort(self._by_date, (inv.get("date", ""), pos))
+        self._by_customer.setdefault(str(inv.get("customer_id", "")).lower(), []).append(pos)
+
+    def positions(self, customer_id: str = "", date_from: str = "", date_to: str = "") -> Optional[List[int]]:
+        """Positions matching customer/date filters in file order, or None when unfiltered."""
+        found = None
+        if date_from or date_to:
+            lo = bisect_left(self._by_date, (date_from,)) if date_from else 0
+            hi = bisect_right(self._by_date, (date_to, float("inf"))) if date_to else len(self._by_date)
+            found = {pos for _d, pos in self._by_date[lo:hi]}
+        cid = customer_id.strip().lower()
+        if cid:
+            # Substring match runs over distinct customer IDs, not invoices
+            by_customer = set()
+            for key, plist in self._by_customer.items():
+                if cid in key:
+                    by_customer.update(plist)
+            found = by_customer if found is None else found & by_customer
+        return None if found is None else sorted(found)
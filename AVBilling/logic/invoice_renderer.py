@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import StyleSheet1, getSampleStyleSheet
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from config.defaults import app_paths
+from utils.helpers import read_json
+
+LOGO_BOX = (120, 60)
+# Keep the cached logo at ~3x its drawn size so prints stay sharp
+LOGO_OVERSAMPLE = 3
+TEMPLATES = ("simple", "detailed", "compact")
+
+
+def _stamp(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class _Logo(Flowable):
+    def __init__(self, reader: ImageReader, width: float, height: float) -> None:
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+
+    def draw(self) -> None:
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask="auto")
+
+
+class InvoiceRenderer:
+    """Platypus invoice renderer that keeps settings, logo and styles between calls.
+
+    Every render stats the settings and logo files; a changed mtime or size
+    drops the matching cache entry so edits show up on the next print.
+    """
+
+    def __init__(self, settings_path: Optional[Path] = None) -> None:
+        self.settings_path = settings_path or app_paths()["settings"]
+        self._settings: Dict[str, Any] = {}
+        self._settings_stamp: Optional[Tuple[int, int]] = None
+        self._logo: Optional[Tuple[ImageReader, float, float]] = None
+        self._logo_key: Optional[Tuple[str, Optional[Tuple[int, int]]]] = None
+        self._stylesheet: Optional[StyleSheet1] = None
+        self._table_styles: Dict[str, TableStyle] = {}
+
+    def settings(self) -> Dict[str, Any]:
+        stamp = _stamp(self.settings_path)
+        if stamp != self._settings_stamp:
+            self._settings = read_json(self.settings_path) or {}
+            self._settings_stamp = stamp
+        return self._settings
+
+    def logo(self) -> Optional[Tuple[ImageReader, float, float]]:
+        logo_file = (self.settings().get("company", {}) or {}).get("logo_path", "")
+        if not logo_file:
+            self._logo, self._logo_key = None, None
+            return None
+        key = (logo_file, _stamp(Path(logo_file)))
+        if key != self._logo_key:
+            self._logo_key = key
+            self._logo = self._load_logo(logo_file) if key[1] else None
+        return self._logo
+
+    def _load_logo(self, logo_file: str) -> Optional[Tuple[ImageReader, float, float]]:
+        try:
+            from PIL import Image as PILImage
+
+            with PILImage.open(logo_file) as im:
+                im.load()
+                box_w, box_h = LOGO_BOX
+                scale = min(box_w / im.width, box_h / im.height)
+                draw_w, draw_h = im.width * scale, im.height * scale
+                im = im.convert("RGBA" if "A" in im.getbands() else "RGB")
+                im.thumbnail((int(draw_w * LOGO_OVERSAMPLE), int(draw_h * LOGO_OVERSAMPLE)))
+                reader = ImageReader(im.copy())
+            # Decode once; later renders reuse the pixel data
+            reader.getRGBData()
+            return reader, draw_w, draw_h
+        except Exception:
+            return None
+
+    def styles(self) -> StyleSheet1:
+        if self._stylesheet is None:
+            self._stylesheet = getSampleStyleSheet()
+        return self._stylesheet
+
+    def table_style(self, template: str) -> TableStyle:
+        style = self._table_styles.get(template)
+        if style is None:
+            style = TableStyle(
+                [
+                    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+                    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+                    ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
+                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+                    ("FONTSIZE", (0, 0), (-1, -1), 9),
+                ]
+            )
+            self._table_styles[template] = style
+        return style
+
+    def render(self, invoice: Dict, path) -> None:
+        styles = self.styles()
+        doc = SimpleDocTemplate(path, pagesize=A4, leftMargin=32, rightMargin=32, topMargin=32, bottomMargin=32)
+        story = []
+        # Template selection can alter style and columns
+        template = (invoice.get("template") or "simple").lower()
+        if template not in TEMPLATES:
+            template = "simple"
+        title_text = "AVBilling Invoice" if template == "simple" else ("Invoice - Detailed" if template == "detailed" else "Invoice (Compact)")
+        story.append(Paragraph(title_text, styles["Title"]))
+        company = (invoice.get("company") or "")
+        if company:
+            story.append(Paragraph(company, styles["Heading3"]))
+        logo = self.logo()
+        if logo:
+            reader, w, h = logo
+            story.append(Spacer(1, 6))
+            story.append(_Logo(reader, w, h))
+            story.append(Spacer(1, 6))
+        meta = Paragraph(
+            f"Invoice No: {invoice.get('invoice_no','')}<br/>Date: {invoice.get('date','')}<br/>Customer: {invoice.get('customer_name','')}",
+            styles["Normal"],
+        )
+        story.append(meta)
+        story.append(Spacer(1, 12))
+
+        if template == "compact":
+            data = [["Item", "Qty", "Total"]]
+        else:
+            data = [["Item", "Qty", "Rate", "GST%", "Total"]]
+        for it in invoice.get("items", []):
+            row = [str(it.get("product_name", ""))[:40], f"{it.get('quantity', 0)}"]
+            if template != "compact":
+                row.extend([f"{it.get('rate', 0)}", f"{it.get('gst', 0)}"])
+            row.append(f"{float(it.get('line_total', it.get('total', 0))):.2f}")
+            data.append(row)
+        tbl = Table(data, repeatRows=1)
+        tbl.setStyle(self.table_style(template))
+        story.append(tbl)
+        story.append(Spacer(1, 12))
+
+        totals = Paragraph(
+            f"Subtotal: {invoice.get('subtotal', 0):.2f}<br/>"
+            f"Discount: {invoice.get('discount_total', 0):.2f}<br/>"
+            f"GST: {invoice.get('gst_total', 0):.2f}<br/>"
+            f"Grand Total: {invoice.get('grand_total', 0):.2f}",
+            styles["Normal"],
+        )
+        story.append(totals)
+        doc.build(story)
+
+
+_renderer: Optional[InvoiceRenderer] = None
+
+
+def default_renderer() -> InvoiceRenderer:
+    # One per process, so pool workers warm their own cache across a batch
+    global _renderer
+    if _renderer is None:
+        _renderer = InvoiceRenderer()
+    return _renderer
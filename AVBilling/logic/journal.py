@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""This machine's change log for replication through a shared sync folder.
+
+When the ``replication`` settings are enabled, every invoice create, status
+change and customer/product upsert is appended as one JSON line to
+``<sync_dir>/<node>.journal.jsonl``. Only this node ever writes that file,
+and only by appending whole lines, so peers can read it while it grows;
+a line without its newline is still being written and is left for later.
+``logic.replication`` applies other nodes' journals.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import socket
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config.defaults import DEFAULT_SETTINGS
+from utils.helpers import file_lock, json_default, read_json, write_json
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+OPS = ("invoice.create", "invoice.status", "customer.upsert", "product.upsert")
+STATE_FILE = "replication.json"
+# Numbers of a single machine: FY/INV/0001 and GP-YYYYMMDD-001
+DEFAULT_SERIES = "INV"
+
+_journals: Dict[str, Optional["Journal"]] = {}
+_journals_lock = threading.Lock()
+
+
+def replication_settings(paths: Dict[str, Path]) -> Dict[str, Any]:
+    settings = read_json(paths["settings"])
+    return {**DEFAULT_SETTINGS["replication"], **(settings.get("replication", {}) or {})}
+
+
+def safe_node_id(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "-", name).strip("-")[:40]
+
+
+def node_id(paths: Dict[str, Path], settings: Optional[Dict[str, Any]] = None) -> str:
+    """The configured node name, else one generated once and kept in the replication state file."""
+    settings = settings if settings is not None else replication_settings(paths)
+    if settings.get("node_id"):
+        return safe_node_id(settings["node_id"])
+    state_path = paths["data"] / STATE_FILE
+    with file_lock(state_path):
+        state = read_json(state_path)
+        if not state.get("node_id"):
+            state["node_id"] = safe_node_id(f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}")
+            write_json(state_path, state)
+    return state["node_id"]
+
+
+def invoice_series(paths: Dict[str, Path], settings: Optional[Dict[str, Any]] = None) -> str:
+    """Series for this machine's invoice numbers: as configured, else the node id while replicating, else INV.
+
+    Machines that replicate must not hand out the same numbers, so with
+    replication on and no series set each one numbers in its own.
+    """
+    settings = settings if settings is not None else replication_settings(paths)
+    if settings.get("series"):
+        return settings["series"]
+    if settings.get("enabled") and settings.get("sync_dir"):
+        return node_id(paths, settings)
+    return DEFAULT_SERIES
+
+
+class Journal:
+    def __init__(self, sync_dir: Path, node: str) -> None:
+        self.sync_dir = Path(sync_dir)
+        self.node = node
+        self.path = self.sync_dir / f"{node}{JOURNAL_SUFFIX}"
+        self._lock = threading.Lock()
+        # Lines that could not be written yet (sync folder unreachable); sent with the next append
+        self._unsent: List[bytes] = []
+
+    def append(self, op: str, records: Iterable[Dict[str, Any]]) -> None:
+        """Append one entry per record with a single write."""
+        now = time.time()
+        lines = [
+            json.dumps({"ts": now, "node": self.node, "op": op, "data": rec}, ensure_ascii=False, separators=(",", ":"), default=json_default).encode("utf-8") + b"\n"
+            for rec in records
+        ]
+        with self._lock:
+            self._unsent.extend(lines)
+            if not self._unsent:
+                return
+            try:
+                self.sync_dir.mkdir(parents=True, exist_ok=True)
+                # Other processes on this machine (app, API server, cli) append to the same journal
+                with file_lock(self.path), self.path.open("ab") as f:
+                    f.write(b"".join(self._unsent))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._unsent.clear()
+            except OSError as e:
+                print(f"Warning: Could not write replication journal {self.path}, will retry: {e}", file=sys.stderr)
+
+
+def read_entries(path: Path, offset: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Complete entries after byte ``offset`` and the offset just past the last of them."""
+    try:
+        with path.open("rb") as f:
+            f.seek(offset)
+            raw = f.read()
+    except OSError:
+        return [], offset
+    end = raw.rfind(b"\n") + 1
+    entries = []
+    for line in raw[:end].splitlines():
+        if line.strip():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                print(f"Warning: Skipping unreadable journal line in {path.name}", file=sys.stderr)
+    return entries, offset + end
+
+
+def journal_for(paths: Dict[str, Path]) -> Optional[Journal]:
+    """This data root's journal, or None while replication is off."""
+    key = str(paths["root"])
+    with _journals_lock:
+        if key not in _journals:
+            settings = replication_settings(paths)
+            journal = None
+            if settings.get("enabled") and settings.get("sync_dir"):
+                journal = Journal(Path(settings["sync_dir"]), node_id(paths, settings))
+            _journals[key] = journal
+        return _journals[key]
+
+
+def forget_journals() -> None:
+    """Re-read the replication settings on the next ``journal_for``."""
+    with _journals_lock:
+        _journals.clear()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from __future__ import annotations
+
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from utils.metrics import timed
+from utils.tasks import CancelToken, ProgressFn, report_progress
+
+
+def filter_invoices(
+    invoices: Iterable[Dict],
+    date_from: str = "",
+    date_to: str = "",
+    customer_id: str = "",
+    status: str = "",
+) -> List[Dict]:
+    # Dates are ISO strings, so plain string comparison orders them correctly
+    cid = customer_id.strip().lower()
+    st = status.strip().lower()
+    out = []
+    for inv in invoices:
+        d = inv.get("date", "")
+        if date_from and d < date_from:
+            continue
+        if date_to and d > date_to:
+            continue
+        if cid and str(inv.get("customer_id", "")).lower() != cid:
+            continue
+        if st and str(inv.get("status", "final")).lower() != st:
+            continue
+        out.append(inv)
+    return out
+
+
+def pdf_file_name(invoice_no: str, used: Set[str]) -> str:
+    base = re.sub(r"[^A-Za-z0-9._-]+", "_", invoice_no or "invoice").strip("_") or "invoice"
+    name = f"{base}.pdf"
+    n = 2
+    while name in used:
+        name = f"{base}-{n}.pdf"
+        n += 1
+    used.add(name)
+    return name
+
+
+def render_invoice_pdf_bytes(invoice: Dict) -> bytes:
+    # Runs inside pool workers; import here keeps the parent's startup light
+    from logic.report_generator import ReportGenerator
+
+    buf = io.BytesIO()
+    ReportGenerator([]).export_invoice_pdf(invoice, buf)
+    return buf.getvalue()
+
+
+@timed("export.invoice_pdf_batch.ms")
+def export_invoice_pdfs(
+    invoices: List[Dict],
+    target: str,
+    as_zip: bool = False,
+    progress: Optional[ProgressFn] = None,
+    cancel: Optional[CancelToken] = None,
+    executor: Optional[Executor] = None,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Render many invoices across a process pool into a folder or one ZIP.
+
+    A failing invoice is recorded in ``failed`` as ``(invoice_no, error)`` and
+    does not stop the batch. Cancelling drops queued renders and keeps what was
+    already written.
+    """
+    result: Dict[str, Any] = {"target": target, "written": 0, "failed": [], "cancelled": False}
+    total = len(invoices)
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+    window = (workers or os.cpu_count() or 1) * 4
+    used: Set[str] = set()
+    zf: Optional[zipfile.ZipFile] = None
+    folder = Path(target)
+    if as_zip:
+        folder.parent.mkdir(parents=True, exist_ok=True)
+        zf = zipfile.ZipFile(target, "w", compression=zipfile.ZIP_STORED)
+    else:
+        folder.mkdir(parents=True, exist_ok=True)
+
+    pending: Dict[Future, Dict] = {}
+    queue = iter(invoices)
+    done_count = 0
+    try:
+        while True:
+            while len(pending) < window and not (cancel and cancel.cancelled):
+                inv = next(queue, None)
+                if inv is None:
+                    break
+                pending[executor.submit(render_invoice_pdf_bytes, dict(inv))] = inv
+            if not pending:
+                break
+            finished, _ = wait(list(pending), timeout=0.2, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                inv = pending.pop(fut)
+                inv_no = str(inv.get("invoice_no", ""))
+                try:
+                    data = fut.result()
+                    name = pdf_file_name(inv_no, used)
+                    if zf is not None:
+                        # PDFs are already compressed streams; storing avoids a second deflate
+                        zf.writestr(name, data)
+                    else:
+                        (folder / name).write_bytes(data)
+                    result["written"] += 1
+                except Exception as e:
+                    result["failed"].append((inv_no, str(e)))
+                done_count += 1
+                report_progress(progress, done_count, total)
+            if cancel and cancel.cancelled:
+                for fut in pending:
+                    fut.cancel()
+                result["cancelled"] = True
+                break
+    finally:
+        if zf is not None:
+            zf.close()
+        if own_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+    return result
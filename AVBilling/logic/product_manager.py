@@ -3,10 +3,14 @@
 
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional
 
 from config.defaults import app_paths
-from utils.helpers import read_json, write_json
+from logic.journal import journal_for
+from logic.records import RecordView
+from utils.helpers import file_lock, file_stamp, read_json, write_json
+from utils.metrics import timed
 from utils.validators import validate_product
 
 
@@ -14,43 +18,105 @@ class ProductManager:
     def __init__(self) -> None:
         self.paths = app_paths()
         self.path = self.paths["products"]
+        self.journal = journal_for(self.paths)
+        self._load()
+
+    def _load(self) -> None:
+        # Stamp before reading: a replace in between only costs one more reload later
+        self._stamp = file_stamp(self.path)
         self._data = read_json(self.path) or {"products": []}
+        self._publish()
+
+    def _publish(self) -> None:
+        # Rows are replaced rather than changed in place, so these proxies never change under a
+        # reader. Lookups scan the plain dicts, which is faster, and hand out the proxy; both
+        # sit in one attribute so a reader never pairs one snapshot's rows with another's view.
+        rows = tuple(self._data.get("products", []))
+        self._snapshot = (rows, RecordView(MappingProxyType(r) for r in rows))
+
+    def refresh(self) -> bool:
+        """Reload if another process (or manager) has replaced the file; True if it did."""
+        if file_stamp(self.path) == self._stamp:
+            return False
+        self._load()
+        return True
+
+    def _save(self) -> None:
+        self._publish()
+        write_json(self.path, self._data)
+        # Callers hold the file lock, so this is the stamp of our own write
+        self._stamp = file_stamp(self.path)
 
-    def list(self) -> List[Dict]:
-        return list(self._data.get("products", []))
+    def list(self) -> RecordView:
+        """All products as a read-only snapshot, shared by every caller until the next change."""
+        self.refresh()
+        return self._snapshot[1]
 
-    def find_by_code(self, code: str) -> Optional[Dict]:
+    @timed("product.find_by_code.ms")
+    def find_by_code(self, code: str) -> Optional[Mapping]:
+        self.refresh()
         code_l = code.strip().lower()
-        for p in self._data.get("products", []):
+        rows, view = self._snapshot
+        for i, p in enumerate(rows):
             if p.get("product_code", "").strip().lower() == code_l:
-                return p
+                return view[i]
         return None
 
-    def find_by_name(self, name: str) -> Optional[Dict]:
+    @timed("product.find_by_name.ms")
+    def find_by_name(self, name: str) -> Optional[Mapping]:
+        self.refresh()
         name_l = name.strip().lower()
-        for p in self._data.get("products", []):
+        rows, view = self._snapshot
+        for i, p in enumerate(rows):
             if p.get("product_name", "").strip().lower() == name_l:
-                return p
+                return view[i]
         return None
 
     def add_or_update(self, product: Dict) -> bool:
-        if not validate_product(product):
-            return False
-        existing = self.find_by_code(product["product_code"])
-        if existing:
-            existing.update(product)
-        else:
-            self._data.setdefault("products", []).append(product)
-        write_json(self.path, self._data)
-        return True
+        return self.add_or_update_many([product])[0]
+
+    def add_or_update_many(self, products: Iterable[Dict], journal: bool = True) -> List[bool]:
+        """Insert or update several products with a single file write; False for each invalid one.
+
+        ``journal=False`` is for changes replicated from another machine.
+        """
+        with file_lock(self.path):
+            self.refresh()
+            rows = self._data.setdefault("products", [])
+            # key -> position; reversed so that the first of any duplicates wins
+            by_key = {rows[i].get("product_code", "").strip().lower(): i for i in range(len(rows) - 1, -1, -1)}
+            results: List[bool] = []
+            saved: List[Dict] = []
+            for product in products:
+                if not validate_product(product):
+                    results.append(False)
+                    continue
+                pos = by_key.get(product["product_code"].strip().lower())
+                # New dicts rather than updates, so snapshots already handed out stay as they were
+                if pos is not None:
+                    rows[pos] = existing = {**rows[pos], **product}
+                else:
+                    existing = dict(product)
+                    rows.append(existing)
+                    by_key[product["product_code"].strip().lower()] = len(rows) - 1
+                results.append(True)
+                # The whole merged record, so every machine ends up with the same one
+                saved.append(existing)
+            if saved:
+                self._save()
+                if journal and self.journal is not None:
+                    self.journal.append("product.upsert", saved)
+        return results
 
     def delete(self, code: str) -> bool:
-        products = self._data.get("products", [])
-        new_list = [p for p in products if p.get("product_code") != code]
-        if len(new_list) == len(products):
-            return False
-        self._data["products"] = new_list
-        write_json(self.path, self._data)
+        with file_lock(self.path):
+            self.refresh()
+            products = self._data.get("products", [])
+            new_list = [p for p in products if p.get("product_code") != code]
+            if len(new_list) == len(products):
+                return False
+            self._data["products"] = new_list
+            self._save()
         return True
 
     # Stock handling removed as per updated requirements
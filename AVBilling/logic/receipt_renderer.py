@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Fast renderers for compact invoices, gate passes and thermal receipts.
+
+The compact PDF and the gate pass are drawn straight onto a reportlab canvas
+at fixed coordinates, skipping platypus flow layout. Receipts are plain text
+or an ESC/POS byte stream for 58/80 mm printers.
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+from reportlab.lib.pagesizes import A4, A6, landscape
+from reportlab.pdfgen import canvas
+
+from utils.helpers import to_float
+
+# Printable characters per line with the printer's default font A
+RECEIPT_COLUMNS = {58: 32, 80: 48}
+
+ESC = b"\x1b"
+GS = b"\x1d"
+ESCPOS_INIT = ESC + b"@"
+ESCPOS_CENTER = ESC + b"a\x01"
+ESCPOS_LEFT = ESC + b"a\x00"
+ESCPOS_BOLD_ON = ESC + b"E\x01"
+ESCPOS_BOLD_OFF = ESC + b"E\x00"
+ESCPOS_FEED_CUT = ESC + b"d\x03" + GS + b"V\x00"
+
+# Compact invoice on A4: fixed column anchors in points
+_PAGE_W, _PAGE_H = A4
+_MARGIN = 32
+_COL_ITEM = _MARGIN
+_COL_QTY = _PAGE_W - _MARGIN - 140  # right-aligned
+_COL_TOTAL = _PAGE_W - _MARGIN  # right-aligned
+_ROW_H = 14
+_ITEM_CHARS = 60
+
+# Gate pass slip on landscape A6
+_GP_W, _GP_H = landscape(A6)
+
+
+def _money(value) -> str:
+    return f"{to_float(value):.2f}"
+
+
+def _qty(value) -> str:
+    q = to_float(value)
+    return f"{q:g}"
+
+
+def render_compact_pdf(invoice: Dict, path, logo: Optional[Tuple[Any, float, float]] = None) -> None:
+    c = canvas.Canvas(path, pagesize=A4, pageCompression=0)
+    if logo:
+        reader, w, h = logo
+        c.drawImage(reader, _PAGE_W - _MARGIN - w, _PAGE_H - _MARGIN - h, w, h, mask="auto")
+    y = _PAGE_H - _MARGIN - 18
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(_MARGIN, y, "Invoice (Compact)")
+    company = invoice.get("company") or ""
+    if company:
+        y -= 18
+        c.setFont("Helvetica-Bold", 11)
+        c.drawString(_MARGIN, y, str(company))
+    c.setFont("Helvetica", 9)
+    for label, key in (("Invoice No", "invoice_no"), ("Date", "date"), ("Customer", "customer_name")):
+        y -= 12
+        c.drawString(_MARGIN, y, f"{label}: {invoice.get(key, '')}")
+
+    def header(y: float) -> float:
+        y -= 20
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(_COL_ITEM, y, "Item")
+        c.drawRightString(_COL_QTY, y, "Qty")
+        c.drawRightString(_COL_TOTAL, y, "Total")
+        c.line(_MARGIN, y - 3, _COL_TOTAL, y - 3)
+        c.setFont("Helvetica", 9)
+        return y
+
+    y = header(y)
+    for it in invoice.get("items", []):
+        y -= _ROW_H
+        if y < _MARGIN + 4 * _ROW_H:
+            c.showPage()
+            y = header(_PAGE_H - _MARGIN) - _ROW_H
+        c.drawString(_COL_ITEM, y, str(it.get("product_name", ""))[:_ITEM_CHARS])
+        c.drawRightString(_COL_QTY, y, _qty(it.get("quantity", 0)))
+        c.drawRightString(_COL_TOTAL, y, _money(it.get("line_total", it.get("total", 0))))
+    c.line(_MARGIN, y - 5, _COL_TOTAL, y - 5)
+    y -= 8
+    for label, key in (("Subtotal", "subtotal"), ("Discount", "discount_total"), ("GST", "gst_total")):
+        y -= 12
+        c.drawRightString(_COL_QTY, y, label)
+        c.drawRightString(_COL_TOTAL, y, _money(invoice.get(key, 0)))
+    y -= 14
+    c.setFont("Helvetica-Bold", 10)
+    c.drawRightString(_COL_QTY, y, "Grand Total")
+    c.drawRightString(_COL_TOTAL, y, _money(invoice.get("grand_total", 0)))
+    c.save()
+
+
+def render_gate_pass_pdf(invoice: Dict, path) -> None:
+    c = canvas.Canvas(path, pagesize=(_GP_W, _GP_H), pageCompression=0)
+    m = 18
+    y = _GP_H - m - 14
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(m, y, "GATE PASS")
+    c.setFont("Helvetica-Bold", 11)
+    c.drawRightString(_GP_W - m, y, str(invoice.get("gate_pass_no", "")))
+    c.setFont("Helvetica", 9)
+    company = invoice.get("company") or ""
+    if company:
+        y -= 14
+        c.drawString(m, y, str(company))
+    y -= 14
+    c.drawString(m, y, f"Invoice: {invoice.get('invoice_no', '')}")
+    c.drawRightString(_GP_W - m, y, f"Date: {invoice.get('date', '')}")
+    y -= 12
+    c.drawString(m, y, f"Customer: {invoice.get('customer_name', '')} {invoice.get('customer_id', '')}".rstrip())
+    y -= 8
+    c.line(m, y, _GP_W - m, y)
+    for it in invoice.get("items", []):
+        if not it.get("product_name"):
+            continue
+        y -= 12
+        if y < m + 30:
+            c.drawString(m, y, "... continued on invoice")
+            break
+        c.drawString(m, y, str(it.get("product_name", ""))[:48])
+        c.drawRightString(_GP_W - m, y, _qty(it.get("quantity", 0)))
+    c.setFont("Helvetica", 8)
+    c.drawString(m, m, "Checked by: ____________")
+    c.drawRightString(_GP_W - m, m, "Security: ____________")
+    c.save()
+
+
+def _fit(left: str, right: str, width: int) -> str:
+    room = width - len(right) - 1
+    return f"{left[:room]:<{room}} {right}"
+
+
+def receipt_lines(invoice: Dict, width_mm: int = 80) -> List[str]:
+    cols = RECEIPT_COLUMNS.get(width_mm, RECEIPT_COLUMNS[80])
+    rule = "-" * cols
+    lines = []
+    company = invoice.get("company") or ""
+    if company:
+        lines.append(str(company)[:cols].center(cols))
+    number, dt = f"No: {invoice.get('invoice_no', '')}", str(invoice.get("date", ""))
+    if len(number) + len(dt) + 1 <= cols:
+        lines.append(_fit(number, dt, cols))
+    else:
+        lines.extend([number[:cols], f"Date: {dt}"])
+    if invoice.get("customer_name"):
+        lines.append(f"Customer: {invoice.get('customer_name')}"[:cols])
+    lines.append(rule)
+    for it in invoice.get("items", []):
+        name = str(it.get("product_name", ""))
+        if not name:
+            continue
+        lines.append(name[:cols])
+        qty_rate = f"  {_qty(it.get('quantity', 0))} x {_money(it.get('rate', 0))}"
+        lines.append(_fit(qty_rate, _money(it.get("line_total", it.get("total", 0))), cols))
+    lines.append(rule)
+    for label, key in (("Subtotal", "subtotal"), ("Discount", "discount_total"), ("GST", "gst_total")):
+        lines.append(_fit(label, _money(invoice.get(key, 0)), cols))
+    lines.append(_fit("TOTAL", _money(invoice.get("grand_total", 0)), cols))
+    return lines
+
+
+def render_text_receipt(invoice: Dict, width_mm: int = 80) -> str:
+    return "\n".join(receipt_lines(invoice, width_mm)) + "\n"
+
+
+def render_escpos_receipt(invoice: Dict, width_mm: int = 80, cut: bool = True) -> bytes:
+    lines = receipt_lines(invoice, width_mm)
+    out = bytearray(ESCPOS_INIT)
+    start = 0
+    if invoice.get("company"):
+        out += ESCPOS_CENTER + ESCPOS_BOLD_ON + lines[0].strip().encode("cp437", "replace") + b"\n" + ESCPOS_BOLD_OFF + ESCPOS_LEFT
+        start = 1
+    for line in lines[start:-1]:
+        out += line.encode("cp437", "replace") + b"\n"
+    out += ESCPOS_BOLD_ON + lines[-1].encode("cp437", "replace") + b"\n" + ESCPOS_BOLD_OFF
+    if cut:
+        out += ESCPOS_FEED_CUT
+    return bytes(out)
+
+
+def write_receipt(data: Union[bytes, str], target: Union[str, Path, BinaryIO, None] = None) -> None:
+    """Write a receipt to a file/device path (e.g. ``/dev/usb/lp0``), an open binary stream, or stdout."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if target is None:
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    elif isinstance(target, (str, Path)):
+        with open(target, "wb") as f:
+            f.write(data)
+    else:
+        target.write(data)
+        target.flush()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Compact record types for invoices and their line items.
+
+A loaded invoice used to be a dict of about a dozen keys holding a list of
+line-item dicts, which takes several times the file's size in memory.
+``Invoice`` and ``LineItem`` keep the known fields in ``__slots__`` instead,
+line items and GST slabs in tuples, and one object for every repeated
+value of a load: names, dates and codes through the memo of ``from_dict``,
+numbers already while the file is parsed (``shared_floats``).
+
+Both are read-only mappings, so code written against the JSON dicts
+(``inv.get("grand_total", 0)``, ``for it in inv["items"]``) keeps working.
+Legacy field names (``total``, ``hsn_code``, ``product_code``) are resolved
+once in ``from_dict``; unknown fields are kept and written back unchanged.
+To change a record, save the one ``replace()`` returns.
+
+``RecordView`` is the read-only snapshot the managers' ``list()`` returns.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+def new_memo() -> Dict[type, Dict]:
+    """Shares equal values between the records of one load; see ``from_dict``."""
+    # Keyed by type so that 1 and 1.0 (equal, same hash) stay apart. Unlike
+    # sys.intern this is dropped after the load, so unique strings cost nothing extra.
+    return {str: {}, float: {}}
+
+
+class _FloatsByText(dict):
+    __slots__ = ()
+
+    def __missing__(self, text: str) -> float:
+        value = self[text] = float(text)
+        return value
+
+
+def shared_floats() -> Callable[[str], float]:
+    """``parse_float`` for one load's ``read_json``: one float object per distinct number in the file.
+
+    Lookups of numbers already seen stay in C, which is far cheaper than
+    sharing each float of each record in ``from_dict``.
+    """
+    return _FloatsByText().__getitem__
+
+
+def _slot_names(fields: Tuple[str, ...], **renamed: str) -> Dict[str, str]:
+    return {field: renamed.get(field, field) for field in fields}
+
+
+# How from_dict stores a field: as it is, shared through the memo, or converted by _convert
+_PLAIN, _SHARE, _NEST = 0, 1, 2
+
+
+def _load_plan(slot_of: Dict[str, str], shared: Tuple[str, ...] = (), nested: Tuple[str, ...] = ()) -> Dict[str, Tuple[str, int]]:
+    return {
+        field: (slot, _SHARE if field in shared else _NEST if field in nested else _PLAIN)
+        for field, slot in slot_of.items()
+    }
+
+
+def _positions(plan: Dict[str, Tuple[str, int]], how: int) -> Tuple[int, ...]:
+    return tuple(i for i, (_slot, field_how) in enumerate(plan.values()) if field_how == how)
+
+
+class _Record(Mapping):
+    __slots__ = ("_extra",)
+    # Field names in the order they are written; set by subclasses
+    FIELDS: Tuple[str, ...] = ()
+    # legacy name -> field, used when the field itself is missing or empty
+    ALIASES: Dict[str, str] = {}
+    # field -> slot holding it
+    _slot_of: Dict[str, str] = {}
+    # field -> (slot, how from_dict stores it); see _load_plan
+    _plan: Dict[str, Tuple[str, int]] = {}
+    # Positions in FIELDS of the shared and the nested fields
+    _shared_at: Tuple[int, ...] = ()
+    _nested_at: Tuple[int, ...] = ()
+
+    @classmethod
+    def from_dict(cls, data: Mapping, memo: Optional[Dict[type, Dict]] = None):
+        """Record for one JSON object; records are returned as they are.
+
+        Pass the same ``memo`` (``new_memo()``) for every record of one
+        load so equal values are stored once.
+        """
+        # isinstance against an ABC is slow; the file gives plain dicts
+        if type(data) is not dict and isinstance(data, cls):
+            return data
+        if memo is None:
+            memo = new_memo()
+        # What this app writes: every field, in FIELDS order
+        if tuple(data) == cls.FIELDS:
+            values = list(data.values())
+            for i in cls._shared_at:
+                value = values[i]
+                same = memo.get(type(value))
+                if same is not None:
+                    values[i] = same.setdefault(value, value)
+            for i in cls._nested_at:
+                values[i] = cls._convert(cls.FIELDS[i], values[i], memo)
+            rec = cls.__new__(cls)
+            cls._fill(rec, values)
+            rec._extra = None
+            return rec
+        rec = cls._build(data, memo)
+        # Legacy names are rare, so they are only looked for among the unknown fields
+        if rec._extra is not None and not cls.ALIASES.keys().isdisjoint(rec._extra):
+            rec = cls._build(cls._resolve(data), memo)
+        return rec
+
+    @staticmethod
+    def _fill(rec: "_Record", values: List[Any]) -> None:
+        """Set every field's slot from ``values`` in FIELDS order; one unpacking is far faster than setattr per field."""
+        raise NotImplementedError
+
+    @classmethod
+    def _build(cls, data: Mapping, memo: Dict[type, Dict]):
+        rec = cls.__new__(cls)
+        extra = None
+        plan = cls._plan
+        for key, value in data.items():
+            entry = plan.get(key)
+            if entry is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+                continue
+            slot, how = entry
+            if how == _SHARE:
+                same = memo.get(type(value))
+                if same is not None:
+                    value = same.setdefault(value, value)
+            elif how == _NEST:
+                value = cls._convert(key, value, memo)
+            setattr(rec, slot, value)
+        rec._extra = extra
+        return rec
+
+    @classmethod
+    def _resolve(cls, data: Mapping) -> Dict[str, Any]:
+        data = dict(data)
+        for legacy, field in cls.ALIASES.items():
+            if legacy in data and data.get(field) in (None, ""):
+                data[field] = data.pop(legacy)
+        return data
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain JSON-ready dict, with lists where the record has tuples."""
+        return {key: self._dump(key, value) for key, value in self.items()}
+
+    def _dump(self, key: str, value: Any) -> Any:
+        return value
+
+    def replace(self, **changes: Any):
+        """A copy with some fields changed; the record itself stays as it is."""
+        rec = type(self).__new__(type(self))
+        for key, slot in self._slot_of.items():
+            if key in changes:
+                setattr(rec, slot, changes.pop(key))
+            elif hasattr(self, slot):
+                setattr(rec, slot, getattr(self, slot))
+        extra = dict(self._extra or {}, **changes)
+        rec._extra = extra or None
+        return rec
+
+    def __getitem__(self, key: str) -> Any:
+        slot = self._slot_of.get(key)
+        if slot is not None:
+            try:
+                return getattr(self, slot)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # Mapping.get goes through __getitem__ and an exception for every missing field
+        slot = self._slot_of.get(key)
+        if slot is not None:
+            return getattr(self, slot, default)
+        extra = self._extra
+        return default if extra is None else extra.get(key, default)
+
+    def __contains__(self, key: object) -> bool:
+        slot = self._slot_of.get(key)
+        if slot is not None:
+            return hasattr(self, slot)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        for key, slot in self._slot_of.items():
+            if hasattr(self, slot):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class LineItem(_Record):
+    FIELDS = ("product_name", "quantity", "rate", "discount", "gst", "line_total", "gst_amount", "hsn")
+    _slot_of = _slot_names(FIELDS)
+    _plan = _load_plan(_slot_of, shared=("product_name", "hsn"))
+    _shared_at = _positions(_plan, _SHARE)
+    __slots__ = FIELDS
+    ALIASES = {"total": "line_total", "hsn_code": "hsn", "product_code": "product_name"}
+
+    @staticmethod
+    def _fill(rec: "LineItem", values: List[Any]) -> None:
+        (rec.product_name, rec.quantity, rec.rate, rec.discount, rec.gst, rec.line_total, rec.gst_amount, rec.hsn) = values
+
+
+class Invoice(_Record):
+    FIELDS = (
+        "invoice_no", "customer_name", "customer_id", "items", "date", "template", "gate_pass_no",
+        "subtotal", "discount_total", "gst_total", "grand_total", "gst_slabs", "status",
+    )
+    # A slot named "items" would hide Mapping.items()
+    _slot_of = _slot_names(FIELDS, items="line_items")
+    _plan = _load_plan(
+        _slot_of,
+        shared=("customer_name", "customer_id", "date", "template", "status"),
+        nested=("items", "gst_slabs"),
+    )
+    _shared_at = _positions(_plan, _SHARE)
+    _nested_at = _positions(_plan, _NEST)
+    __slots__ = tuple(_slot_of.values())
+
+    @staticmethod
+    def _fill(rec: "Invoice", values: List[Any]) -> None:
+        (
+            rec.invoice_no, rec.customer_name, rec.customer_id, rec.line_items, rec.date, rec.template, rec.gate_pass_no,
+            rec.subtotal, rec.discount_total, rec.gst_total, rec.grand_total, rec.gst_slabs, rec.status,
+        ) = values
+
+    @classmethod
+    def _convert(cls, key: str, value: Any, memo: Dict[type, Dict]) -> Any:
+        if not isinstance(value, list):
+            return value
+        if key == "items":
+            return tuple(LineItem.from_dict(it, memo) if isinstance(it, (dict, Mapping)) else it for it in value)
+        return tuple(tuple(row) if type(row) is list else row for row in value)
+
+    def _dump(self, key: str, value: Any) -> Any:
+        if key == "items" and isinstance(value, tuple):
+            return [it.to_dict() if isinstance(it, _Record) else it for it in value]
+        if key == "gst_slabs" and isinstance(value, tuple):
+            return [list(row) for row in value]
+        return value
+
+
+def load_invoice(data: Mapping, memo: Optional[Dict[type, Dict]] = None) -> Any:
+    """``Invoice.from_dict`` for JSON objects; anything else is returned as it is."""
+    return Invoice.from_dict(data, memo) if isinstance(data, (dict, Mapping)) else data
+
+
+class RecordView(tuple):
+    """Read-only snapshot of a store's records, as returned by ``list()``.
+
+    A manager builds one when its data changes and hands the same one to
+    every reader until the next change, so reading costs no copy and no
+    lock. Records are never changed in place (invoices are ``Invoice``
+    records, customers and products read-only mappings), so a view given
+    to a background export shows exactly what it was taken with while new
+    invoices are saved.
+    """
+    __slots__ = ()
+
+    def where(self, predicate: Optional[Callable[[Mapping], bool]] = None, **fields: Any) -> Iterator[Mapping]:
+        """Records whose ``fields`` equal the given values and that pass ``predicate``, lazily."""
+        wanted = tuple(fields.items())
+        for rec in self:
+            if all(rec.get(key) == value for key, value in wanted) and (predicate is None or predicate(rec)):
+                yield rec
+
+    def first(self, predicate: Optional[Callable[[Mapping], bool]] = None, **fields: Any) -> Optional[Mapping]:
+        return next(self.where(predicate, **fields), None)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Applies other machines' change logs from the shared sync folder.
+
+Each node keeps a byte offset per peer journal (``data/replication.json``),
+so a sync reads only what was appended since the last one: the cost is one
+``stat`` per peer plus the new entries, however large the data is.
+
+Conflict rules, keyed on ``invoice_no``:
+
+* a create for a number this machine does not have is added as is;
+* a create for a number it already has is skipped when it is the same
+  invoice (same date, customer, total and gate pass, e.g. replayed after a
+  crash); otherwise it is a real clash. The local invoice keeps the number
+  and the remote one is parked in ``data/replication_conflicts.jsonl`` for
+  someone to re-issue. Nothing is overwritten or dropped. Clashes are
+  avoided altogether by giving each machine its own ``series``;
+* status changes and customer/product upserts are last-writer-wins on the
+  entry's (time, node) stamp. This node's own journal is read too, so a
+  remote change never undoes a later local one. A status change for an
+  invoice that has not arrived yet waits and is retried on the next sync.
+
+Stamps use each machine's clock; keep the clocks roughly right.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from logic.customer_manager import CustomerManager
+from logic.invoice_manager import InvoiceManager
+from logic.journal import JOURNAL_SUFFIX, STATE_FILE, node_id, read_entries, replication_settings
+from logic.product_manager import ProductManager
+from utils.helpers import file_lock, read_json, write_json
+from utils.tasks import CancelToken, check_cancel
+
+CONFLICTS_FILE = "replication_conflicts.jsonl"
+# What makes two creates with the same number the same invoice
+FINGERPRINT = ("date", "customer_id", "grand_total", "gate_pass_no")
+MASTERS = {"customer.upsert": ("customer", "customer_id"), "product.upsert": ("product", "product_code")}
+
+
+def _stamp(entry: Dict[str, Any]) -> List[Any]:
+    return [entry.get("ts", 0), entry.get("node", "")]
+
+
+def _fingerprint(inv: Dict[str, Any]) -> Tuple:
+    return tuple(inv.get(k) for k in FINGERPRINT)
+
+
+class Replicator:
+    def __init__(self, im: Optional[InvoiceManager] = None) -> None:
+        # The GUI passes its own manager so replicated invoices show up without a reload
+        self.im = im or InvoiceManager()
+        self.paths = self.im.paths
+        self.settings = replication_settings(self.paths)
+        self.sync_dir = Path(self.settings.get("sync_dir") or "")
+        self.node = node_id(self.paths, self.settings)
+        self.state_path = self.paths["data"] / STATE_FILE
+        self.conflicts_path = self.paths["data"] / CONFLICTS_FILE
+
+    def sync(self, cancel: Optional[CancelToken] = None) -> Dict[str, Any]:
+        """One pass over the sync folder; returns counts per outcome and new entries per peer."""
+        if not self.settings.get("sync_dir"):
+            raise ValueError("No sync folder configured (replication.sync_dir)")
+        # The app and the API server may both sync this data; one at a time
+        with file_lock(self.state_path):
+            return self._sync(cancel)
+
+    def _sync(self, cancel: Optional[CancelToken]) -> Dict[str, Any]:
+        state = read_json(self.state_path)
+        state.setdefault("node_id", self.node)
+        cursors: Dict[str, int] = state.setdefault("cursors", {})
+        stamps: Dict[str, List[Any]] = state.setdefault("stamps", {})
+        # "node|invoice_no" of parked creates; that node's later status changes for the number are not ours
+        clashes = set(state.get("clashes", []))
+        result: Dict[str, Any] = {"node": self.node, "applied": 0, "skipped": 0, "conflicts": 0, "waiting": 0, "peers": {}}
+
+        remote: List[Dict[str, Any]] = list(state.get("pending", []))
+        for path in sorted(self.sync_dir.glob(f"*{JOURNAL_SUFFIX}")):
+            check_cancel(cancel)
+            peer = path.name[: -len(JOURNAL_SUFFIX)]
+            offset = cursors.get(peer, 0)
+            try:
+                size = path.stat().st_size
+            except OSError:
+                continue
+            if size < offset:
+                # Journal replaced (e.g. restored); replaying it is safe under the rules above
+                print(f"Warning: Journal {path.name} shrank; reading it again from the start", file=sys.stderr)
+                offset = 0
+            if size == offset:
+                continue
+            entries, cursors[peer] = read_entries(path, offset)
+            result["peers"][peer] = len(entries)
+            if peer == self.node:
+                # Only stamps from our own changes; they are already applied here
+                for entry in entries:
+                    key = self._stamp_key(entry)
+                    if key and _stamp(entry) > stamps.get(key, []):
+                        stamps[key] = _stamp(entry)
+            else:
+                remote.extend(entries)
+
+        # Creates first, so status changes from any peer find their invoice
+        remote.sort(key=lambda e: (e.get("op") != "invoice.create", _stamp(e)))
+        pending = self._apply(remote, stamps, clashes, result)
+        state["pending"] = pending
+        state["clashes"] = sorted(clashes)
+        result["waiting"] = len(pending)
+        write_json(self.state_path, state)
+        return result
+
+    @staticmethod
+    def _stamp_key(entry: Dict[str, Any]) -> str:
+        op, data = entry.get("op"), entry.get("data") or {}
+        if op == "invoice.status":
+            return f"status:{data.get('invoice_no', '')}"
+        if op in MASTERS:
+            kind, key = MASTERS[op]
+            return f"{kind}:{str(data.get(key, '')).strip().lower()}"
+        return ""
+
+    def _newer(self, entry: Dict[str, Any], stamps: Dict[str, List[Any]]) -> bool:
+        key = self._stamp_key(entry)
+        if _stamp(entry) <= stamps.get(key, []):
+            return False
+        stamps[key] = _stamp(entry)
+        return True
+
+    def _apply(self, entries: List[Dict[str, Any]], stamps: Dict[str, List[Any]], clashes: set, result: Dict[str, Any]) -> List[Dict[str, Any]]:
+        creates: List[Dict] = []
+        changes: List[Tuple[str, str]] = []
+        masters: Dict[str, List[Dict]] = {op: [] for op in MASTERS}
+        conflicts: List[Dict[str, Any]] = []
+        pending: List[Dict[str, Any]] = []
+        incoming: Dict[str, Dict] = {}
+        for entry in entries:
+            op, data = entry.get("op"), entry.get("data") or {}
+            if op == "invoice.create":
+                inv_no = data.get("invoice_no", "")
+                local = self.im.find(inv_no) or incoming.get(inv_no)
+                if not inv_no.startswith(f"{self.im.fy}/"):
+                    conflicts.append(self._conflict(entry, "not in the current financial year"))
+                elif local is None:
+                    incoming[inv_no] = data
+                    creates.append(data)
+                elif _fingerprint(local) == _fingerprint(data):
+                    result["skipped"] += 1
+                else:
+                    clashes.add(f"{entry.get('node', '')}|{inv_no}")
+                    conflicts.append(self._conflict(entry, "invoice number already used here", local))
+            elif op == "invoice.status":
+                inv_no = data.get("invoice_no", "")
+                if f"{entry.get('node', '')}|{inv_no}" in clashes:
+                    conflicts.append(self._conflict(entry, "status change for a parked invoice"))
+                elif self.im.find(inv_no) is None and inv_no not in incoming:
+                    pending.append(entry)
+                elif self._newer(entry, stamps):
+                    changes.append((inv_no, data.get("status", "")))
+                else:
+                    result["skipped"] += 1
+            elif op in MASTERS:
+                if self._newer(entry, stamps):
+                    masters[op].append(data)
+                else:
+                    result["skipped"] += 1
+            else:
+                print(f"Warning: Ignoring unknown journal entry {op!r} from {entry.get('node', '?')}", file=sys.stderr)
+
+        if creates:
+            result["applied"] += sum(inv is not None for inv in self.im.create_invoices(creates, journal=False))
+        if changes:
+            result["applied"] += sum(self.im.update_statuses(changes, journal=False))
+        if masters["customer.upsert"]:
+            result["applied"] += sum(CustomerManager().add_or_update_many(masters["customer.upsert"], journal=False))
+        if masters["product.upsert"]:
+            result["applied"] += sum(ProductManager().add_or_update_many(masters["product.upsert"], journal=False))
+        if conflicts:
+            with self.conflicts_path.open("a", encoding="utf-8") as f:
+                for c in conflicts:
+                    f.write(json.dumps(c, ensure_ascii=False, default=str) + "\n")
+            result["conflicts"] += len(conflicts)
+        return pending
+
+    def _conflict(self, entry: Dict[str, Any], reason: str, local: Optional[Dict] = None) -> Dict[str, Any]:
+        data = entry.get("data") or {}
+        print(f"Warning: Replication conflict on {data.get('invoice_no', '')} from {entry.get('node', '?')}: {reason}", file=sys.stderr)
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "invoice_no": data.get("invoice_no", ""),
+            "reason": reason,
+            "node": entry.get("node", ""),
+            "local": dict(zip(FINGERPRINT, _fingerprint(local))) if local else None,
+            "remote": data,
+        }
+
+
+def load_conflicts(paths: Dict[str, Path]) -> List[Dict[str, Any]]:
+    path = paths["data"] / CONFLICTS_FILE
+    if not path.exists():
+        return []
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
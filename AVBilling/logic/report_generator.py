@@ -3,165 +3,341 @@
 
 from __future__ import annotations
 
-from collections import defaultdict
-from typing import Dict, List
+import heapq
+import json
+from datetime import timedelta
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Font
 
-from utils.helpers import month_key
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.utils import ImageReader
-from pathlib import Path
-from config.defaults import app_paths
+from logic.aggregation import Aggregator, aggregate
+from logic.gst_summary import TaxSummary, load_tax_context
+from logic.invoice_query import date_cell, iter_line_rows
+from logic.rollups import RollupStore
+from utils.helpers import parse_date, to_float
+from utils.memo import LRUCache
+from utils.metrics import timed
+from utils.tasks import CancelToken, ProgressFn, check_cancel, report_progress
+from logic.invoice_renderer import default_renderer
+from logic.receipt_renderer import (
+    render_compact_pdf,
+    render_escpos_receipt,
+    render_gate_pass_pdf,
+    render_text_receipt,
+    write_receipt,
+)
+
+
+INVOICE_HEADERS = ["Date", "Invoice No", "Customer", "Subtotal", "Discount", "GST", "Total"]
+SALES_HEADERS = ["Product", "Quantity", "GST", "Revenue"]
+MASTER_HEADERS = ["Date", "Invoice No", "Customer ID", "Customer", "Product", "Qty", "Rate", "Disc%", "Total"]
+SLAB_HEADERS = ["GST Rate", "Invoices", "Taxable", "IGST", "CGST", "SGST", "Total Tax"]
+HSN_HEADERS = ["HSN", "Description", "GST Rate", "Quantity", "Value", "Taxable", "IGST", "CGST", "SGST"]
+B2B_HEADERS = ["GSTIN", "Invoice No", "Date", "Invoice Value", "Place of Supply", "GST Rate", "Taxable", "IGST", "CGST", "SGST"]
+B2CS_HEADERS = ["Supply Type", "Place of Supply", "GST Rate", "Taxable", "IGST", "CGST", "SGST"]
+DAILY_HEADERS = ["Date", "Invoices", "Taxable", "GST", "Revenue"]
+RANK_DIMENSIONS = ("customer", "product")
+RANK_METRICS = ("revenue", "quantity", "count", "growth")
+# Rows between progress callbacks / cancellation checks
+PROGRESS_EVERY = 1000
+
+# Keyed on (report, params, store version); results are shared, treat them as read-only
+report_cache = LRUCache(maxsize=64)
+
+
+def _count(items: Iterable) -> int:
+    return len(items) if isinstance(items, Sequence) else 0
+
+
+def iter_invoice_rows(invoices: Iterable[Dict]) -> Iterator[List]:
+    for inv in invoices:
+        yield [
+            date_cell(inv.get("date", "")),
+            inv.get("invoice_no", ""),
+            inv.get("customer_name", ""),
+            to_float(inv.get("subtotal", 0)),
+            to_float(inv.get("discount_total", 0)),
+            to_float(inv.get("gst_total", 0)),
+            to_float(inv.get("grand_total", 0)),
+        ]
+
+
+def add_sheet(wb: Workbook, title: str, headers: List[str]):
+    ws = wb.create_sheet(title)
+    header_cells = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal="center")
+        header_cells.append(cell)
+    ws.append(header_cells)
+    return ws
+
+
+def write_sheet(
+    path: str,
+    title: str,
+    headers: List[str],
+    rows: Iterable[List],
+    total: int = 0,
+    progress: Optional[ProgressFn] = None,
+    cancel: Optional[CancelToken] = None,
+) -> int:
+    """Stream rows into a write-only workbook; memory stays flat regardless of row count."""
+    wb = Workbook(write_only=True)
+    ws = add_sheet(wb, title, headers)
+    written = 0
+    for row in rows:
+        ws.append(row)
+        written += 1
+        if written % PROGRESS_EVERY == 0:
+            check_cancel(cancel)
+            report_progress(progress, written, total)
+    check_cancel(cancel)
+    wb.save(path)
+    report_progress(progress, written, total or written)
+    return written
 
 
 class ReportGenerator:
-    def __init__(self, invoices: List[Dict]) -> None:
+    def __init__(self, invoices: List[Dict], version: Optional[Hashable] = None, rollups: Optional[RollupStore] = None) -> None:
         self.invoices = invoices
+        # With a version key, computed reports are shared until the store changes
+        self.version = version
+        # Summaries come from persisted rollups when available, without touching line items
+        self.rollups = rollups
 
-    def monthly_summary(self) -> Dict[str, Dict[str, float]]:
-        result: Dict[str, Dict[str, float]] = defaultdict(lambda: {"invoices": 0, "revenue": 0.0})
-        for inv in self.invoices:
-            mk = month_key(inv.get("date", ""))
-            result[mk]["invoices"] += 1
-            result[mk]["revenue"] += float(inv.get("grand_total", 0))
-        return {k: {"invoices": v["invoices"], "revenue": round(v["revenue"], 2)} for k, v in result.items()}
-
-    def sales_per_product(self) -> Dict[str, Dict[str, float]]:
-        result: Dict[str, Dict[str, float]] = defaultdict(lambda: {"quantity": 0.0, "revenue": 0.0, "gst": 0.0})
-        for inv in self.invoices:
-            for it in inv.get("items", []):
-                name = it.get("product_name", it.get("product_code", "Unknown"))
-                qty = float(it.get("quantity", 0))
-                result[name]["quantity"] += qty
-                result[name]["revenue"] += float(it.get("line_total", it.get("total", 0)))
-                result[name]["gst"] += float(it.get("gst_amount", it.get("gst", 0)))
-        for k, v in result.items():
-            v["quantity"] = round(v["quantity"], 2)
-            v["revenue"] = round(v["revenue"], 2)
-            v["gst"] = round(v["gst"], 2)
-        return dict(result)
-
-    def export_invoices_excel(self, path: str) -> None:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Invoices"
-        headers = [
-            "Date",
-            "Invoice No",
-            "Customer",
-            "Subtotal",
-            "Discount",
-            "GST",
-            "Total",
-        ]
-        ws.append(headers)
-        for inv in self.invoices:
-            ws.append(
-                [
-                    inv.get("date", ""),
-                    inv.get("invoice_no", ""),
-                    inv.get("customer_name", ""),
-                    inv.get("subtotal", 0),
-                    inv.get("discount_total", 0),
-                    inv.get("gst_total", 0),
-                    inv.get("grand_total", 0),
-                ]
+    @classmethod
+    def for_store(cls, store) -> "ReportGenerator":
+        # One snapshot, so the invoices, key and rollups all belong to the same version
+        snap = store.snapshot(rollups=True)
+        return cls(snap.view, snap.key, snap.rollups)
+
+    def _memo(self, name: str, params: Tuple, compute: Callable[[], Any]) -> Any:
+        if self.version is None:
+            return compute()
+        return report_cache.get_or_compute((name, params, self.version), compute)
+
+    def monthly_summary(self, exclude_cancelled: bool = False) -> Dict[str, Dict[str, float]]:
+        def compute():
+            if self.rollups is not None:
+                rows = self.rollups.query("month", exclude_cancelled, measures=("count", "revenue"))
+            else:
+                rows = aggregate(self.invoices, ("month",), ("count", "revenue"), exclude_cancelled)
+            return {k: {"invoices": v["count"], "revenue": v["revenue"]} for k, v in rows.items()}
+        return self._memo("monthly_summary", (exclude_cancelled,), compute)
+
+    def sales_per_product(self, exclude_cancelled: bool = False) -> Dict[str, Dict[str, float]]:
+        def compute():
+            if self.rollups is not None:
+                rows = self.rollups.query("product", exclude_cancelled, measures=("quantity", "revenue", "gst"))
+            else:
+                rows = aggregate(self.invoices, ("product",), ("quantity", "revenue", "gst"), exclude_cancelled)
+            return {k: {"quantity": v["quantity"], "revenue": v["revenue"], "gst": v["gst"]} for k, v in rows.items()}
+        return self._memo("sales_per_product", (exclude_cancelled,), compute)
+
+    def period_totals(self, dimension: str, date_from: str, date_to: str, exclude_cancelled: bool = True) -> Dict[str, Dict[str, float]]:
+        """Per-customer or per-product totals for an inclusive ISO date range (blank = open)."""
+        def in_range(day: str) -> bool:
+            return (not date_from or day >= date_from) and (not date_to or day <= date_to)
+        def compute():
+            if self.rollups is not None:
+                return self.rollups.range_totals(dimension, date_from, date_to, exclude_cancelled)
+            selected = (inv for inv in self.invoices if in_range(inv.get("date", "")))
+            return aggregate(selected, (dimension,), exclude_cancelled=exclude_cancelled)
+        return self._memo("period_totals", (dimension, date_from, date_to, exclude_cancelled), compute)
+
+    def top_n(
+        self,
+        dimension: str = "customer",
+        metric: str = "revenue",
+        date_from: str = "",
+        date_to: str = "",
+        n: int = 20,
+        exclude_cancelled: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """Top ``n`` customers or products in a date range, best first.
+
+        ``growth`` ranks by revenue gained over the equally long period just
+        before ``date_from``; ``growth_pct`` is None when there was no revenue.
+        """
+        if dimension not in RANK_DIMENSIONS:
+            raise ValueError(f"Unknown ranking dimension: {dimension}")
+        if metric not in RANK_METRICS:
+            raise ValueError(f"Unknown ranking metric: {metric}")
+        current = self.period_totals(dimension, date_from, date_to, exclude_cancelled)
+        if metric != "growth":
+            best = heapq.nlargest(n, current.items(), key=lambda kv: kv[1][metric])
+            return [dict(v, key=k) for k, v in best]
+        start, end = parse_date(date_from), parse_date(date_to)
+        if not start or not end:
+            raise ValueError("Growth ranking needs a valid date range")
+        prev_end = start - timedelta(days=1)
+        prev_start = prev_end - (end - start)
+        previous = self.period_totals(dimension, prev_start.isoformat(), prev_end.isoformat(), exclude_cancelled)
+        growth = {k: v["revenue"] - previous.get(k, {}).get("revenue", 0) for k, v in current.items()}
+        out = []
+        for k in heapq.nlargest(n, growth, key=growth.get):
+            prev = previous.get(k, {}).get("revenue", 0)
+            out.append(
+                dict(
+                    current[k],
+                    key=k,
+                    previous=round(prev, 2),
+                    growth=round(growth[k], 2),
+                    growth_pct=round(growth[k] * 100 / prev, 1) if prev else None,
+                )
             )
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
-        wb.save(path)
+        return out
 
-    def export_sales_excel(self, path: str) -> None:
+    def aggregate(self, groupings: Dict[str, Sequence[str]], exclude_cancelled: bool = False) -> Aggregator:
+        """Fill several groupings in one pass, e.g. ``{"daily": ("day",), "by_rate": ("month", "gst_rate")}``."""
+        return Aggregator(groupings, exclude_cancelled).run(self.invoices)
+
+    @timed("export.invoices_excel.ms")
+    def export_invoices_excel(self, path: str, progress: Optional[ProgressFn] = None, cancel: Optional[CancelToken] = None) -> int:
+        return write_sheet(path, "Invoices", INVOICE_HEADERS, iter_invoice_rows(self.invoices), _count(self.invoices), progress, cancel)
+
+    @timed("export.sales_excel.ms")
+    def export_sales_excel(self, path: str, progress: Optional[ProgressFn] = None, cancel: Optional[CancelToken] = None) -> int:
         sales = self.sales_per_product()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Sales"
-        headers = ["Product", "Quantity", "GST", "Revenue"]
-        ws.append(headers)
-        for name, v in sales.items():
-            ws.append([name, v["quantity"], v["gst"], v["revenue"]])
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal="center")
+        rows = ([name, v["quantity"], v["gst"], v["revenue"]] for name, v in sales.items())
+        return write_sheet(path, "Sales", SALES_HEADERS, rows, len(sales), progress, cancel)
+
+    @timed("export.master_excel.ms")
+    def export_master_excel(
+        self,
+        path: str,
+        progress: Optional[ProgressFn] = None,
+        cancel: Optional[CancelToken] = None,
+        rows: Optional[Iterable[List]] = None,
+    ) -> int:
+        """Write master rows; pass ``rows`` (e.g. from ``InvoiceManager.query``) to export a filtered view."""
+        # Total is unknown up front for line items, so progress counts rows only
+        rows = iter_line_rows(self.invoices) if rows is None else rows
+        return write_sheet(path, "Master", MASTER_HEADERS, rows, 0, progress, cancel)
+
+    def tax_summary(
+        self,
+        month: str,
+        context: Optional[Dict[str, Any]] = None,
+        progress: Optional[ProgressFn] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> TaxSummary:
+        """GST slab/HSN/B2B/B2CS summary for one month ("YYYY-MM"), cancelled invoices excluded."""
+        context = load_tax_context() if context is None else context
+        return TaxSummary(month, **context).run(self.invoices, progress, cancel)
+
+    @timed("export.gstr1_json.ms")
+    def export_gstr1_json(self, path: str, month: str, context: Optional[Dict[str, Any]] = None) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.tax_summary(month, context).gstr1(), f, ensure_ascii=False, separators=(",", ":"))
+
+    @timed("export.gst_excel.ms")
+    def export_gst_excel(
+        self,
+        path: str,
+        month: str,
+        context: Optional[Dict[str, Any]] = None,
+        progress: Optional[ProgressFn] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> TaxSummary:
+        summary = self.tax_summary(month, context, progress, cancel)
+        wb = Workbook(write_only=True)
+        ws = add_sheet(wb, "GST Slabs", SLAB_HEADERS)
+        for r in summary.slabs():
+            ws.append([r["rate"], r["invoices"], r["taxable"], r["igst"], r["cgst"], r["sgst"], r["tax"]])
+        ws = add_sheet(wb, "HSN", HSN_HEADERS)
+        for r in summary.hsn():
+            ws.append([r["hsn"], r["description"], r["rate"], r["quantity"], r["value"], r["taxable"], r["igst"], r["cgst"], r["sgst"]])
+        ws = add_sheet(wb, "B2B", B2B_HEADERS)
+        for n, inv in enumerate(summary.b2b(), 1):
+            dt = date_cell(inv["date"])
+            for itm in inv["itms"]:
+                d = itm["itm_det"]
+                ws.append([inv["ctin"], inv["inum"], dt, inv["val"], inv["pos"], d["rt"], d["txval"], d["iamt"], d["camt"], d["samt"]])
+            if n % PROGRESS_EVERY == 0:
+                check_cancel(cancel)
+        ws = add_sheet(wb, "B2CS", B2CS_HEADERS)
+        for r in summary.b2cs():
+            ws.append([r["supply_type"], r["pos"], r["rate"], r["taxable"], r["igst"], r["cgst"], r["sgst"]])
+        check_cancel(cancel)
         wb.save(path)
+        return summary
 
-    def export_invoice_pdf(self, invoice: Dict, path: str) -> None:
-        styles = getSampleStyleSheet()
-        doc = SimpleDocTemplate(path, pagesize=A4, leftMargin=32, rightMargin=32, topMargin=32, bottomMargin=32)
-        story = []
-        # Template selection can alter style and columns
-        template = (invoice.get("template") or "simple").lower()
-        title_text = "AVBilling Invoice" if template == "simple" else ("Invoice - Detailed" if template == "detailed" else "Invoice (Compact)")
-        title = Paragraph(title_text, styles["Title"])
-        story.append(title)
-        # Company/logo header
-        company = (invoice.get("company") or "")
-        if company:
-            story.append(Paragraph(company, styles["Heading3"]))
-        # Logo if available in settings
-        try:
-            logo_path = (app_paths()["settings"]).read_text(encoding="utf-8")  # dummy read to ensure path exists
-            # Actually read JSON for logo
-            import json
-            settings = json.loads((app_paths()["settings"]).read_text(encoding="utf-8"))
-            logo_file = settings.get("company", {}).get("logo_path", "")
-            if logo_file and Path(logo_file).exists():
-                story.append(Spacer(1, 6))
-                story.append(Paragraph(" ", styles["Normal"]))
-                img = ImageReader(logo_file)
-                # Add with max width
-                from reportlab.platypus import Image
-                story.append(Image(logo_file, width=120, height=60))
-                story.append(Spacer(1, 6))
-        except Exception:
-            pass
-        meta = Paragraph(
-            f"Invoice No: {invoice.get('invoice_no','')}<br/>Date: {invoice.get('date','')}<br/>Customer: {invoice.get('customer_name','')}",
-            styles["Normal"],
-        )
-        story.append(meta)
-        story.append(Spacer(1, 12))
-
-        if template == "compact":
-            data = [["Item", "Qty", "Total"]]
+    @timed("export.period_workbook.ms")
+    def export_period_workbook(
+        self,
+        path: str,
+        date_from: str = "",
+        date_to: str = "",
+        progress: Optional[ProgressFn] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> Dict[str, int]:
+        """Invoices, line items, product sales, GST slabs and daily totals in one workbook.
+
+        The invoices are walked once: header and line rows stream straight into
+        their sheets while the summaries accumulate, and the summary sheets are
+        written at the end. GST slabs leave out cancelled invoices, as in the
+        GST exports; the other sheets match the single-sheet exports.
+        """
+        wb = Workbook(write_only=True)
+        ws_inv = add_sheet(wb, "Invoices", INVOICE_HEADERS)
+        ws_lines = add_sheet(wb, "Line Items", MASTER_HEADERS)
+        ws_sales = add_sheet(wb, "Sales by Product", SALES_HEADERS)
+        ws_slabs = add_sheet(wb, "GST Slabs", SLAB_HEADERS)
+        ws_daily = add_sheet(wb, "Daily Totals", DAILY_HEADERS)
+        agg = Aggregator({"product": ("product",), "day": ("day",)})
+        tax = TaxSummary("", with_hsn=False)
+        counts = {"invoices": 0, "lines": 0}
+        total = _count(self.invoices)
+        for n, inv in enumerate(self.invoices, 1):
+            d = inv.get("date", "")
+            if (not date_from or d >= date_from) and (not date_to or d <= date_to):
+                for row in iter_invoice_rows((inv,)):
+                    ws_inv.append(row)
+                for row in iter_line_rows((inv,)):
+                    ws_lines.append(row)
+                    counts["lines"] += 1
+                agg.add(inv)
+                tax.add(inv)
+                counts["invoices"] += 1
+            if n % PROGRESS_EVERY == 0:
+                check_cancel(cancel)
+                report_progress(progress, n, total)
+        for name, v in agg.result("product").items():
+            ws_sales.append([name, v["quantity"], v["gst"], v["revenue"]])
+        for r in tax.slabs():
+            ws_slabs.append([r["rate"], r["invoices"], r["taxable"], r["igst"], r["cgst"], r["sgst"], r["tax"]])
+        for day, v in sorted(agg.result("day").items()):
+            ws_daily.append([date_cell(day), v["count"], v["taxable"], v["gst"], v["revenue"]])
+        check_cancel(cancel)
+        wb.save(path)
+        report_progress(progress, total, total)
+        return counts
+
+    @timed("export.invoice_pdf.ms")
+    def export_invoice_pdf(self, invoice: Dict, path) -> None:
+        renderer = default_renderer()
+        if (invoice.get("template") or "").lower() == "compact":
+            # Walk-in receipts skip platypus and draw at fixed coordinates
+            render_compact_pdf(invoice, path, renderer.logo())
         else:
-            data = [["Item", "Qty", "Rate", "GST%", "Total"]]
-        for it in invoice.get("items", []):
-            row = [str(it.get("product_name", ""))[:40], f"{it.get('quantity', 0)}"]
-            if template != "compact":
-                row.extend([f"{it.get('rate', 0)}", f"{it.get('gst', 0)}"])
-            row.append(f"{float(it.get('line_total', it.get('total', 0))):.2f}")
-            data.append(row)
-        tbl = Table(data, repeatRows=1)
-        tbl.setStyle(
-            TableStyle(
-                [
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
-                    ("ALIGN", (1, 1), (-1, -1), "RIGHT"),
-                    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 9),
-                ]
-            )
-        )
-        story.append(tbl)
-        story.append(Spacer(1, 12))
+            renderer.render(invoice, path)
+
+    @timed("export.gate_pass_pdf.ms")
+    def export_gate_pass_pdf(self, invoice: Dict, path) -> None:
+        render_gate_pass_pdf(invoice, path)
 
-        totals = Paragraph(
-            f"Subtotal: {invoice.get('subtotal', 0):.2f}<br/>"
-            f"Discount: {invoice.get('discount_total', 0):.2f}<br/>"
-            f"GST: {invoice.get('gst_total', 0):.2f}<br/>"
-            f"Grand Total: {invoice.get('grand_total', 0):.2f}",
-            styles["Normal"],
-        )
-        story.append(totals)
-        doc.build(story)
+    @timed("export.receipt.ms")
+    def export_receipt(self, invoice: Dict, target=None, width_mm: int = 80, escpos: bool = True) -> None:
+        data = render_escpos_receipt(invoice, width_mm) if escpos else render_text_receipt(invoice, width_mm)
+        write_receipt(data, target)
 
 
+def export_invoice_pdf(invoice: Dict, path: str) -> str:
+    # Top-level so it can be shipped to a process pool
+    ReportGenerator([]).export_invoice_pdf(invoice, path)
+    return path
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Persistent daily/monthly rollups kept next to each FY invoice file.
+
+``FY_2025-2026.json`` gets a ``FY_2025-2026.rollup/`` directory with one
+partition per month plus a manifest. Each partition holds two aggregators:
+every invoice, and the cancelled ones, so totals excluding cancelled
+invoices are a subtraction and a status change only touches one partition.
+The manifest records the invoice file's version and stat; any mismatch on
+load means the rollups are stale and get rebuilt from the invoices.
+
+Readers query a ``frozen()`` copy without a lock: partitions handed out in
+one are never changed again; the store copies one before its next change.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from logic.aggregation import COUNT_MEASURES, MEASURES, Aggregator, empty_row, invoice_dims
+from utils.helpers import read_json, write_json
+
+ROLLUP_GROUPINGS: Dict[str, Tuple[str, ...]] = {
+    "day": ("day",),
+    "month": ("month",),
+    "day_product": ("day", "product"),
+    "month_product": ("month", "product"),
+    "day_customer": ("day", "customer"),
+    "month_customer": ("month", "customer"),
+    "day_gst_rate": ("day", "gst_rate"),
+    "month_gst_rate": ("month", "gst_rate"),
+    # Period-free totals; still partitioned by month on disk
+    "product": ("product",),
+    "customer": ("customer",),
+    "gst_rate": ("gst_rate",),
+}
+# 2: rows gained the ``lines`` measure
+ROLLUP_FORMAT = 2
+_UNDATED = "undated"
+
+
+def _file_stamp(path: Path) -> List[int]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return [0, 0]
+    return [st.st_size, st.st_mtime_ns]
+
+
+class _Partition:
+    def __init__(self) -> None:
+        self.all = Aggregator(ROLLUP_GROUPINGS)
+        self.cancelled = Aggregator(ROLLUP_GROUPINGS)
+
+    def dump(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for label, agg in (("all", self.all), ("cancelled", self.cancelled)):
+            tables = {}
+            for name, dims in ROLLUP_GROUPINGS.items():
+                rows = []
+                for key, row in agg.raw(name).items():
+                    parts = list(key) if len(dims) > 1 else [key]
+                    rows.append(parts + row)
+                tables[name] = rows
+            out[label] = tables
+        return out
+
+    def copy(self) -> "_Partition":
+        part = _Partition.__new__(_Partition)
+        part.all, part.cancelled = self.all.copy(), self.cancelled.copy()
+        return part
+
+    @classmethod
+    def load(cls, data: Mapping[str, Any]) -> "_Partition":
+        part = cls()
+        for label, agg in (("all", part.all), ("cancelled", part.cancelled)):
+            for name, dims in ROLLUP_GROUPINGS.items():
+                table = agg.raw(name)
+                width = len(dims)
+                for row in data.get(label, {}).get(name, []):
+                    key = tuple(row[:width]) if width > 1 else row[0]
+                    table[key] = list(row[width:])
+        return part
+
+
+class RollupStore:
+    def __init__(self, invoice_path: Path) -> None:
+        self.invoice_path = invoice_path
+        self.dir = invoice_path.with_suffix(".rollup")
+        self.manifest_path = self.dir / "manifest.json"
+        self._parts: Dict[str, _Partition] = {}
+        self._dirty: Set[str] = set()
+        self._part_versions: Dict[str, int] = {}
+        # Months whose partition a frozen() copy also holds
+        self._shared: Set[str] = set()
+        self.version = -1
+
+    @staticmethod
+    def _month(inv: Mapping) -> str:
+        return invoice_dims(inv)["month"] or _UNDATED
+
+    def _part(self, month: str) -> _Partition:
+        """The month's partition, ready to change."""
+        part = self._parts.get(month)
+        if part is None:
+            part = self._parts[month] = _Partition()
+        elif month in self._shared:
+            # Readers keep the one they were given
+            part = self._parts[month] = part.copy()
+            self._shared.discard(month)
+        return part
+
+    def frozen(self) -> "RollupStore":
+        """A read-only copy sharing the current partitions, for querying without a lock."""
+        view = RollupStore(self.invoice_path)
+        view._parts = dict(self._parts)
+        view.version = self.version
+        self._shared.update(self._parts)
+        return view
+
+    def load(self, version: int) -> bool:
+        """Load persisted rollups; False if they are missing or don't match the invoice file."""
+        manifest = read_json(self.manifest_path)
+        if (
+            manifest.get("format") != ROLLUP_FORMAT
+            or manifest.get("version") != version
+            or manifest.get("source") != _file_stamp(self.invoice_path)
+        ):
+            return False
+        parts = {}
+        months = manifest.get("months", {})
+        for month, part_version in months.items():
+            if part_version == self._part_versions.get(month) and month in self._parts and month not in self._dirty:
+                # Reloading after another process wrote: months it didn't touch are unchanged
+                parts[month] = self._parts[month]
+                continue
+            data = read_json(self.dir / f"{month}.json")
+            if data.get("version") != part_version:
+                return False
+            parts[month] = _Partition.load(data)
+        self._parts = parts
+        self._part_versions = dict(months)
+        self._dirty.clear()
+        self.version = version
+        return True
+
+    def rebuild(self, invoices: Iterable[Mapping], version: int) -> None:
+        self._parts = {}
+        self._shared = set()
+        for inv in invoices:
+            self.add_invoice(inv)
+        self._dirty = set(self._parts)
+        self.save(version, full=True)
+
+    def ensure(self, invoices: Iterable[Mapping], version: int) -> None:
+        if not self.load(version):
+            self.rebuild(invoices, version)
+
+    def add_invoice(self, inv: Mapping) -> None:
+        month = self._month(inv)
+        part = self._part(month)
+        part.all.add(inv)
+        if inv.get("status") == "cancelled":
+            part.cancelled.add(inv)
+        self._dirty.add(month)
+
+    def status_changed(self, inv: Mapping, old_status: Optional[str]) -> None:
+        was, now = old_status == "cancelled", inv.get("status") == "cancelled"
+        if was == now:
+            return
+        month = self._month(inv)
+        # The invoice's other fields are unchanged, so adding/removing it from
+        # the cancelled side is exact
+        self._part(month).cancelled.add(inv, 1 if now else -1)
+        self._dirty.add(month)
+
+    def save(self, version: int, full: bool = False) -> None:
+        """Write dirty partitions, then the manifest that vouches for them.
+
+        Call after the invoice file itself has been written: a crash in between
+        leaves a manifest that no longer matches, forcing a rebuild on load.
+        """
+        if full and self.dir.exists():
+            for stale in self.dir.glob("*.json"):
+                if stale.stem not in self._parts and stale != self.manifest_path:
+                    stale.unlink()
+        if full:
+            self._part_versions = {}
+        for month in sorted(self._dirty):
+            data = self._parts[month].dump()
+            data["version"] = version
+            write_json(self.dir / f"{month}.json", data, records=True)
+            self._part_versions[month] = version
+        self._dirty.clear()
+        self.version = version
+        # Untouched partitions keep the version they were written at
+        write_json(
+            self.manifest_path,
+            {
+                "format": ROLLUP_FORMAT,
+                "version": version,
+                "source": _file_stamp(self.invoice_path),
+                "months": {m: self._part_versions[m] for m in sorted(self._parts)},
+            },
+        )
+
+    def query(
+        self,
+        name: str,
+        exclude_cancelled: bool = False,
+        months: Optional[Iterable[str]] = None,
+        measures: Optional[Iterable[str]] = None,
+    ) -> Dict[Any, Dict[str, float]]:
+        """Merged rollup table, optionally restricted to some months ("YYYY-MM")."""
+        wanted = [(m, MEASURES.index(m)) for m in (measures or MEASURES)]
+        selected = self._parts if months is None else {m: self._parts[m] for m in months if m in self._parts}
+        merged: Dict[Any, List[float]] = {}
+        for part in selected.values():
+            sources = [(part.all, 1)]
+            if exclude_cancelled:
+                sources.append((part.cancelled, -1))
+            for agg, sign in sources:
+                for key, row in agg.raw(name).items():
+                    acc = merged.get(key)
+                    if acc is None:
+                        acc = merged[key] = empty_row()
+                    for i, value in enumerate(row):
+                        acc[i] += sign * value
+        out = {}
+        for key, row in merged.items():
+            if row[0] == 0 and not any(round(v, 2) for v in row[1:]):
+                continue
+            out[key] = {m: (int(row[i]) if m in COUNT_MEASURES else round(row[i], 2)) for m, i in wanted}
+        return out
+
+    def range_totals(
+        self,
+        dimension: str,
+        date_from: str = "",
+        date_to: str = "",
+        exclude_cancelled: bool = False,
+    ) -> Dict[Any, Dict[str, float]]:
+        """Totals per ``dimension`` value over an inclusive ISO date range (blank = open).
+
+        Months whose recorded days all fall inside the range are read from the
+        monthly table, so only the edge months are summed day by day.
+        """
+        def in_range(day: str) -> bool:
+            return (not date_from or day >= date_from) and (not date_to or day <= date_to)
+
+        merged: Dict[Any, List[float]] = {}
+        for month, part in self._parts.items():
+            if month == _UNDATED or (date_from and month < date_from[:7]) or (date_to and month > date_to[:7]):
+                continue
+            whole = all(in_range(day) for day in part.all.raw("day"))
+            sources = [(part.all, 1)]
+            if exclude_cancelled:
+                sources.append((part.cancelled, -1))
+            for agg, sign in sources:
+                if whole:
+                    rows = ((key, row) for (_m, key), row in agg.raw(f"month_{dimension}").items())
+                else:
+                    rows = ((key, row) for (day, key), row in agg.raw(f"day_{dimension}").items() if in_range(day))
+                for key, row in rows:
+                    acc = merged.get(key)
+                    if acc is None:
+                        acc = merged[key] = empty_row()
+                    for i, value in enumerate(row):
+                        acc[i] += sign * value
+        return {
+            key: {m: (int(row[i]) if m in COUNT_MEASURES else round(row[i], 2)) for i, m in enumerate(MEASURES)}
+            for key, row in merged.items()
+            if row[0]
+        }
@@ -2,16 +2,30 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import multiprocessing
 from PyQt6.QtWidgets import QApplication
 
-from config.defaults import ensure_initial_setup
+from config.defaults import DEFAULT_SETTINGS, app_paths, ensure_initial_setup
 from ui.splash_screen import SplashScreen
 from ui.main_window import MainWindow
+from utils.backup_scheduler import BackupScheduler
+from utils.sync_scheduler import ReplicationScheduler
+from utils.helpers import read_json
+from utils.helpers_thread import get_scheduler
+from utils import metrics
+from utils.watchdog import StallWatchdog
 
 def main() -> int:
     # Ensure folders, files, and sample data exist
     ensure_initial_setup()
 
+    # Metrics stay off (and free) unless enabled in settings or the maintenance page
+    settings = read_json(app_paths()["settings"]) or {}
+    metrics_settings = {**DEFAULT_SETTINGS["metrics"], **(settings.get("metrics", {}) or {})}
+    metrics.enable(metrics_settings["enabled"])
+    metrics_log = metrics.MetricsLog(metrics.metrics_log_path(), metrics_settings["log_interval_seconds"])
+    metrics_log.start()
+
     app = QApplication(sys.argv)
     app.setApplicationName("AVBilling")
     app.setOrganizationName("AVBilling")
@@ -31,9 +45,36 @@ def main() -> int:
     # This is handled by splash.finish(window) which is now implicitly managed
     # by window activation.
 
-    return app.exec()
+    # Stack samples of anything that blocks the event loop too long
+    watchdog_settings = {**DEFAULT_SETTINGS["watchdog"], **(settings.get("watchdog", {}) or {})}
+    watchdog = None
+    if watchdog_settings["enabled"]:
+        watchdog = StallWatchdog(int(watchdog_settings["threshold_ms"]))
+        stack = main_window.stack
+        stack.currentChanged.connect(lambda i: watchdog.set_page(type(stack.widget(i)).__name__))
+        watchdog.set_page(type(stack.currentWidget()).__name__)
+        watchdog.start()
+
+    # Timed snapshots while the app runs, one more on the way out
+    backups = BackupScheduler()
+    backups.start()
+
+    # Other machines' invoices and master changes from the shared sync folder
+    replication = ReplicationScheduler(main_window.invoice_manager)
+    replication.start()
+
+    code = app.exec()
+    replication.stop()
+    if watchdog is not None:
+        watchdog.stop()
+    get_scheduler().shutdown()
+    backups.shutdown()
+    metrics_log.stop()
+    return code
 
 if __name__ == "__main__":
+    # Needed for the process-pool lane in frozen Windows builds
+    multiprocessing.freeze_support()
     # It's good practice to ensure the splash screen closes if the main app fails.
     try:
         sys.exit(main())
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Local HTTP API so several billing counters can share one data directory.
+
+    python server.py --host 0.0.0.0 --port 8765 [--token SECRET]
+
+Plain asyncio with HTTP/1.1 keep-alive and JSON bodies; no extra packages.
+All writes go through one writer task. Invoice creates that queue up while
+a write is in progress are saved together as one batch, so the file is
+written once per batch, not once per invoice. Product, customer and invoice
+lookups are answered on the event loop, concurrently with writes; report
+and listing queries run on a small thread pool and take the invoice store's
+lock, so they see either all of a batch or none of it. Report results are
+reused for up to ``REPORT_MAX_AGE`` seconds: with counters saving several
+times a second they would otherwise be recomputed on nearly every query.
+
+    GET  /health
+    GET  /products?code=..|name=..       GET  /customers?id=..|name=..
+    GET  /invoice?no=..                  GET  /invoices?customer_id=&date_from=&date_to=&status=&offset=&limit=
+    POST /invoices        {invoice}      POST /invoices/status  {"invoice_no": .., "status": ..}
+    GET  /reports/monthly                GET  /reports/totals?dimension=&date_from=&date_to=
+    GET  /reports/top?dimension=&metric=&date_from=&date_to=&n=
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from logic.invoice_manager import InvoiceManager
+from logic.journal import replication_settings
+from logic.replication import Replicator
+from logic.report_generator import RANK_DIMENSIONS, RANK_METRICS, ReportGenerator
+from utils.helpers import file_stamp, json_default, read_json
+
+DEFAULT_PORT = 8765
+MAX_BODY = 1024 * 1024
+MAX_HEADER_LINES = 100
+WRITE_BATCH = 500
+KEEP_ALIVE_TIMEOUT = 30
+REPORT_MAX_AGE = 1.0
+STATUSES = ("final", "cancelled")
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class _Lookup:
+    """Case-insensitive lookup by two keys over a master file; reloaded when the file changes."""
+
+    def __init__(self, path, list_key: str, id_key: str, name_key: str) -> None:
+        self.path = path
+        self.list_key = list_key
+        self.id_key = id_key
+        self.name_key = name_key
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self.by_id: Dict[str, Dict] = {}
+        self.by_name: Dict[str, Dict] = {}
+
+    def _refresh(self) -> None:
+        stamp = file_stamp(self.path)
+        if stamp == self._stamp:
+            return
+        rows = (read_json(self.path) or {}).get(self.list_key, [])
+        self.by_id = {str(r.get(self.id_key, "")).strip().lower(): r for r in rows}
+        self.by_name = {str(r.get(self.name_key, "")).strip().lower(): r for r in rows}
+        self._stamp = stamp
+
+    def find(self, key: str = "", name: str = "") -> Optional[Dict]:
+        self._refresh()
+        if key:
+            return self.by_id.get(key.strip().lower())
+        return self.by_name.get(name.strip().lower())
+
+
+class BillingServer:
+    def __init__(self, token: str = "", report_threads: int = 4) -> None:
+        self.im = InvoiceManager()
+        self.token = token
+        self.products = _Lookup(self.im.paths["products"], "products", "product_code", "product_name")
+        self.customers = _Lookup(self.im.paths["customers"], "customers", "customer_id", "name")
+        # One thread for every write keeps them in order; reports get their own pool
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-writer")
+        self._readers = ThreadPoolExecutor(max_workers=report_threads, thread_name_prefix="api-reader")
+        self._queue: Optional[asyncio.Queue] = None
+        self._reports: Dict[Tuple, Tuple[float, Any]] = {}
+        self._writer_task: Optional[asyncio.Task] = None
+        self.routes: Dict[Tuple[str, str], Callable[[Dict[str, str], Any], Awaitable[Tuple[int, Any]]]] = {
+            ("GET", "/health"): self.health,
+            ("GET", "/products"): self.get_product,
+            ("GET", "/customers"): self.get_customer,
+            ("GET", "/invoice"): self.get_invoice,
+            ("GET", "/invoices"): self.list_invoices,
+            ("POST", "/invoices"): self.create_invoice,
+            ("POST", "/invoices/status"): self.update_status,
+            ("GET", "/reports/monthly"): self.report_monthly,
+            ("GET", "/reports/totals"): self.report_totals,
+            ("GET", "/reports/top"): self.report_top,
+        }
+
+    # --- writer ----------------------------------------------------------
+
+    async def _write_loop(self) -> None:
+        while True:
+            jobs = [await self._queue.get()]
+            while len(jobs) < WRITE_BATCH and not self._queue.empty():
+                jobs.append(self._queue.get_nowait())
+            # A client only learns an invoice number once its create has returned,
+            # so doing this batch's creates before its status changes reorders nothing
+            creates = [job for job in jobs if job[0] == "create"]
+            changes = [job for job in jobs if job[0] == "status"]
+            # One file write for the whole batch
+            await self._write(creates + changes, self._write_batch, [arg for _k, arg, _f in creates], [arg for _k, arg, _f in changes])
+
+    def _write_batch(self, payloads: List[Dict], changes: List[Tuple[str, str]]) -> List[Any]:
+        created, changed = self.im.write_batch(payloads, changes)
+        return created + changed
+
+    async def _write(self, jobs: List[Tuple[str, Any, asyncio.Future]], fn: Callable, *args) -> None:
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self._writer, fn, *args)
+        except Exception as e:
+            results = [e] * len(jobs)
+        for (_k, _arg, fut), result in zip(jobs, results):
+            if fut.done():
+                continue
+            if isinstance(result, Exception):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+
+    async def _sync_loop(self, seconds: int) -> None:
+        # Replicated changes are writes too, so they take the writer's thread
+        replicator = Replicator(self.im)
+        while True:
+            await asyncio.sleep(seconds)
+            try:
+                await asyncio.get_running_loop().run_in_executor(self._writer, replicator.sync)
+            except Exception as e:
+                print(f"Warning: Replication sync failed: {e}")
+
+    async def _submit(self, kind: str, arg: Any) -> Any:
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((kind, arg, fut))
+        return await fut
+
+    async def _read(self, fn: Callable[[], Any]) -> Any:
+        # No lock: readers work on the manager's published snapshot, which the writer never changes
+        return await asyncio.get_running_loop().run_in_executor(self._readers, fn)
+
+    async def _report(self, key: Tuple, compute: Callable[[ReportGenerator], Any]) -> Any:
+        hit = self._reports.get(key)
+        if hit is not None and time.monotonic() - hit[0] < REPORT_MAX_AGE:
+            return hit[1]
+        def run() -> Dict[str, Any]:
+            snap = self.im.snapshot(rollups=True)
+            return {"version": snap.version, "result": compute(ReportGenerator(snap.view, snap.key, snap.rollups))}
+
+        result = await self._read(run)
+        if len(self._reports) > 256:
+            self._reports.clear()
+        self._reports[key] = (time.monotonic(), result)
+        return result
+
+    # --- handlers --------------------------------------------------------
+
+    async def health(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        # snapshot() may re-read a changed FY file, so like every read it stays off the event loop
+        def run() -> Dict[str, Any]:
+            snap = self.im.snapshot()
+            return {"ok": True, "invoices": len(snap.view), "version": snap.version}
+
+        return 200, await self._read(run)
+
+    async def get_product(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        found = self.products.find(q.get("code", ""), q.get("name", ""))
+        if found is None:
+            raise HttpError(404, "product not found")
+        return 200, found
+
+    async def get_customer(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        found = self.customers.find(q.get("id", ""), q.get("name", ""))
+        if found is None:
+            raise HttpError(404, "customer not found")
+        return 200, found
+
+    async def get_invoice(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        no = q.get("no", "")
+        inv = await self._read(lambda: self.im.find(no))
+        if inv is None:
+            raise HttpError(404, "invoice not found")
+        return 200, inv
+
+    async def list_invoices(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        def run() -> List[List]:
+            rows = list(self.im.query(
+                customer_id=q.get("customer_id", ""),
+                date_from=q.get("date_from", ""),
+                date_to=q.get("date_to", ""),
+                status=q.get("status", ""),
+                offset=_int(q, "offset", 0),
+                limit=_int(q, "limit", 500),
+            ))
+            return [[r[0].isoformat() if hasattr(r[0], "isoformat") else r[0]] + r[1:] for r in rows]
+
+        return 200, {"rows": await self._read(run)}
+
+    async def create_invoice(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        if not isinstance(body, dict):
+            raise HttpError(400, "expected a JSON object")
+        no = body.get("invoice_no")
+        if no and await self._read(lambda: self.im.find(no)) is not None:
+            raise HttpError(409, f"invoice {no} already exists")
+        inv = await self._submit("create", body)
+        if inv is None:
+            # Also reached when another request took the same invoice_no first
+            raise HttpError(400, "invalid invoice (needs a date, at least one item and an unused invoice_no)")
+        return 201, inv
+
+    async def update_status(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        if not isinstance(body, dict) or body.get("status") not in STATUSES:
+            raise HttpError(400, f"status must be one of {', '.join(STATUSES)}")
+        if not await self._submit("status", (body.get("invoice_no", ""), body["status"])):
+            raise HttpError(404, "invoice not found")
+        return 200, {"invoice_no": body["invoice_no"], "status": body["status"]}
+
+    async def report_monthly(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        exclude = q.get("exclude_cancelled", "") in ("1", "true", "yes")
+        return 200, await self._report(("monthly", exclude), lambda report: report.monthly_summary(exclude))
+
+    async def report_totals(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        dim, date_from, date_to = q.get("dimension", "customer"), q.get("date_from", ""), q.get("date_to", "")
+        if dim not in RANK_DIMENSIONS:
+            raise HttpError(400, f"dimension must be one of {', '.join(RANK_DIMENSIONS)}")
+        return 200, await self._report(("totals", dim, date_from, date_to), lambda report: report.period_totals(dim, date_from, date_to))
+
+    async def report_top(self, q: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        dim, metric = q.get("dimension", "customer"), q.get("metric", "revenue")
+        date_from, date_to, n = q.get("date_from", ""), q.get("date_to", ""), _int(q, "n", 20)
+        if dim not in RANK_DIMENSIONS or metric not in RANK_METRICS:
+            raise HttpError(400, f"dimension must be one of {', '.join(RANK_DIMENSIONS)}; metric one of {', '.join(RANK_METRICS)}")
+        return 200, await self._report(("top", dim, metric, date_from, date_to, n), lambda report: report.top_n(dim, metric, date_from, date_to, n))
+
+    # --- HTTP ------------------------------------------------------------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "bad request line"}, False)
+                    break
+                headers: Dict[str, str] = {}
+                for _ in range(MAX_HEADER_LINES):
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    name, _sep, value = h.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                length = int(headers.get("content-length", "0") or 0)
+                if length > MAX_BODY:
+                    await self._respond(writer, 413, {"error": "body too large"}, False)
+                    break
+                raw = await reader.readexactly(length) if length else b""
+                status, payload = await self.dispatch(method, target, headers, raw)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method: str, target: str, headers: Dict[str, str], raw: bytes) -> Tuple[int, Any]:
+        if self.token and headers.get("authorization", "") != f"Bearer {self.token}":
+            return 401, {"error": "missing or wrong token"}
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path.rstrip("/") or "/"))
+        if handler is None:
+            known = any(path == url.path for _m, path in self.routes)
+            return (405, {"error": "method not allowed"}) if known else (404, {"error": "no such endpoint"})
+        try:
+            body = json.loads(raw) if raw else None
+            return await handler(dict(parse_qsl(url.query)), body)
+        except HttpError as e:
+            return e.status, {"error": str(e)}
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except Exception as e:
+            return 500, {"error": str(e)}
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Any, keep_alive: bool) -> None:
+        body = json.dumps(payload, ensure_ascii=False, default=json_default).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, ready: Optional[Callable[[], None]] = None) -> None:
+        self._queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._write_loop())
+        # Load (or rebuild) the rollups before the first client has to wait for them
+        await asyncio.get_running_loop().run_in_executor(self._writer, self.im.rollups)
+        replication = replication_settings(self.im.paths)
+        sync_task = None
+        if replication.get("enabled") and replication.get("sync_dir") and int(replication.get("interval_seconds", 0) or 0) > 0:
+            sync_task = asyncio.create_task(self._sync_loop(int(replication["interval_seconds"])))
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready:
+            ready()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._writer_task.cancel()
+            if sync_task is not None:
+                sync_task.cancel()
+            self._writer.shutdown(wait=True)
+            self._readers.shutdown(wait=False)
+
+
+def _int(q: Dict[str, str], key: str, default: int) -> int:
+    try:
+        return int(q.get(key, default))
+    except (TypeError, ValueError):
+        raise HttpError(400, f"{key} must be a whole number")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="avbilling-server", description="AVBilling local HTTP API.")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to accept other counters on the LAN")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token", default=os.environ.get("AVBILLING_API_TOKEN", ""), help="require 'Authorization: Bearer TOKEN'")
+    args = parser.parse_args(argv)
+    server = BillingServer(args.token)
+    try:
+        asyncio.run(server.serve(args.host, args.port, lambda: print(f"Serving on http://{args.host}:{args.port}", flush=True)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
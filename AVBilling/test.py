@@ -58,12 +58,33 @@ def main() -> int:
         "utils.helpers",
         "utils.validators",
         "utils.shortcuts",
+        "utils.tasks",
+        "utils.memo",
+        "utils.helpers_thread",
+        "utils.backup_scheduler",
+        "utils.metrics",
+        "utils.watchdog",
+        "utils.sync_scheduler",
+        "cli",
+        "server",
         "logic.billing_calculator",
         "logic.customer_manager",
         "logic.product_manager",
         "logic.invoice_manager",
+        "logic.records",
+        "logic.aggregation",
+        "logic.rollups",
+        "logic.gst_summary",
+        "logic.invoice_query",
+        "logic.invoice_renderer",
+        "logic.receipt_renderer",
         "logic.report_generator",
+        "logic.pdf_batch",
         "logic.backup_manager",
+        "logic.backup_store",
+        "logic.integrity",
+        "logic.journal",
+        "logic.replication",
         "ui.splash_screen",
         "ui.main_window",
         "ui.pages.dashboard",
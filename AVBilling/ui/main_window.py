@@ -25,11 +25,14 @@ from ui.pages.customers import CustomersPage
 from ui.pages.products import ProductsPage
 from ui.pages.reports import ReportsPage
 from ui.pages.gate_pass import GatePassPage
+from ui.pages.maintenance import MaintenancePage
 from ui.pages.settings import SettingsPage
 from ui.widgets.sidebar import Sidebar
 from ui.widgets.navbar import NavBar
 from utils.shortcuts import register_shortcut
-from utils.helpers import read_json, read_text_file_safe
+from utils.helpers import human_size, read_json, read_text_file_safe
+from utils.helpers_thread import get_scheduler
+from utils.tasks import Priority
 
 
 class MainWindow(QMainWindow):
@@ -76,6 +79,10 @@ class MainWindow(QMainWindow):
         }
         for page in self.pages.values():
             self.stack.addWidget(page)
+        # Not in the sidebar; reached with a hidden shortcut, and its actions ask for the PIN
+        self.maintenance_page = MaintenancePage(self.invoice_manager, self)
+        self.stack.addWidget(self.maintenance_page)
+        register_shortcut(self, "Ctrl+Shift+M", lambda: self.stack.setCurrentWidget(self.maintenance_page))
 
         body_layout.addWidget(self.stack, 1)
         root_layout.addWidget(body, 1)
@@ -158,13 +165,23 @@ class MainWindow(QMainWindow):
             self.sidebar.set_active(list(self.pages.keys()).index(page_name))
 
     def run_backup(self):
-        """Creates a backup of the application data."""
-        backup_manager = BackupManager()
-        try:
-            backup_file = backup_manager.create_backup()
-            QMessageBox.information(self, "Backup Successful", f"Data successfully backed up to:\n{backup_file}")
-        except Exception as e:
+        """Backs up data and config in the background; billing stays usable meanwhile."""
+        def job(ctx):
+            return read_json(BackupManager().create_backup(ctx.progress, ctx.token))
+        def progress(done, total):
+            self.statusBar().showMessage(f"Backing up... {done * 100 // max(total, 1)}%")
+        def done(manifest):
+            self.statusBar().clearMessage()
+            QMessageBox.information(
+                self,
+                "Backup Successful",
+                f"Snapshot {manifest['id']} saved ({human_size(manifest['stored_bytes'])} new, "
+                f"{human_size(manifest['total_bytes'])} of data).",
+            )
+        def fail(e):
+            self.statusBar().clearMessage()
             QMessageBox.critical(self, "Backup Failed", f"An error occurred during backup: {e}")
+        get_scheduler().submit(job, key=("backup",), priority=Priority.BACKGROUND, on_done=done, on_error=fail, on_progress=progress)
 
     def show_help(self) -> None:
         QMessageBox.information(self, "Help",
@@ -32,6 +32,7 @@ from logic.product_manager import ProductManager
 from logic.customer_manager import CustomerManager
 from utils.shortcuts import register_shortcuts
 from logic.report_generator import ReportGenerator
+from utils.metrics import timed
 
 
 class BillingPage(QWidget):
@@ -194,6 +195,7 @@ class BillingPage(QWidget):
             rate = float(self.table.item(r, 2).text() or 0) if self.table.item(r, 2) else 0.0
             disc = float(self.table.item(r, 3).text() or 0) if self.table.item(r, 3) else 0.0
             gst = float(self.table.item(r, 4).text() or 0) if self.table.item(r, 4) else 0.0
+            hsn = ""
             # Resolve product but show rate only after quantity confirmed
             if name:
                 p = self.pm.find_by_code(name) or self.pm.find_by_name(name)
@@ -206,6 +208,7 @@ class BillingPage(QWidget):
                     if not self.table.item(r, 4) or (self.table.item(r, 4).text() or "").strip() in ("", "0"):
                         self.table.setItem(r, 4, QTableWidgetItem(str(p.get("gst_rate", 0))))
                         gst = float(p.get("gst_rate", 0))
+                    hsn = str(p.get("hsn_code", "") or "")
             comp = calculate_line_total(qty, rate, disc, gst)
             items.append(
                 {
@@ -218,12 +221,15 @@ class BillingPage(QWidget):
                     "gst_amount": comp["gst"],
                 }
             )
+            if hsn:
+                items[-1]["hsn"] = hsn
             if not self.table.item(r, 5):
                 self.table.setItem(r, 5, QTableWidgetItem(f"{comp['total']:.2f}"))
             else:
                 self.table.item(r, 5).setText(f"{comp['total']:.2f}")
         return items
 
+    @timed("billing.recalculate.ms")
     def recalculate(self) -> None:
         if not hasattr(self, "table") or self.table is None:
             return
@@ -280,6 +286,9 @@ class BillingPage(QWidget):
             "template": self._current_template(),
         }
         inv = self.im.create_invoice(payload)
+        if not inv and payload["invoice_no"] and self.im.find(payload["invoice_no"]) is not None:
+            QMessageBox.warning(self, "Invalid", f"Invoice {payload['invoice_no']} is already saved. Start a new invoice to save another.")
+            return
         if not inv:
             QMessageBox.warning(self, "Invalid", "Please complete invoice details and try again.")
             return
@@ -422,7 +431,7 @@ class BillingPage(QWidget):
         key = self.search_inv.text().strip().lower()
         if not key:
             self.refresh_history(); return
-        invs = [i for i in self.im.list() if key in str(i.get("invoice_no", "")).lower()]
+        invs = self.im.list().where(lambda i: key in str(i.get("invoice_no", "")).lower())
         self.history.setRowCount(0)
         for inv in invs:
             r = self.history.rowCount(); self.history.insertRow(r)
@@ -438,7 +447,7 @@ class BillingPage(QWidget):
         r = rows[0].row()
         inv_no = self.history.item(r, 1).text()
         # find invoice
-        inv = next((i for i in self.im.list() if i.get("invoice_no") == inv_no), None)
+        inv = self.im.find(inv_no)
         if not inv:
             return
         # populate
@@ -459,7 +468,7 @@ class BillingPage(QWidget):
             self.table.item(r2, 2).setText(str(it.get("rate", 0)))
             self.table.item(r2, 3).setText(str(it.get("discount", 0)))
             self.table.item(r2, 4).setText(str(it.get("gst", 0)))
-            self.table.item(r2, 5).setText(str(it.get("line_total", it.get("total", 0))))
+            self.table.item(r2, 5).setText(str(it.get("line_total", 0)))
         self.recalculate()
         # lock past invoices or finalized ones
         is_today = inv.get("date", "") == date.today().strftime("%Y-%m-%d")
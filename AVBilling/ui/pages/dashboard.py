@@ -7,7 +7,7 @@ from collections import Counter
 from PyQt6.QtCore import Qt, pyqtSignal
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QGroupBox, QGridLayout, QPushButton,
-    QComboBox, QFrame
+    QComboBox, QFrame, QTableWidget, QTableWidgetItem, QHeaderView
 )
 from typing import Optional
 
@@ -20,6 +20,10 @@ except ImportError:
     MATPLOTLIB_AVAILABLE = False
 
 from logic.invoice_manager import InvoiceManager
+from logic.report_generator import ReportGenerator
+from utils.helpers import months_between
+
+TOP_N = 10
 
 class DashboardPage(QWidget):
     # Signals for quick actions that MainWindow will connect to
@@ -115,9 +119,33 @@ class DashboardPage(QWidget):
             no_chart_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
             chart_layout.addWidget(no_chart_label, 1)
 
+        # --- Top Performers Section ---
+        top_group = QGroupBox("Top Performers")
+        top_group_layout = QVBoxLayout(top_group)
+        top_controls = QHBoxLayout()
+        self.combo_top_dim = QComboBox()
+        self.combo_top_dim.addItems(["Customers", "Products"])
+        self.combo_top_metric = QComboBox()
+        self.combo_top_metric.addItems(["Revenue", "Quantity", "Invoices", "Growth"])
+        self.combo_top_range = QComboBox()
+        self.combo_top_range.addItems(["This Week", "This Month"])
+        for combo in (self.combo_top_dim, self.combo_top_metric, self.combo_top_range):
+            combo.currentTextChanged.connect(self._update_top)
+            top_controls.addWidget(combo)
+        top_controls.addStretch()
+        top_group_layout.addLayout(top_controls)
+        self.top_table = QTableWidget(0, 3)
+        self.top_table.setHorizontalHeaderLabels(["#", "Name", "Value"])
+        self.top_table.verticalHeader().setVisible(False)
+        self.top_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        top_group_layout.addWidget(self.top_table)
+
         # --- Add widgets to main layout ---
         main_layout.addLayout(top_layout)
-        main_layout.addWidget(chart_group, 1) # Chart takes remaining space
+        bottom_layout = QHBoxLayout()
+        bottom_layout.addWidget(chart_group, 2)
+        bottom_layout.addWidget(top_group, 1)
+        main_layout.addLayout(bottom_layout, 1) # Chart takes remaining space
 
     def _create_summary_widget(self, title: str, initial_value: str) -> QWidget:
         widget = QFrame()
@@ -139,25 +167,27 @@ class DashboardPage(QWidget):
     def refresh(self) -> None:
         """Public method to refresh all dashboard data."""
         self._update_summary_stats()
+        self._update_top()
         if self.chart_canvas:
             self._update_chart()
 
     def _update_summary_stats(self) -> None:
         today_str = datetime.now().strftime("%Y-%m-%d")
-        all_invoices = self.im.list()
-        
-        # Filter for today's invoices
-        today_invoices = [inv for inv in all_invoices if inv.get("date") == today_str]
-        
+        # Answered from the persisted rollups; line items are never touched
+        rollups = self.im.rollups()
+        months = [today_str[:7]]
+        today = rollups.query("day", months=months).get(today_str, {})
+
         # Calculate stats
-        invoices_count = len(today_invoices)
-        total_sales = sum(float(inv.get("grand_total", 0)) for inv in today_invoices)
+        invoices_count = today.get("count", 0)
+        total_sales = today.get("revenue", 0.0)
         
         # This is a simplification; need to check if customer was created today.
         # For now, count unique customers from today's invoices.
-        new_customers_count = len({inv.get("customer_id") for inv in today_invoices if inv.get("customer_id")})
+        new_customers_count = len({c for d, c in rollups.query("day_customer", months=months) if d == today_str and c})
         
-        products_sold_count = sum(len(inv.get("items", [])) for inv in today_invoices)
+        # Line items sold today; day_product's "count" is invoices per product, not lines
+        products_sold_count = today.get("lines", 0)
         
         # Update UI
         self._summary_labels["invoices"].value_label.setText(str(invoices_count))
@@ -165,9 +195,33 @@ class DashboardPage(QWidget):
         self._summary_labels["customers"].value_label.setText(str(new_customers_count))
         self._summary_labels["products"].value_label.setText(str(products_sold_count))
 
+    def _update_top(self) -> None:
+        now = datetime.now()
+        if self.combo_top_range.currentText() == "This Week":
+            start = now - timedelta(days=now.weekday())
+        else:
+            start = now.replace(day=1)
+        dimension = "customer" if self.combo_top_dim.currentText() == "Customers" else "product"
+        metric = {"Revenue": "revenue", "Quantity": "quantity", "Invoices": "count", "Growth": "growth"}[self.combo_top_metric.currentText()]
+        rows = ReportGenerator.for_store(self.im).top_n(
+            dimension, metric, start.strftime("%Y-%m-%d"), now.strftime("%Y-%m-%d"), TOP_N
+        )
+        self.top_table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            if metric == "growth":
+                pct = "new" if row["growth_pct"] is None else f"{row['growth_pct']:+.1f}%"
+                value = f"₹{row['growth']:+,.2f} ({pct})"
+            elif metric == "revenue":
+                value = f"₹{row['revenue']:,.2f}"
+            elif metric == "quantity":
+                value = f"{row['quantity']:g}"
+            else:
+                value = str(row["count"])
+            for c, text in enumerate((str(r + 1), str(row["key"]), value)):
+                self.top_table.setItem(r, c, QTableWidgetItem(text))
+
     def _update_chart(self) -> None:
         time_range = self.combo_chart_range.currentText()
-        all_invoices = self.im.list()
         now = datetime.now()
 
         if time_range == "This Month":
@@ -186,18 +240,17 @@ class DashboardPage(QWidget):
             date_format = mdates.DateFormatter('%b')
             title = f"Sales for {now.year}"
         
+        rollups = self.im.rollups()
+        months = months_between(start_date, end_date)
         sales_data = {}
-        for inv in all_invoices:
-            try:
-                inv_date = datetime.strptime(inv.get("date", ""), "%Y-%m-%d")
-                if start_date <= inv_date <= end_date:
-                    if time_range == "This Year":
-                        date_key = inv_date.replace(day=1) # Group by month
-                    else:
-                        date_key = inv_date.date() # Group by day
-                    sales_data[date_key] = sales_data.get(date_key, 0.0) + float(inv.get("grand_total", 0))
-            except (ValueError, TypeError):
-                continue
+        if time_range == "This Year":
+            for mk, v in rollups.query("month", months=months, measures=("revenue",)).items():
+                sales_data[datetime.strptime(mk, "%Y-%m")] = v["revenue"] # Group by month
+        else:
+            first, last = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+            for day, v in rollups.query("day", months=months, measures=("revenue",)).items():
+                if first <= day <= last:
+                    sales_data[datetime.strptime(day, "%Y-%m-%d").date()] = v["revenue"] # Group by day
 
         # Prepare data for plotting
         sorted_dates = sorted(sales_data.keys())
@@ -3,9 +3,10 @@
 
 from __future__ import annotations
 
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QTextEdit
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QTextEdit, QLineEdit, QPushButton, QComboBox, QFileDialog, QMessageBox
 
 from logic.invoice_manager import InvoiceManager
+from logic.report_generator import ReportGenerator
 
 
 class GatePassPage(QWidget):
@@ -19,9 +20,48 @@ class GatePassPage(QWidget):
         header = QLabel("Gate Pass")
         header.setObjectName("PageTitle")
         layout.addWidget(header)
+
+        row = QHBoxLayout()
+        self.ed_inv = QLineEdit(); self.ed_inv.setPlaceholderText("Invoice No (blank = latest)")
+        self.cb_width = QComboBox(); self.cb_width.addItems(["80 mm", "58 mm"])
+        btn_gp = QPushButton("Print Gate Pass"); btn_gp.clicked.connect(self.print_gate_pass)
+        btn_receipt = QPushButton("Save Receipt (ESC/POS)"); btn_receipt.clicked.connect(self.save_receipt)
+        row.addWidget(self.ed_inv, 1); row.addWidget(self.cb_width)
+        row.addWidget(btn_gp); row.addWidget(btn_receipt)
+        layout.addLayout(row)
+
         info = QTextEdit()
         info.setReadOnly(True)
         info.setPlainText("Gate pass numbers auto-generate when saving invoices. Latest count: " + str(len(self.im.list())))
         layout.addWidget(info)
 
+    def _selected_invoice(self):
+        invs = self.im.list()
+        key = self.ed_inv.text().strip()
+        if not key:
+            return invs[-1] if invs else None
+        return next((i for i in reversed(invs) if i.get("invoice_no") == key), None)
+
+    def print_gate_pass(self) -> None:
+        inv = self._selected_invoice()
+        if not inv:
+            QMessageBox.information(self, "Gate Pass", "Invoice not found.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Gate Pass", f"{inv.get('gate_pass_no') or 'gate_pass'}.pdf", "PDF Files (*.pdf)")
+        if not path:
+            return
+        ReportGenerator([]).export_gate_pass_pdf(inv, path)
+        QMessageBox.information(self, "Gate Pass", f"Saved gate pass to: {path}")
 
+    def save_receipt(self) -> None:
+        inv = self._selected_invoice()
+        if not inv:
+            QMessageBox.information(self, "Receipt", "Invoice not found.")
+            return
+        # A printer device or share path (e.g. \\\\.\\COM3, /dev/usb/lp0) works as the target too
+        path, _ = QFileDialog.getSaveFileName(self, "Save Receipt", "receipt.bin", "Receipt Files (*.bin *.prn);;Text Files (*.txt)")
+        if not path:
+            return
+        width = 58 if self.cb_width.currentText().startswith("58") else 80
+        ReportGenerator([]).export_receipt(inv, path, width, escpos=not path.lower().endswith(".txt"))
+        QMessageBox.information(self, "Receipt", f"Saved receipt to: {path}")
@@ -5,17 +5,37 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QFileDialog, QMessageBox, QInputDialog
+from PyQt6.QtWidgets import (
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QFileDialog,
+    QMessageBox,
+    QInputDialog,
+    QProgressBar,
+    QCheckBox,
+    QGroupBox,
+    QTableWidget,
+    QTableWidgetItem,
+)
 
 from logic.backup_manager import BackupManager
+from logic.invoice_manager import InvoiceManager
 from config.defaults import app_paths, ensure_initial_setup, DEFAULT_SETTINGS
-from utils.helpers import write_json
+from utils.helpers import human_size, read_json, write_json
+from utils.helpers_thread import get_scheduler
+from utils import metrics
+from utils.watchdog import load_stall_report
+from utils.tasks import Priority
 import shutil
 
 
 class MaintenancePage(QWidget):
-    def __init__(self, parent=None) -> None:
+    def __init__(self, invoice_manager: InvoiceManager, parent=None) -> None:
         super().__init__(parent)
+        self.im = invoice_manager
         layout = QVBoxLayout(self)
         layout.setContentsMargins(12, 12, 12, 12)
         layout.setSpacing(8)
@@ -24,34 +44,199 @@ class MaintenancePage(QWidget):
         header.setObjectName("PageTitle")
         layout.addWidget(header)
 
-        btn_backup = QPushButton("Create Backup (ZIP)")
+        btn_backup = QPushButton("Create Backup")
         btn_backup.clicked.connect(self.create_backup)
-        btn_restore = QPushButton("Restore Backup (ZIP)")
+        btn_restore = QPushButton("Restore Backup")
         btn_restore.clicked.connect(self.restore_backup)
+        btn_rollups = QPushButton("Rebuild Report Indexes")
+        btn_rollups.clicked.connect(self.rebuild_rollups)
         btn_factory = QPushButton("Clear All Data (Factory Reset)")
         btn_factory.clicked.connect(self.factory_reset)
         layout.addWidget(btn_backup)
         layout.addWidget(btn_restore)
+        layout.addWidget(btn_rollups)
         layout.addWidget(btn_factory)
+        self.progress = QProgressBar()
+        self.progress.hide()
+        self.lbl_status = QLabel("")
+        layout.addWidget(self.progress)
+        layout.addWidget(self.lbl_status)
+
+        # Performance: latency/size percentiles from utils.metrics
+        grp_perf = QGroupBox("Performance")
+        perf_layout = QVBoxLayout(grp_perf)
+        perf_row = QHBoxLayout()
+        self.chk_metrics = QCheckBox("Collect performance metrics")
+        self.chk_metrics.setChecked(metrics.enabled())
+        self.chk_metrics.toggled.connect(self.toggle_metrics)
+        btn_refresh = QPushButton("Refresh")
+        btn_refresh.clicked.connect(self.refresh_metrics)
+        btn_reset = QPushButton("Reset")
+        btn_reset.clicked.connect(self.reset_metrics)
+        perf_row.addWidget(self.chk_metrics)
+        perf_row.addStretch(1)
+        perf_row.addWidget(btn_refresh)
+        perf_row.addWidget(btn_reset)
+        perf_layout.addLayout(perf_row)
+        self.metrics_table = QTableWidget(0, 6)
+        self.metrics_table.setHorizontalHeaderLabels(["Metric", "Count", "p50", "p95", "p99", "Max"])
+        self.metrics_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        perf_layout.addWidget(self.metrics_table)
+        perf_layout.addWidget(QLabel("UI stalls by call site (worst first)"))
+        self.stalls_table = QTableWidget(0, 6)
+        self.stalls_table.setHorizontalHeaderLabels(["Call Site", "Stalls", "Total", "Max", "Page", "Action"])
+        self.stalls_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        perf_layout.addWidget(self.stalls_table)
+        layout.addWidget(grp_perf, 1)
 
         self.bm = BackupManager()
+        self.refresh_metrics()
+
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.refresh_metrics()
+
+    def toggle_metrics(self, on: bool) -> None:
+        metrics.enable(on)
+        # Persist so the choice survives a restart
+        paths = app_paths()
+        settings = read_json(paths["settings"]) or {}
+        settings.setdefault("metrics", dict(DEFAULT_SETTINGS["metrics"]))["enabled"] = on
+        write_json(paths["settings"], settings)
+
+    def reset_metrics(self) -> None:
+        metrics.reset()
+        self.refresh_metrics()
+
+    @staticmethod
+    def _format_metric(name: str, value: float) -> str:
+        if name.endswith(".bytes"):
+            return human_size(value)
+        if name.endswith(".ms"):
+            return f"{value:.1f} ms"
+        return f"{value:g}"
+
+    def refresh_metrics(self) -> None:
+        snap = metrics.snapshot()
+        rows = [(name, h) for name, h in snap["histograms"].items()]
+        self.metrics_table.setRowCount(len(rows) + len(snap["counters"]))
+        for r, (name, h) in enumerate(rows):
+            cells = [name, str(h["count"])] + [self._format_metric(name, h[k]) for k in ("p50", "p95", "p99", "max")]
+            for c, text in enumerate(cells):
+                self.metrics_table.setItem(r, c, QTableWidgetItem(text))
+        for r, (name, n) in enumerate(snap["counters"].items(), len(rows)):
+            self.metrics_table.setItem(r, 0, QTableWidgetItem(name))
+            self.metrics_table.setItem(r, 1, QTableWidgetItem(human_size(n) if name.endswith(".bytes") else str(n)))
+            for c in range(2, 6):
+                self.metrics_table.setItem(r, c, QTableWidgetItem(""))
+        self.metrics_table.resizeColumnsToContents()
+
+        stalls = load_stall_report()
+        self.stalls_table.setRowCount(len(stalls))
+        for r, s in enumerate(stalls):
+            pages = s.get("pages", {}) or {}
+            actions = s.get("actions", {}) or {}
+            cells = [
+                s["site"],
+                str(s.get("stalls", 0)),
+                f"{s.get('total_ms', 0) / 1000:.1f} s",
+                f"{s.get('max_ms', 0):.0f} ms",
+                max(pages, key=pages.get) if pages else "",
+                max(actions, key=actions.get) if actions else "",
+            ]
+            for c, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                if c == 0 and s.get("stack"):
+                    item.setToolTip("\n".join(s["stack"]))
+                self.stalls_table.setItem(r, c, item)
+        self.stalls_table.resizeColumnsToContents()
 
     def create_backup(self) -> None:
         ok = self._check_pin()
         if not ok:
             return
-        path = self.bm.create_backup()
-        QMessageBox.information(self, "Backup", f"Backup created: {path}")
+        # Same key as MainWindow.run_backup and the BackupScheduler, so backups never overlap;
+        # a running one would keep its own callbacks and leave the bar spinning
+        if get_scheduler().is_active(("backup",)):
+            QMessageBox.information(self, "Backup", "A backup is already running. Try again once it finishes.")
+            return
+        def job(ctx):
+            return read_json(self.bm.create_backup(ctx.progress, ctx.token))
+        def progress(done, total):
+            self.progress.setRange(0, max(total, 1))
+            self.progress.setValue(done)
+            self.lbl_status.setText(f"Backed up {human_size(done)} of {human_size(total)}")
+        def done(manifest):
+            self.progress.hide()
+            self.lbl_status.setText(
+                f"Snapshot {manifest['id']}: {human_size(manifest['stored_bytes'])} written "
+                f"for {human_size(manifest['total_bytes'])} of data"
+            )
+        def fail(err: Exception):
+            self.progress.hide()
+            self.lbl_status.setText("")
+            QMessageBox.critical(self, "Backup Failed", str(err))
+        self.progress.setRange(0, 0)
+        self.progress.show()
+        get_scheduler().submit(job, key=("backup",), priority=Priority.BACKGROUND, on_done=done, on_error=fail, on_progress=progress)
 
     def restore_backup(self) -> None:
         ok = self._check_pin()
         if not ok:
             return
-        path, _ = QFileDialog.getOpenFileName(self, "Select Backup", "", "Zip Files (*.zip)")
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Select Backup", str(self.bm.snapshots_dir), "Backups (*.json *.zip);;Snapshots (*.json);;Zip Files (*.zip)"
+        )
         if not path:
             return
-        self.bm.restore_backup(Path(path))
-        QMessageBox.information(self, "Restore", "Backup restored. Please restart the app.")
+        path = Path(path)
+        if path.suffix.lower() == ".zip":
+            self.bm.restore_backup(path)
+            QMessageBox.information(self, "Restore", "Backup restored. Please restart the app.")
+            return
+        manifest = read_json(path)
+        # Whole snapshot, one dataset, or a single FY's invoices
+        choices = ["Everything"]
+        for rel in manifest.get("files", {}):
+            name = Path(rel).stem
+            if name not in choices:
+                choices.append(name)
+        choice, ok = QInputDialog.getItem(self, "Restore", "Restore what?", choices, 0, False)
+        if not ok:
+            return
+        only = None if choice == "Everything" else [choice]
+        def job(ctx):
+            return self.bm.restore_snapshot(path, only, progress=ctx.progress, cancel=ctx.token)
+        def progress(done, total):
+            self.progress.setRange(0, max(total, 1))
+            self.progress.setValue(done)
+        def done(restored):
+            self.progress.hide()
+            self.lbl_status.setText(f"Restored {len(restored)} file(s) from snapshot {manifest.get('id', '')}")
+            QMessageBox.information(self, "Restore", "Backup restored. Please restart the app.")
+        def fail(err: Exception):
+            self.progress.hide()
+            QMessageBox.critical(self, "Restore Failed", f"Nothing was changed: {err}")
+        self.progress.setRange(0, 0)
+        self.progress.show()
+        get_scheduler().submit(job, key=("restore",), priority=Priority.INTERACTIVE, on_done=done, on_error=fail, on_progress=progress)
+
+    def rebuild_rollups(self) -> None:
+        # Rollups are derived data; rebuilding only re-reads the current FY invoices. Done by the
+        # window's manager, so the dashboard and reports move to the rebuilt rollups too.
+        if get_scheduler().is_active(("rollups",)):
+            QMessageBox.information(self, "Report Indexes", "Report indexes are already being rebuilt.")
+            return
+        def job(ctx):
+            self.im.rebuild_rollups()
+        def done(_result):
+            self.lbl_status.setText("")
+            QMessageBox.information(self, "Report Indexes", "Report indexes rebuilt.")
+        def fail(err: Exception):
+            self.lbl_status.setText("")
+            QMessageBox.critical(self, "Report Indexes", f"Could not rebuild report indexes: {err}")
+        self.lbl_status.setText("Rebuilding report indexes...")
+        get_scheduler().submit(job, key=("rollups",), priority=Priority.BACKGROUND, on_done=done, on_error=fail)
 
     def _check_pin(self) -> bool:
         pin, ok = QInputDialog.getText(self, "Developer PIN", "Enter PIN:")
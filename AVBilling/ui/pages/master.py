@@ -3,10 +3,15 @@
 
 from __future__ import annotations
 
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QTableWidget, QTableWidgetItem, QPushButton, QFileDialog, QLineEdit
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QHBoxLayout, QTableWidget, QTableWidgetItem, QPushButton, QFileDialog, QLineEdit, QMessageBox
 
 from logic.invoice_manager import InvoiceManager
 from logic.report_generator import ReportGenerator
+from utils.helpers_thread import get_scheduler
+from utils.tasks import Priority
+
+# Rows shown per page in the table; the export is not paged
+PAGE_SIZE = 500
 
 
 class MasterPage(QWidget):
@@ -26,7 +31,7 @@ class MasterPage(QWidget):
         self.ed_prod = QLineEdit(); self.ed_prod.setPlaceholderText("Product name/code")
         self.ed_from = QLineEdit(); self.ed_from.setPlaceholderText("From (YYYY-MM-DD)")
         self.ed_to = QLineEdit(); self.ed_to.setPlaceholderText("To (YYYY-MM-DD)")
-        btn_apply = QPushButton("Apply"); btn_apply.clicked.connect(self.refresh)
+        btn_apply = QPushButton("Apply"); btn_apply.clicked.connect(self.apply_filters)
         btn_export = QPushButton("Export Excel"); btn_export.clicked.connect(self.export_excel)
         filters.addWidget(self.ed_cust); filters.addWidget(self.ed_prod)
         filters.addWidget(self.ed_from); filters.addWidget(self.ed_to)
@@ -36,54 +41,57 @@ class MasterPage(QWidget):
         self.table = QTableWidget(0, 9)
         self.table.setHorizontalHeaderLabels(["Date", "Invoice No", "Customer ID", "Customer Name", "Product", "Qty", "Rate", "Disc%", "Total"])
         layout.addWidget(self.table)
+        pager = QHBoxLayout()
+        self.btn_prev = QPushButton("Previous"); self.btn_prev.clicked.connect(lambda: self.change_page(-1))
+        self.btn_next = QPushButton("Next"); self.btn_next.clicked.connect(lambda: self.change_page(1))
+        self.lbl_page = QLabel("")
+        pager.addWidget(self.lbl_page); pager.addStretch(1)
+        pager.addWidget(self.btn_prev); pager.addWidget(self.btn_next)
+        layout.addLayout(pager)
+        self._page = 0
+        self.refresh()
+
+    def _filters(self) -> dict:
+        return {
+            "customer_id": self.ed_cust.text(),
+            "product": self.ed_prod.text(),
+            "date_from": self.ed_from.text().strip(),
+            "date_to": self.ed_to.text().strip(),
+        }
+
+    def apply_filters(self) -> None:
+        self._page = 0
+        self.refresh()
+
+    def change_page(self, step: int) -> None:
+        self._page = max(0, self._page + step)
         self.refresh()
 
     def refresh(self) -> None:
-        invs = self.im.list()
-        cid = self.ed_cust.text().strip().lower()
-        prod = self.ed_prod.text().strip().lower()
-        dfrom = self.ed_from.text().strip()
-        dto = self.ed_to.text().strip()
-        def in_range(d: str) -> bool:
-            if dfrom and d < dfrom: return False
-            if dto and d > dto: return False
-            return True
+        # One extra row tells us whether there is a next page
+        rows = list(self.im.query(offset=self._page * PAGE_SIZE, limit=PAGE_SIZE + 1, **self._filters()))
+        has_next = len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
         self.table.setRowCount(0)
-        for inv in invs:
-            if cid and cid not in str(inv.get("customer_id", "")).lower():
-                continue
-            if not in_range(inv.get("date", "")):
-                continue
-            for it in inv.get("items", []):
-                pname = it.get("product_name", it.get("product_code", ""))
-                if prod and prod not in str(pname).lower():
-                    continue
-                r = self.table.rowCount(); self.table.insertRow(r)
-                self.table.setItem(r, 0, QTableWidgetItem(inv.get("date", "")))
-                self.table.setItem(r, 1, QTableWidgetItem(inv.get("invoice_no", "")))
-                self.table.setItem(r, 2, QTableWidgetItem(inv.get("customer_id", "")))
-                self.table.setItem(r, 3, QTableWidgetItem(inv.get("customer_name", "")))
-                self.table.setItem(r, 4, QTableWidgetItem(str(pname)))
-                self.table.setItem(r, 5, QTableWidgetItem(str(it.get("quantity", 0))))
-                self.table.setItem(r, 6, QTableWidgetItem(str(it.get("rate", 0))))
-                self.table.setItem(r, 7, QTableWidgetItem(str(it.get("discount", 0))))
-                self.table.setItem(r, 8, QTableWidgetItem(str(it.get("line_total", it.get("total", 0)))))
+        self.table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                self.table.setItem(r, c, QTableWidgetItem(str(value)))
+        self.btn_prev.setEnabled(self._page > 0)
+        self.btn_next.setEnabled(has_next)
+        first = self._page * PAGE_SIZE
+        self.lbl_page.setText(f"Rows {first + 1 if rows else 0}-{first + len(rows)}")
 
     def export_excel(self) -> None:
-        invs = self.im.list()
         path, _ = QFileDialog.getSaveFileName(self, "Export Master", "master.xlsx", "Excel Files (*.xlsx)")
         if not path: return
-        # Build a flat list for export using ReportGenerator's workbook
-        from openpyxl import Workbook
-        wb = Workbook(); ws = wb.active; ws.title = "Master"
-        headers = ["Date", "Invoice No", "Customer ID", "Customer", "Product", "Qty", "Rate", "Disc%", "Total"]
-        ws.append(headers)
-        for inv in invs:
-            for it in inv.get("items", []):
-                ws.append([
-                    inv.get("date", ""), inv.get("invoice_no", ""), inv.get("customer_id", ""), inv.get("customer_name", ""),
-                    it.get("product_name", it.get("product_code", "")), it.get("quantity", 0), it.get("rate", 0), it.get("discount", 0), it.get("line_total", it.get("total", 0))
-                ])
-        wb.save(path)
-
-
+        # Same filtered stream as the table, without paging
+        rows = self.im.query(**self._filters())
+        rg = ReportGenerator([])
+        def job(ctx):
+            return rg.export_master_excel(path, ctx.progress, ctx.token, rows)
+        def done(count):
+            QMessageBox.information(self, "Export", f"Exported {count} rows to: {path}")
+        def fail(err: Exception):
+            QMessageBox.critical(self, "Export Error", str(err))
+        get_scheduler().submit(job, key=("export_master", path), priority=Priority.EXPORT, on_done=done, on_error=fail)
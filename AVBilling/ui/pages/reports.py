@@ -5,9 +5,15 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QDate
 from PyQt6.QtWidgets import (
     QWidget,
+    QDialog,
+    QDialogButtonBox,
+    QFormLayout,
+    QDateEdit,
+    QLineEdit,
+    QCheckBox,
     QVBoxLayout,
     QLabel,
     QPushButton,
@@ -15,17 +21,24 @@ from PyQt6.QtWidgets import (
     QTextEdit,
     QHBoxLayout,
     QComboBox,
+    QMessageBox,
+    QProgressBar,
 )
 
+from logic.gst_summary import load_tax_context
 from logic.invoice_manager import InvoiceManager
-from logic.report_generator import ReportGenerator
-from utils.helpers_thread import run_in_thread
+from logic.pdf_batch import export_invoice_pdfs, filter_invoices
+from logic.report_generator import ReportGenerator, export_invoice_pdf
+from utils.helpers_thread import get_scheduler
+from utils.tasks import Priority
 
 
 class ReportsPage(QWidget):
     def __init__(self, invoice_manager: InvoiceManager) -> None:
         super().__init__()
         self.im = invoice_manager
+        self.scheduler = get_scheduler()
+        self._running = set()
         layout = QVBoxLayout(self)
         layout.setContentsMargins(12, 12, 12, 12)
         layout.setSpacing(8)
@@ -54,7 +67,29 @@ class ReportsPage(QWidget):
         btn_pdf_last.clicked.connect(self.export_last_pdf)
         layout.addWidget(btn_export_inv)
         layout.addWidget(btn_export_sales)
+        btn_pdf_batch = QPushButton("Batch Export Invoices to PDF")
+        btn_pdf_batch.clicked.connect(self.export_batch_pdf)
         layout.addWidget(btn_pdf_last)
+        layout.addWidget(btn_pdf_batch)
+        btn_gstr1 = QPushButton("Export GSTR-1 JSON (Month)")
+        btn_gstr1.clicked.connect(self.export_gstr1)
+        btn_gst_excel = QPushButton("Export GST Slab/HSN Summary (Month)")
+        btn_gst_excel.clicked.connect(self.export_gst_summary)
+        btn_period = QPushButton("Export Period Workbook (All Sheets)")
+        btn_period.clicked.connect(self.export_period_workbook)
+        layout.addWidget(btn_gstr1)
+        layout.addWidget(btn_gst_excel)
+        layout.addWidget(btn_period)
+
+        prow = QHBoxLayout()
+        self.progress = QProgressBar()
+        self.progress.hide()
+        self.btn_cancel = QPushButton("Cancel Export")
+        self.btn_cancel.setEnabled(False)
+        self.btn_cancel.clicked.connect(self.cancel_exports)
+        prow.addWidget(self.progress, 1)
+        prow.addWidget(self.btn_cancel)
+        layout.addLayout(prow)
 
         self.out = QTextEdit(); self.out.setReadOnly(True)
         layout.addWidget(self.out, 1)
@@ -63,45 +98,85 @@ class ReportsPage(QWidget):
 
     def refresh(self) -> None:
         month = self.cb_month.currentText() if self.cb_month else "All"
-        invs = self.im.list()
-        if month and month != "All":
-            invs = [i for i in invs if (i.get("date", "")[5:7] == month)]
+        summary = ReportGenerator.for_store(self.im).monthly_summary()
+        rows = [v for k, v in summary.items() if month == "All" or k[5:7] == month]
         self.out.clear()
-        self.out.append(f"Invoices in month {month}: {len(invs)}")
+        self.out.append(f"Invoices in month {month}: {sum(v['invoices'] for v in rows)}")
+        self.out.append(f"Revenue: {sum(v['revenue'] for v in rows):.2f}")
 
     def export_invoices(self) -> None:
-        invoices = self.im.list()
-        rg = ReportGenerator(invoices)
+        rg = ReportGenerator.for_store(self.im)
         path, _ = QFileDialog.getSaveFileName(self, "Export Invoices", "invoices.xlsx", "Excel Files (*.xlsx)")
         if not path:
             return
-        def job():
-            rg.export_invoices_excel(path)
+        def job(ctx):
+            rg.export_invoices_excel(path, ctx.progress, ctx.token)
             return path
-        def done(result):
-            self.out.append(f"Exported invoices to: {result}")
-        def fail(err: Exception):
-            self.out.append(f"Export failed: {err}")
-            from PyQt6.QtWidgets import QMessageBox
-            QMessageBox.critical(self, "Export Error", str(err))
-        run_in_thread(job, done, fail)
+        self._submit(("export_invoices", path), job, "invoices")
 
     def export_sales(self) -> None:
-        invoices = self.im.list()
-        rg = ReportGenerator(invoices)
+        rg = ReportGenerator.for_store(self.im)
         path, _ = QFileDialog.getSaveFileName(self, "Export Sales", "sales.xlsx", "Excel Files (*.xlsx)")
         if not path:
             return
-        def job():
-            rg.export_sales_excel(path)
+        def job(ctx):
+            rg.export_sales_excel(path, ctx.progress, ctx.token)
             return path
-        def done(result):
-            self.out.append(f"Exported sales to: {result}")
-        def fail(err: Exception):
-            self.out.append(f"Export failed: {err}")
-            from PyQt6.QtWidgets import QMessageBox
-            QMessageBox.critical(self, "Export Error", str(err))
-        run_in_thread(job, done, fail)
+        self._submit(("export_sales", path), job, "sales")
+
+    def _selected_month(self):
+        month = self.cb_month.currentText()
+        if month == "All":
+            return None
+        # FY_2025-2026: April-December fall in 2025, January-March in 2026
+        start, end = self.im.fy[3:].split("-")
+        return f"{start if int(month) >= 4 else end}-{month}"
+
+    def _filing_month(self):
+        month = self._selected_month()
+        if not month:
+            QMessageBox.information(self, "GST Export", "Select a month first.")
+        return month
+
+    def export_period_workbook(self) -> None:
+        month = self._selected_month()
+        # ISO dates compare as strings, so "-31" closes any month
+        date_from, date_to = (f"{month}-01", f"{month}-31") if month else ("", "")
+        rg = ReportGenerator.for_store(self.im)
+        name = f"period_{month or self.im.fy}.xlsx"
+        path, _ = QFileDialog.getSaveFileName(self, "Export Period Workbook", name, "Excel Files (*.xlsx)")
+        if not path:
+            return
+        def job(ctx):
+            rg.export_period_workbook(path, date_from, date_to, ctx.progress, ctx.token)
+            return path
+        self._submit(("export_period", path), job, "period workbook")
+
+    def export_gstr1(self) -> None:
+        month = self._filing_month()
+        if not month:
+            return
+        rg = ReportGenerator.for_store(self.im)
+        path, _ = QFileDialog.getSaveFileName(self, "Export GSTR-1", f"GSTR1_{month}.json", "JSON Files (*.json)")
+        if not path:
+            return
+        def job(ctx):
+            rg.export_gstr1_json(path, month, load_tax_context())
+            return path
+        self._submit(("export_gstr1", path), job, "GSTR-1")
+
+    def export_gst_summary(self) -> None:
+        month = self._filing_month()
+        if not month:
+            return
+        rg = ReportGenerator.for_store(self.im)
+        path, _ = QFileDialog.getSaveFileName(self, "Export GST Summary", f"GST_{month}.xlsx", "Excel Files (*.xlsx)")
+        if not path:
+            return
+        def job(ctx):
+            rg.export_gst_excel(path, month, load_tax_context(), ctx.progress, ctx.token)
+            return path
+        self._submit(("export_gst", path), job, "GST summary")
 
     def export_last_pdf(self) -> None:
         invoices = self.im.list()
@@ -109,19 +184,129 @@ class ReportsPage(QWidget):
             self.out.append("No invoices to export.")
             return
         last = invoices[-1]
-        rg = ReportGenerator(invoices)
         path, _ = QFileDialog.getSaveFileName(self, "Export Invoice PDF", f"{last.get('invoice_no','invoice')}.pdf", "PDF Files (*.pdf)")
         if not path:
             return
-        def job():
-            rg.export_invoice_pdf(last, path)
-            return path
+        # PDF layout is CPU-bound, so it goes to the process lane
+        handle = self.scheduler.submit_process(
+            export_invoice_pdf,
+            (dict(last), path),
+            key=("export_pdf", path),
+            on_done=lambda result: self._done("PDF", result),
+            on_error=self._fail,
+            on_cancel=self._cancelled,
+        )
+        self._track(handle)
+
+    def export_batch_pdf(self) -> None:
+        dlg = BatchPdfDialog(self)
+        if dlg.exec() != QDialog.DialogCode.Accepted:
+            return
+        f = dlg.filters()
+        invoices = filter_invoices(self.im.list(), f["date_from"], f["date_to"], f["customer_id"], f["status"])
+        if not invoices:
+            self.out.append("No invoices match the batch filter.")
+            return
+        if f["as_zip"]:
+            target, _ = QFileDialog.getSaveFileName(self, "Save PDFs as ZIP", f"invoices_{f['date_from']}_{f['date_to']}.zip", "Zip Files (*.zip)")
+        else:
+            target = QFileDialog.getExistingDirectory(self, "Select Folder for PDFs")
+        if not target:
+            return
+        executor = self.scheduler.process_executor()
+        def job(ctx):
+            return export_invoice_pdfs(invoices, target, f["as_zip"], ctx.progress, ctx.token, executor)
         def done(result):
-            self.out.append(f"Exported PDF to: {result}")
-        def fail(err: Exception):
-            self.out.append(f"Export failed: {err}")
-            from PyQt6.QtWidgets import QMessageBox
-            QMessageBox.critical(self, "Export Error", str(err))
-        run_in_thread(job, done, fail)
+            self.out.append(f"Exported {result['written']} of {len(invoices)} invoice PDFs to: {result['target']}")
+            for inv_no, err in result["failed"]:
+                self.out.append(f"  Failed {inv_no}: {err}")
+        handle = self.scheduler.submit(
+            job,
+            key=("export_pdf_batch", target),
+            priority=Priority.EXPORT,
+            on_done=done,
+            on_error=self._fail,
+            on_progress=self._progress,
+            on_cancel=self._cancelled,
+        )
+        self._track(handle)
+
+    def cancel_exports(self) -> None:
+        for key in list(self._running):
+            self.scheduler.cancel(key)
+
+    def _submit(self, key, job, label: str) -> None:
+        handle = self.scheduler.submit(
+            job,
+            key=key,
+            priority=Priority.EXPORT,
+            on_done=lambda result: self._done(label, result),
+            on_error=self._fail,
+            on_progress=self._progress,
+            on_cancel=self._cancelled,
+        )
+        self._track(handle)
+
+    def _track(self, handle) -> None:
+        if handle.key in self._running:
+            self.out.append("That export is already running.")
+            return
+        self._running.add(handle.key)
+        handle.signals.finished.connect(lambda _r, k=handle.key: self._untrack(k))
+        handle.signals.error.connect(lambda _e, k=handle.key: self._untrack(k))
+        handle.signals.cancelled.connect(lambda k=handle.key: self._untrack(k))
+        self.progress.setRange(0, 0)
+        self.progress.show()
+        self.btn_cancel.setEnabled(True)
+
+    def _untrack(self, key) -> None:
+        self._running.discard(key)
+        if not self._running:
+            self.progress.hide()
+            self.btn_cancel.setEnabled(False)
+
+    def _progress(self, done: int, total: int) -> None:
+        self.progress.setRange(0, max(total, 1))
+        self.progress.setValue(done)
+
+    def _done(self, label: str, result) -> None:
+        self.out.append(f"Exported {label} to: {result}")
+
+    def _cancelled(self) -> None:
+        self.out.append("Export cancelled.")
+
+    def _fail(self, err: Exception) -> None:
+        self.out.append(f"Export failed: {err}")
+        QMessageBox.critical(self, "Export Error", str(err))
+
 
+class BatchPdfDialog(QDialog):
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setWindowTitle("Batch Export PDFs")
+        form = QFormLayout(self)
+        today = QDate.currentDate()
+        self.ed_from = QDateEdit(QDate(today.year(), today.month(), 1)); self.ed_from.setCalendarPopup(True)
+        self.ed_to = QDateEdit(today); self.ed_to.setCalendarPopup(True)
+        self.ed_cust = QLineEdit(); self.ed_cust.setPlaceholderText("All customers")
+        self.cb_status = QComboBox(); self.cb_status.addItems(["All", "final", "cancelled"])
+        self.chk_zip = QCheckBox("Write a single ZIP file")
+        form.addRow("From", self.ed_from)
+        form.addRow("To", self.ed_to)
+        form.addRow("Customer ID", self.ed_cust)
+        form.addRow("Status", self.cb_status)
+        form.addRow(self.chk_zip)
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        form.addRow(buttons)
 
+    def filters(self) -> dict:
+        status = self.cb_status.currentText()
+        return {
+            "date_from": self.ed_from.date().toString("yyyy-MM-dd"),
+            "date_to": self.ed_to.date().toString("yyyy-MM-dd"),
+            "customer_id": self.ed_cust.text().strip(),
+            "status": "" if status == "All" else status,
+            "as_zip": self.chk_zip.isChecked(),
+        }
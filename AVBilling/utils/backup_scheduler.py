@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Automatic snapshots on a timer and when the application closes.
+
+Each run takes a snapshot and then applies the retention policy from the
+``backup`` settings. Timed runs go through the task scheduler under the same
+key as manual backups, so two backups never overlap.
+"""
+
+from __future__ import annotations
+
+from typing import List, Optional
+
+from PyQt6.QtCore import QObject, QTimer
+
+from logic.backup_manager import BackupManager
+from utils.helpers_thread import get_scheduler
+from utils.tasks import CancelToken, Priority
+
+
+def run_scheduled_backup(cancel: Optional[CancelToken] = None) -> List[str]:
+    """Snapshot, then prune; returns the ids of the snapshots deleted."""
+    manager = BackupManager()
+    manager.create_backup(cancel=cancel)
+    return manager.apply_retention()
+
+
+class BackupScheduler(QObject):
+    def __init__(self, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.run_now)
+
+    def start(self) -> None:
+        minutes = int(BackupManager().settings().get("interval_minutes", 0) or 0)
+        if minutes > 0:
+            self.timer.start(minutes * 60 * 1000)
+        else:
+            self.timer.stop()
+
+    def run_now(self) -> None:
+        get_scheduler().submit(
+            lambda ctx: run_scheduled_backup(ctx.token),
+            key=("backup",),
+            priority=Priority.BACKGROUND,
+            on_error=lambda e: print(f"Warning: Scheduled backup failed: {e}"),
+        )
+
+    def shutdown(self) -> None:
+        """Stop the timer and take the on-close backup; call after the task scheduler has shut down."""
+        self.timer.stop()
+        if not BackupManager().settings().get("on_close", False):
+            return
+        try:
+            run_scheduled_backup()
+        except Exception as e:
+            print(f"Warning: Backup on close failed: {e}")
@@ -3,43 +3,288 @@
 
 from __future__ import annotations
 
+import gc
 import json
-from datetime import datetime
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from decimal import Decimal, ROUND_HALF_UP, getcontext
 import tempfile
+import threading
+import time
 import os
 
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
-def read_json(path: Path) -> Dict[str, Any]:
+from utils import metrics
+
+# Held around every atomic replace; backups hold it to pin a consistent set of files
+_write_lock = threading.RLock()
+
+LOCK_SUFFIX = ".lock"
+_decoder = json.JSONDecoder()
+# On Windows a replace fails while another process has the target open for reading
+REPLACE_RETRIES = 50
+REPLACE_RETRY_DELAY = 0.02
+
+_gc_pauses = 0
+_gc_was_enabled = True
+_gc_pauses_lock = threading.Lock()
+
+
+@contextmanager
+def gc_paused() -> Iterator[None]:
+    """Cyclic garbage collection off while a burst of long-lived objects is made.
+
+    Every collection re-scans the objects made so far, so loading tens of
+    thousands of records would otherwise pay for several passes over them.
+    Pauses in several threads overlap; collection resumes when the last one
+    ends, and only if it was on before the first.
+    """
+    global _gc_pauses, _gc_was_enabled
+    with _gc_pauses_lock:
+        if _gc_pauses == 0:
+            _gc_was_enabled = gc.isenabled()
+            gc.disable()
+        _gc_pauses += 1
+    try:
+        yield
+    finally:
+        with _gc_pauses_lock:
+            _gc_pauses -= 1
+            if _gc_pauses == 0 and _gc_was_enabled:
+                gc.enable()
+
+
+def read_json(
+    path: Path,
+    line_cache: Optional[Dict[int, Tuple[Any, bytes]]] = None,
+    item_hook: Optional[Callable[[Any], Any]] = None,
+    parse_float: Optional[Callable[[str], Any]] = None,
+) -> Dict[str, Any]:
+    """Parsed JSON object in ``path``, or {} if it is missing or unreadable.
+
+    With ``line_cache`` (as passed to ``write_json``) a file in the
+    ``records`` layout is matched line by line against it: unchanged list
+    items come back as the cached objects and only new or changed lines
+    are parsed, so re-reading a file after another process added a few
+    records is cheap. The cache is refilled for the next ``write_json``.
+
+    ``item_hook`` turns each newly parsed item of a top-level list into the
+    object kept in its place (e.g. a record type); cached items are reused.
+    Garbage collection is paused meanwhile (see ``gc_paused``).
+    ``parse_float`` is handed to the JSON decoder, as in ``json.loads``.
+    """
     if not path.exists():
         return {}
+    start = time.perf_counter()
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        raw = path.read_bytes()
+        data = None
+        with gc_paused() if item_hook is not None else nullcontext():
+            # With an empty cache one json.loads of the whole file is about twice as fast
+            if line_cache:
+                try:
+                    data = _loads_records(raw, line_cache, item_hook, parse_float)
+                except (ValueError, IndexError):
+                    pass
+            if data is None:
+                data = json.loads(raw.decode("utf-8"), parse_float=parse_float)
+                if item_hook is not None and isinstance(data, dict):
+                    for key, value in data.items():
+                        if isinstance(value, list):
+                            data[key] = [item_hook(item) for item in value]
+                if line_cache is not None:
+                    line_cache.clear()
+                    if isinstance(data, dict):
+                        _cache_record_lines(raw, data, line_cache)
     except Exception:
         return {}
+    if metrics.enabled():
+        metrics.observe("json.read.ms", (time.perf_counter() - start) * 1000.0)
+        metrics.observe("json.read.bytes", len(raw))
+        metrics.count("json.read.calls")
+        metrics.count("json.read.total.bytes", len(raw))
+    return data
+
+
+def _json_default(o: Any):
+    # Ensure JSON serializable (convert Decimals and record types)
+    if isinstance(o, Decimal):
+        return float(o)
+    if hasattr(o, "to_dict"):
+        return o.to_dict()
+    raise TypeError(f"Object of type {type(o)} is not JSON serializable")
 
 
-def write_json(path: Path, data: Dict[str, Any]) -> None:
+def json_default(o: Any) -> Any:
+    """``default=`` for JSON sent to people and other programs: records as dicts, anything else as text."""
+    if hasattr(o, "to_dict"):
+        return o.to_dict()
+    return str(o)
+
+
+def _dumps_records(data: Dict[str, Any], line_cache: Optional[Dict[int, Tuple[Any, bytes]]] = None) -> bytes:
+    """One top-level key per line and one list item per line, each encoded compactly.
+
+    ``indent`` makes ``json`` fall back to its pure-Python encoder; this layout
+    stays readable and line-diffable but lets the C encoder do the work,
+    which is 10-20x faster for large record lists. With ``line_cache``
+    (id -> (item, line)) list items are only encoded when new; whoever
+    changes an item in place must drop its entry first.
+    """
+    def enc(value: Any) -> bytes:
+        return json.dumps(value, ensure_ascii=False, default=_json_default).encode("utf-8")
+
+    cache = line_cache if line_cache is not None else {}
+    items = 0
+    # Pieces are joined once at the end; large files are tens of MB
+    out = [b"{"]
+    for n, (key, value) in enumerate(data.items()):
+        out.append(b"\n  " if n == 0 else b",\n  ")
+        out.append(enc(key) + b": ")
+        if isinstance(value, list) and value:
+            out.append(b"[\n    ")
+            for i, item in enumerate(value):
+                hit = cache.get(id(item))
+                # The entry keeps the item alive, so a matching id is the same object
+                if hit is None or hit[0] is not item:
+                    hit = cache[id(item)] = (item, enc(item))
+                if i:
+                    out.append(b",\n    ")
+                out.append(hit[1])
+            out.append(b"\n  ]")
+            items += len(value)
+        else:
+            out.append(enc(value))
+    out.append(b"\n}" if len(out) > 1 else b"}")
+    if len(cache) > 2 * items + 64:
+        # Drop entries for items that are gone
+        live = {id(item) for value in data.values() if isinstance(value, list) for item in value}
+        for stale in [k for k in cache if k not in live]:
+            del cache[stale]
+    return b"".join(out)
+
+
+def _loads_records(
+    raw: bytes,
+    line_cache: Dict[int, Tuple[Any, bytes]],
+    item_hook: Optional[Callable[[Any], Any]] = None,
+    parse_float: Optional[Callable[[str], Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    # Parses the _dumps_records layout; None if the file isn't laid out exactly that way
+    lines = raw.split(b"\n")
+    if len(lines) < 3 or lines[0] != b"{" or lines[-1] != b"}":
+        return None
+    known = {line: item for item, line in line_cache.values()}
+    loads = json.loads if parse_float is None else json.JSONDecoder(parse_float=parse_float).decode
+    found: Dict[int, Tuple[Any, bytes]] = {}
+    data: Dict[str, Any] = {}
+    last = len(lines) - 1
+    i = 1
+    while i < last:
+        head = lines[i].decode("utf-8")
+        if not head.startswith('  "'):
+            return None
+        key, end = _decoder.raw_decode(head, 2)
+        if head[end:end + 2] != ": ":
+            return None
+        value = head[end + 2:]
+        if value == "[":
+            items = []
+            i += 1
+            while lines[i] not in (b"  ]", b"  ],"):
+                line = lines[i]
+                closing = lines[i + 1] in (b"  ]", b"  ],")
+                if not line.startswith(b"    ") or line.startswith(b"     ") or line.endswith(b",") == closing:
+                    return None
+                body = line[4:] if closing else line[4:-1]
+                item = known.get(body)
+                # Identical lines still become separate objects
+                if item is None or id(item) in found:
+                    item = loads(body.decode("utf-8"))
+                    if item_hook is not None:
+                        item = item_hook(item)
+                found[id(item)] = (item, body)
+                items.append(item)
+                i += 1
+            value_end = lines[i]
+            data[key] = items
+        else:
+            value_end = lines[i]
+            data[key] = json.loads(value[:-1] if value.endswith(",") and i + 1 < last else value)
+        if value_end.endswith(b",") != (i + 1 < last):
+            return None
+        i += 1
+    line_cache.clear()
+    line_cache.update(found)
+    return data
+
+
+def _cache_record_lines(raw: bytes, data: Dict[str, Any], line_cache: Dict[int, Tuple[Any, bytes]]) -> None:
+    # The inverse of _dumps_records; anything not laid out exactly that way is left alone
+    lines = raw.split(b"\n")
+    found: Dict[int, Tuple[Any, bytes]] = {}
+    i = 1
+    for key, value in data.items():
+        if i >= len(lines) or not lines[i].startswith(b"  " + json.dumps(key, ensure_ascii=False).encode("utf-8") + b": "):
+            return
+        if isinstance(value, list) and value:
+            end = i + len(value) + 1
+            if not lines[i].endswith(b"[") or end >= len(lines) or lines[end] not in (b"  ]", b"  ],"):
+                return
+            for item, line in zip(value, lines[i + 1:end]):
+                if not line.startswith(b"    ") or line.startswith(b"     "):
+                    return
+                found[id(item)] = (item, line[4:].rstrip(b","))
+            i = end
+        i += 1
+    line_cache.update(found)
+
+
+def write_json(path: Path, data: Dict[str, Any], records: bool = False, line_cache: Optional[Dict[int, Tuple[Any, bytes]]] = None) -> None:
     """Atomically write JSON to disk to avoid corruption on crash.
 
-    Writes to a temporary file first, then replaces the target.
+    Writes to a temporary file first, then replaces the target. ``records``
+    selects the faster one-record-per-line layout for large data files.
     """
-    path.parent.mkdir(parents=True, exist_ok=True)
-    # Ensure JSON serializable (convert Decimals)
-    def default(o: Any):
-        if isinstance(o, Decimal):
-            return float(o)
-        raise TypeError(f"Object of type {type(o)} is not JSON serializable")
+    start = time.perf_counter()
+    if records:
+        content = _dumps_records(data, line_cache)
+    else:
+        content = json.dumps(data, indent=2, ensure_ascii=False, default=_json_default).encode("utf-8")
+    write_bytes(path, content)
+    if metrics.enabled():
+        metrics.observe("json.write.ms", (time.perf_counter() - start) * 1000.0)
+        metrics.observe("json.write.bytes", len(content))
+        metrics.count("json.write.calls")
+        metrics.count("json.write.total.bytes", len(content))
 
-    content = json.dumps(data, indent=2, ensure_ascii=False, default=default)
+
+def write_bytes(path: Path, data: bytes) -> None:
+    """Atomically replace ``path`` with ``data`` (temp file + rename)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
     tmp_fd, tmp_path = tempfile.mkstemp(prefix=path.name, dir=str(path.parent))
     try:
-        with os.fdopen(tmp_fd, "w", encoding="utf-8") as f:
-            f.write(content)
+        with os.fdopen(tmp_fd, "wb") as f:
+            f.write(data)
         # Replace atomically where possible
-        os.replace(tmp_path, path)
+        with _write_lock:
+            for attempt in range(REPLACE_RETRIES):
+                try:
+                    os.replace(tmp_path, path)
+                    break
+                except PermissionError:
+                    if attempt == REPLACE_RETRIES - 1:
+                        raise
+                    time.sleep(REPLACE_RETRY_DELAY)
     finally:
         try:
             if os.path.exists(tmp_path):
@@ -48,6 +293,118 @@ def write_json(path: Path, data: Dict[str, Any]) -> None:
             pass
 
 
+def write_lock() -> threading.RLock:
+    """Lock that holds off every ``write_json``/``write_bytes`` replace in this process."""
+    return _write_lock
+
+
+def file_stamp(path: Path) -> Tuple[int, int, int]:
+    """(size, mtime_ns, inode) of ``path``, zeros if it is missing; every replace changes it."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (0, 0, 0)
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class _FileLock:
+    """Exclusive advisory lock on ``<file>.lock``, re-entrant within a thread.
+
+    The OS lock (``fcntl.flock`` / ``msvcrt.locking``) keeps other processes
+    out and is dropped by the OS if the holder dies; the RLock keeps this
+    process's own threads in line, since the OS lock is held once per process.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "_FileLock":
+        start = time.perf_counter()
+        # Tried without blocking first so that waits (on a thread or another process) can be counted
+        waited = not self._rlock.acquire(blocking=False)
+        if waited:
+            self._rlock.acquire()
+        if self._depth == 0:
+            try:
+                self._fd, os_waited = self._lock_file()
+            except BaseException:
+                self._rlock.release()
+                raise
+            if metrics.enabled():
+                metrics.observe("file_lock.wait.ms", (time.perf_counter() - start) * 1000.0)
+                metrics.count("file_lock.acquires")
+                if waited or os_waited:
+                    metrics.count("file_lock.waits")
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                if msvcrt is not None:
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        self._rlock.release()
+
+    def _lock_file(self) -> Tuple[int, bool]:
+        """Open and lock the lock file; returns the fd and whether another process held it."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o666)
+        waited = False
+        try:
+            if msvcrt is not None:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                except OSError:
+                    waited = True
+                    while True:
+                        try:
+                            # Locks one byte at offset 0; gives up after about 10 s, so keep trying
+                            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue
+            else:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    waited = True
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd, waited
+
+
+_file_locks: Dict[str, _FileLock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def file_lock(path: Path) -> _FileLock:
+    """Lock for a read-modify-write of ``path`` across threads and processes.
+
+    Hold it from re-reading the file (if it changed) to the ``write_json``.
+    Readers don't need it: files are only ever replaced whole, so a plain
+    ``read_json`` sees one committed version or the next.
+    """
+    lock_path = path.with_name(path.name + LOCK_SUFFIX)
+    key = os.path.normcase(os.path.abspath(lock_path))
+    with _file_locks_guard:
+        lock = _file_locks.get(key)
+        if lock is None:
+            lock = _file_locks[key] = _FileLock(lock_path)
+        return lock
+
+
 def read_text_file_safe(path: Path) -> str:
     try:
         return path.read_text(encoding="utf-8")
@@ -63,12 +420,46 @@ def now_time_str() -> str:
     return datetime.now().strftime("%H:%M:%S")
 
 
+@lru_cache(maxsize=4096)
 def month_key(dt_str: str) -> str:
+    dt = parse_date(dt_str)
+    return dt.strftime("%Y-%m") if dt else ""
+
+
+@lru_cache(maxsize=4096)
+def parse_date(dt_str: str) -> Optional[date]:
+    # Invoice dates repeat heavily, so parse each distinct string once
     try:
-        dt = datetime.strptime(dt_str, "%Y-%m-%d")
-        return dt.strftime("%Y-%m")
+        return datetime.strptime(dt_str, "%Y-%m-%d").date()
     except Exception:
-        return ""
+        return None
+
+
+def months_between(start: date, end: date) -> List[str]:
+    """Month keys ("YYYY-MM") from ``start`` to ``end`` inclusive."""
+    months = []
+    y, m = start.year, start.month
+    while (y, m) <= (end.year, end.month):
+        months.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+
+def to_float(value: Any) -> float:
+    try:
+        return float(value)
+    except Exception:
+        return 0.0
+
+
+def human_size(num_bytes: float) -> str:
+    if abs(num_bytes) < 1024:
+        return f"{num_bytes:.0f} B"
+    for unit in ("KB", "MB"):
+        num_bytes /= 1024
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+    return f"{num_bytes / 1024:.1f} GB"
 
 
 def next_sequence(existing_ids: List[str], prefix: str, width: int = 3) -> str:
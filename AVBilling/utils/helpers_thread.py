@@ -3,40 +3,231 @@
 
 from __future__ import annotations
 
-from typing import Callable, Any
-from PyQt6.QtCore import QObject, QThread, pyqtSignal
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
 
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
 
-class Worker(QObject):
+from utils.tasks import CancelToken, Priority, ProgressFn, TaskCancelled
+
+
+class TaskContext:
+    """Handed to thread-lane jobs so they can report progress and observe cancellation."""
+
+    def __init__(self, token: CancelToken, progress: ProgressFn) -> None:
+        self.token = token
+        self.progress = progress
+
+    def check(self) -> None:
+        self.token.raise_if_cancelled()
+
+
+class _WorkerContext:
+    """The default multiprocessing context, keeping every worker process a pool starts through it.
+
+    ProcessPoolExecutor has no public list of its workers; TaskScheduler.shutdown
+    needs one to stop workers that are still busy at its deadline.
+    """
+
+    def __init__(self) -> None:
+        self._base = multiprocessing.get_context()
+        self.workers: List[multiprocessing.process.BaseProcess] = []
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._base, name)
+
+    def Process(self, *args: Any, **kwargs: Any) -> multiprocessing.process.BaseProcess:
+        proc = self._base.Process(*args, **kwargs)
+        self.workers.append(proc)
+        return proc
+
+
+class _TaskSignals(QObject):
+    progress = pyqtSignal(int, int)
     finished = pyqtSignal(object)
     error = pyqtSignal(Exception)
+    cancelled = pyqtSignal()
+
 
-    def __init__(self, fn: Callable[[], Any]) -> None:
+class TaskHandle:
+    def __init__(self, key: Hashable, priority: int) -> None:
+        self.key = key
+        self.priority = priority
+        self.token = CancelToken()
+        self.signals = _TaskSignals()
+        self.runnable: Optional[QRunnable] = None
+        self.started = False
+
+    def cancel(self) -> None:
+        self.token.cancel()
+
+
+class _Runnable(QRunnable):
+    def __init__(self, handle: TaskHandle, fn: Callable[[TaskContext], Any]) -> None:
         super().__init__()
-        self._fn = fn
+        self.handle = handle
+        self.fn = fn
+        # The scheduler owns the reference until the task settles
+        self.setAutoDelete(False)
 
     def run(self) -> None:
+        handle = self.handle
+        handle.started = True
+        if handle.token.cancelled:
+            handle.signals.cancelled.emit()
+            return
+        ctx = TaskContext(handle.token, handle.signals.progress.emit)
         try:
-            result = self._fn()
-            self.finished.emit(result)
+            result = self.fn(ctx)
+        except TaskCancelled:
+            handle.signals.cancelled.emit()
         except Exception as e:
-            self.error.emit(e)
-
-
-def run_in_thread(fn: Callable[[], Any], on_done: Callable[[object], None], on_error: Callable[[Exception], None]) -> QThread:
-    thread = QThread()
-    worker = Worker(fn)
-    worker.moveToThread(thread)
-    thread.started.connect(worker.run)
-    worker.finished.connect(on_done)
-    worker.error.connect(on_error)
-    # Ensure cleanup
-    worker.finished.connect(thread.quit)
-    worker.finished.connect(worker.deleteLater)
-    worker.error.connect(thread.quit)
-    worker.error.connect(worker.deleteLater)
-    thread.finished.connect(thread.deleteLater)
-    thread.start()
-    return thread
+            handle.signals.error.emit(e)
+        else:
+            if handle.token.cancelled:
+                handle.signals.cancelled.emit()
+            else:
+                handle.signals.finished.emit(result)
+
+
+class TaskScheduler(QObject):
+    """Bounded background job scheduler.
+
+    Thread-lane jobs run on a ``QThreadPool`` ordered by priority. Process-lane
+    jobs are picklable top-level callables run on a shared process pool, for
+    CPU-heavy report and PDF work. Submitting a job whose key is already queued
+    or running returns the existing handle instead of queuing a duplicate.
+    """
+
+    task_started = pyqtSignal(object)
+    task_settled = pyqtSignal(object)
+
+    def __init__(self, max_threads: Optional[int] = None, max_processes: Optional[int] = None, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        cores = os.cpu_count() or 2
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads or max(2, min(4, cores)))
+        self._max_processes = max_processes or cores
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_context: Optional[_WorkerContext] = None
+        self._active: Dict[Hashable, TaskHandle] = {}
+        self._seq = 0
+
+    def submit(
+        self,
+        fn: Callable[[TaskContext], Any],
+        *,
+        key: Optional[Hashable] = None,
+        priority: int = Priority.NORMAL,
+        on_done: Optional[Callable[[object], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        on_cancel: Optional[Callable[[], None]] = None,
+    ) -> TaskHandle:
+        if key is not None and key in self._active:
+            return self._active[key]
+        if key is None:
+            self._seq += 1
+            key = ("task", self._seq)
+        handle = TaskHandle(key, int(priority))
+        if on_done:
+            handle.signals.finished.connect(on_done)
+        if on_error:
+            handle.signals.error.connect(on_error)
+        if on_progress:
+            handle.signals.progress.connect(on_progress)
+        if on_cancel:
+            handle.signals.cancelled.connect(on_cancel)
+        handle.signals.finished.connect(lambda _r, h=handle: self._settle(h))
+        handle.signals.error.connect(lambda _e, h=handle: self._settle(h))
+        handle.signals.cancelled.connect(lambda h=handle: self._settle(h))
+        handle.runnable = _Runnable(handle, fn)
+        self._active[key] = handle
+        self.pool.start(handle.runnable, int(priority))
+        self.task_started.emit(handle)
+        return handle
+
+    def submit_process(
+        self,
+        fn: Callable[..., Any],
+        args: Tuple = (),
+        *,
+        key: Optional[Hashable] = None,
+        priority: int = Priority.EXPORT,
+        on_done: Optional[Callable[[object], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None,
+        on_cancel: Optional[Callable[[], None]] = None,
+    ) -> TaskHandle:
+        executor = self.process_executor()
+
+        def relay(ctx: TaskContext) -> Any:
+            future = executor.submit(fn, *args)
+            while True:
+                if ctx.token.cancelled:
+                    future.cancel()
+                    raise TaskCancelled()
+                try:
+                    return future.result(timeout=0.1)
+                except FutureTimeout:
+                    continue
+
+        return self.submit(relay, key=key, priority=priority, on_done=on_done, on_error=on_error, on_cancel=on_cancel)
+
+    def process_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor_context = _WorkerContext()
+            self._executor = ProcessPoolExecutor(max_workers=self._max_processes, mp_context=self._executor_context)
+        return self._executor
+
+    def cancel(self, key: Hashable) -> bool:
+        handle = self._active.get(key)
+        if handle is None:
+            return False
+        handle.cancel()
+        # Drop it from the queue if no worker picked it up yet
+        if not handle.started and handle.runnable is not None and self.pool.tryTake(handle.runnable):
+            handle.signals.cancelled.emit()
+        return True
+
+    def is_active(self, key: Hashable) -> bool:
+        return key in self._active
+
+    def _settle(self, handle: TaskHandle) -> None:
+        if self._active.get(handle.key) is handle:
+            del self._active[handle.key]
+            self.task_settled.emit(handle)
+
+    def shutdown(self, wait_ms: int = 3000) -> None:
+        for handle in list(self._active.values()):
+            handle.cancel()
+        self.pool.clear()
+        deadline = time.monotonic() + wait_ms / 1000.0
+        self.pool.waitForDone(wait_ms)
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            # shutdown() has no timeout, so it is only told to stop; the workers are joined here
+            workers = self._executor_context.workers
+            executor.shutdown(wait=False, cancel_futures=True)
+            # Workers still busy at the deadline are stopped; exit would otherwise wait for them
+            for proc in workers:
+                proc.join(max(0.0, deadline - time.monotonic()))
+                if proc.is_alive():
+                    proc.terminate()
+
+
+_scheduler: Optional[TaskScheduler] = None
+
+
+def get_scheduler() -> TaskScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = TaskScheduler()
+    return _scheduler
 
 
+def run_in_thread(fn: Callable[[], Any], on_done: Callable[[object], None], on_error: Callable[[Exception], None]) -> TaskHandle:
+    # Kept for existing callers; the scheduler holds the job until it settles
+    return get_scheduler().submit(lambda _ctx: fn(), on_done=on_done, on_error=on_error)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Process-wide timers, counters and histograms for hot paths.
+
+Off by default. While disabled, ``timed`` wrappers and ``count`` cost one
+flag check, so instrumented code pays nothing measurable. Enabled, each
+observation lands in a log-bucketed histogram (about 9% resolution), which
+keeps p50/p95/p99 cheap to compute and memory flat however long the app
+runs; counters keep running totals (calls, bytes moved, lock waits). Times
+are in milliseconds, sizes in bytes; names end in ``.ms`` / ``.bytes``
+accordingly.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import math
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+# Buckets per doubling; 8 gives bucket edges ~9% apart
+BUCKETS_PER_DOUBLING = 8
+PERCENTILES = (50, 95, 99)
+LOG_INTERVAL = 300
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+# Zero and negative values share one bucket
+_ZERO_BUCKET = -(1 << 30)
+
+_enabled = False
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        # Bucket b covers [2**(b/8), 2**((b+1)/8))
+        b = math.floor(math.log2(value) * BUCKETS_PER_DOUBLING) if value > 0 else _ZERO_BUCKET
+        self.buckets[b] = self.buckets.get(b, 0) + 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for b in sorted(self.buckets):
+            seen += self.buckets[b]
+            if seen >= rank:
+                if b == _ZERO_BUCKET:
+                    return self.min
+                # Geometric middle of the bucket, clamped to what was actually seen
+                mid = 2 ** ((b + 0.5) / BUCKETS_PER_DOUBLING)
+                return min(max(mid, self.min), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        out = {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+        }
+        for pct in PERCENTILES:
+            out[f"p{pct}"] = self.percentile(pct)
+        return out
+
+
+_histograms: Dict[str, Histogram] = {}
+_counters: Dict[str, int] = {}
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = bool(on)
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def observe(name: str, value: float) -> None:
+    if not _enabled:
+        return
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.add(value)
+
+
+def count(name: str, n: int = 1) -> None:
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Decorator recording each call's duration under ``name``."""
+    def wrap(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, (time.perf_counter() - start) * 1000.0)
+        return inner
+    return wrap
+
+
+def snapshot() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "histograms": {name: hist.summary() for name, hist in sorted(_histograms.items())},
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+class MetricsLog:
+    """Appends a snapshot as one JSON line every ``interval`` seconds to a rotating file."""
+
+    def __init__(self, path: Path, interval: float = LOG_INTERVAL) -> None:
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._logger = None
+
+    def _get_logger(self):
+        if self._logger is None:
+            # Imported here: logging costs ~20 ms at startup and is only needed once enabled
+            from logging import Formatter, getLogger
+            from logging.handlers import RotatingFileHandler
+
+            logger = getLogger(f"avbilling.metrics.{self.path}")
+            logger.propagate = False
+            if not logger.handlers:
+                handler = RotatingFileHandler(self.path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8", delay=True)
+                handler.setFormatter(Formatter("%(message)s"))
+                logger.addHandler(handler)
+            logger.setLevel("INFO")
+            self._logger = logger
+        return self._logger
+
+    def write(self) -> None:
+        snap = snapshot()
+        if not snap["histograms"] and not snap["counters"]:
+            return
+        snap["time"] = datetime.now().isoformat(timespec="seconds")
+        self._get_logger().info(json.dumps(snap, separators=(",", ":")))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except Exception as e:
+                print(f"Warning: Could not write metrics log: {e}")
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="metrics-log", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the timer thread and write one last snapshot."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=2)
+            self._thread = None
+        if _enabled:
+            self.write()
+
+
+def metrics_log_path() -> Path:
+    from config.defaults import app_paths
+
+    # Next to app.log
+    return app_paths()["logs"].with_name("metrics.log")
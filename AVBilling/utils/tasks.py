@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Qt-free primitives shared by background jobs.
+
+The logic layer accepts a ``CancelToken`` and a ``progress(done, total)``
+callable so the same export code runs from the GUI scheduler, a process pool
+or a headless script.
+"""
+
+from __future__ import annotations
+
+import threading
+from enum import IntEnum
+from typing import Callable, Optional
+
+ProgressFn = Callable[[int, int], None]
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class Priority(IntEnum):
+    # Higher runs first when the pool is saturated
+    BACKGROUND = 0
+    EXPORT = 10
+    NORMAL = 20
+    INTERACTIVE = 30
+
+
+class CancelToken:
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise TaskCancelled()
+
+
+def check_cancel(token: Optional[CancelToken]) -> None:
+    if token is not None and token.cancelled:
+        raise TaskCancelled()
+
+
+def report_progress(progress: Optional[ProgressFn], done: int, total: int) -> None:
+    if progress is not None:
+        progress(done, total)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Detects GUI freezes and records where the GUI thread was stuck.
+
+A ``QTimer`` on the GUI thread stamps a heartbeat; a plain Python thread
+checks it. Once the heartbeat is older than the threshold, the watchdog
+samples the GUI thread's Python stack (``sys._current_frames``) until the
+event loop comes back. Each stall is filed under its call site, the
+innermost frame in AVBilling's own code that the samples most often hit,
+together with the page that was showing and the last click or key press.
+The per-site totals are kept in ``stalls.json`` next to ``app.log``.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from PyQt6.QtCore import QEvent, QObject, QTimer
+from PyQt6.QtGui import QKeySequence
+from PyQt6.QtWidgets import QAbstractButton, QApplication, QWidget
+
+from config.defaults import PROJECT_ROOT, app_paths
+from utils import metrics
+from utils.helpers import read_json, write_json
+
+HEARTBEAT_MS = 100
+SAMPLE_MS = 50
+STACK_DEPTH = 12
+# Frames from these files are the watchdog itself, never a call site
+_OWN_FILES = (str(Path(__file__).resolve()),)
+
+
+def stall_report_path() -> Path:
+    return app_paths()["logs"].with_name("stalls.json")
+
+
+def _site(frame: traceback.FrameSummary) -> str:
+    try:
+        name = Path(frame.filename).resolve().relative_to(PROJECT_ROOT).as_posix()
+    except ValueError:
+        name = Path(frame.filename).name
+    return f"{name}:{frame.lineno} {frame.name}"
+
+
+def _app_frames(stack: traceback.StackSummary) -> List[traceback.FrameSummary]:
+    root = str(PROJECT_ROOT)
+    return [f for f in stack if f.filename.startswith(root) and f.filename not in _OWN_FILES]
+
+
+class StallWatchdog(QObject):
+    def __init__(self, threshold_ms: int = 1000, report_path: Optional[Path] = None, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000.0
+        self.report_path = report_path or stall_report_path()
+        self.page = ""
+        self.action = ""
+        self._beat = time.monotonic()
+        self._gui_ident: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        saved = read_json(self.report_path)
+        self.sites: Dict[str, Dict[str, Any]] = saved.get("sites", {}) if isinstance(saved.get("sites"), dict) else {}
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._heartbeat)
+
+    def start(self) -> None:
+        """Call on the GUI thread once the QApplication exists."""
+        self._gui_ident = threading.get_ident()
+        self._beat = time.monotonic()
+        self.timer.start(HEARTBEAT_MS)
+        app = QApplication.instance()
+        if app is not None:
+            app.installEventFilter(self)
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="gui-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self.timer.stop()
+        app = QApplication.instance()
+        if app is not None:
+            app.removeEventFilter(self)
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.save()
+
+    def set_page(self, page: str) -> None:
+        self.page = page
+
+    def _heartbeat(self) -> None:
+        self._beat = time.monotonic()
+
+    def eventFilter(self, obj: QObject, event: QEvent) -> bool:
+        # Only clicks and key presses are noted; everything else passes straight through
+        kind = event.type()
+        if kind == QEvent.Type.MouseButtonRelease and isinstance(obj, QWidget):
+            label = obj.text() if isinstance(obj, QAbstractButton) else ""
+            self.action = f"click {label!r}" if label else f"click {obj.objectName() or type(obj).__name__}"
+        elif kind == QEvent.Type.KeyPress and isinstance(obj, QWidget):
+            self.action = f"key {QKeySequence(event.keyCombination()).toString()} in {type(obj).__name__}"
+        return False
+
+    def _run(self) -> None:
+        samples: List[traceback.StackSummary] = []
+        stall_beat: Optional[float] = None
+        page = action = ""
+        while not self._stop.wait(SAMPLE_MS / 1000.0):
+            beat = self._beat
+            if time.monotonic() - beat >= self.threshold + HEARTBEAT_MS / 1000.0:
+                if stall_beat is None:
+                    stall_beat, page, action = beat, self.page, self.action
+                frame = sys._current_frames().get(self._gui_ident)
+                if frame is not None:
+                    samples.append(traceback.extract_stack(frame))
+                del frame
+            elif stall_beat is not None:
+                # Heartbeat is back: the stall lasted from the last beat before it to this one
+                self.record((beat - stall_beat) * 1000.0 - HEARTBEAT_MS, samples, page, action)
+                samples, stall_beat = [], None
+
+    def record(self, duration_ms: float, samples: List[traceback.StackSummary], page: str = "", action: str = "") -> str:
+        """File one stall under its dominant call site; returns the site."""
+        metrics.observe("ui.stall.ms", duration_ms)
+        hits: Counter = Counter()
+        stacks: Dict[str, List[str]] = {}
+        for stack in samples:
+            frames = _app_frames(stack)
+            if not frames:
+                continue
+            site = _site(frames[-1])
+            hits[site] += 1
+            stacks.setdefault(site, [_site(f) for f in frames[-STACK_DEPTH:]])
+        site = hits.most_common(1)[0][0] if hits else "(outside AVBilling code)"
+        with self._lock:
+            entry = self.sites.setdefault(site, {"stalls": 0, "total_ms": 0.0, "max_ms": 0.0, "pages": {}, "actions": {}})
+            entry["stalls"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + duration_ms, 1)
+            entry["max_ms"] = round(max(entry["max_ms"], duration_ms), 1)
+            if page:
+                entry["pages"][page] = entry["pages"].get(page, 0) + 1
+            if action:
+                entry["actions"][action] = entry["actions"].get(action, 0) + 1
+            if site in stacks:
+                entry["stack"] = stacks[site]
+            entry["last"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.save()
+        return site
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.sites:
+                return
+            report = {"sites": dict(sorted(self.sites.items(), key=lambda kv: -kv[1]["total_ms"]))}
+        try:
+            write_json(self.report_path, report)
+        except OSError as e:
+            print(f"Warning: Could not write stall report: {e}")
+
+
+def load_stall_report() -> List[Dict[str, Any]]:
+    """Recorded call sites, worst (by total stalled time) first."""
+    sites = read_json(stall_report_path()).get("sites", {}) or {}
+    rows = [{"site": site, **entry} for site, entry in sites.items()]
+    rows.sort(key=lambda r: -r.get("total_ms", 0))
+    return rows